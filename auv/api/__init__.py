@@ -1,4 +1,12 @@
 from .radio import Radio
+from .reliable import ReliableLink
+from .transfer import FileSender
+from .telemetry import Channel, TelemetryScheduler
+from .codec import TelemetryEncoder
+from .control import ControlReceiver
+from .scheduler import Scheduler
+from .timing import Timers
+from .sensors import SensorHub
 from .motor import Motor
 from .motor_controller import MotorController
 from .pid import PID
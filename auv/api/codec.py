@@ -0,0 +1,178 @@
+"""
+The codec module compresses the AUV's telemetry into the payload of the auv_data message.
+
+This file is mirrored in auv/api/codec.py and base_station/api/codec.py.
+Both copies must stay identical, otherwise the base station will misread the telemetry.
+
+Every channel is sent as a fixed-point integer. A keyframe carries the absolute
+values of every channel, the frames after it only carry the difference to that keyframe
+of the channels worth sending, so a lost frame never corrupts the ones after it. Values
+are zigzag-varint encoded, so the small differences of slowly changing sensors take a
+single byte.
+
+Payload layout:
+
+    FLAGS (1) | MASK (1) | VALUES (varint per channel present in MASK)
+
+FLAGS bit 7 marks a keyframe, bits 0-6 hold the keyframe id, which delta frames
+repeat to name the keyframe they are relative to.
+"""
+
+KEYFRAME = 0x80
+KEYFRAME_ID_MODULO = 0x80
+KEYFRAME_INTERVAL = 10  # Frames between keyframes, one second of telemetry at 10 Hz.
+
+# (Name, fixed-point multiplier, wrap-around period or None), in payload order.
+CHANNELS = (
+    ('heading', 100, 360),  # Degrees.
+    ('temperature', 100, None),  # Degrees Celsius.
+    ('depth', 100, None),  # Meters.
+    ('latitude', 10 ** 7, None),  # Degrees.
+    ('longitude', 10 ** 7, None),  # Degrees.
+)
+
+
+def zigzag_encode(value):
+    """ Maps signed integers to unsigned ones, keeping small magnitudes small (0, -1, 1, -2 -> 0, 1, 2, 3). """
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def zigzag_decode(value):
+    """ Inverse of zigzag_encode. """
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+def write_varint(buffer, value):
+    """ Appends an unsigned integer to buffer, 7 bits per byte, least significant first. """
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, offset):
+    """ Returns (value, next offset) of the unsigned varint at offset in data. """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def wrap(value, period):
+    """ Returns the shortest signed difference for a value that wraps around every period. """
+    return (value + period // 2) % period - period // 2
+
+
+class TelemetryEncoder:
+    """ Encodes telemetry values as keyframes and deltas. """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        """
+        keyframe_interval: Number of frames between two keyframes.
+        """
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_id = 0
+        self.reference = None
+        self.mask = None
+        self.frames_since_keyframe = 0
+
+    def encode(self, values, channels=None):
+        """
+        Returns the payload for a dictionary of channel name -> value. Channels that
+        are missing or None are left out of the frame.
+
+        channels: Names of the channels to send in a delta frame, default every channel of
+                  values. Keyframes carry every channel of values, as a complete refresh.
+        """
+        fixed = [None] * len(CHANNELS)
+        present = 0
+        send = 0
+        for bit, (name, scale, period) in enumerate(CHANNELS):
+            value = values.get(name)
+            if value is not None:
+                value = int(round(value * scale))
+                if period is not None:
+                    value %= period * scale
+                fixed[bit] = value
+                present |= 1 << bit
+                if channels is None or name in channels:
+                    send |= 1 << bit
+
+        # Deltas need a reference for every channel they carry.
+        keyframe = (self.reference is None or send & ~self.mask or
+                    self.frames_since_keyframe >= self.keyframe_interval)
+        if keyframe:
+            self.keyframe_id = (self.keyframe_id + 1) % KEYFRAME_ID_MODULO
+            self.reference = fixed
+            self.mask = present
+            self.frames_since_keyframe = 0
+        self.frames_since_keyframe += 1
+
+        mask = present if keyframe else send
+        payload = bytearray((self.keyframe_id | (KEYFRAME if keyframe else 0), mask))
+        for bit, (name, scale, period) in enumerate(CHANNELS):
+            if mask >> bit & 1:
+                value = fixed[bit]
+                if not keyframe:
+                    value = value - self.reference[bit]
+                    if period is not None:
+                        value = wrap(value, period * scale)
+                write_varint(payload, zigzag_encode(value))
+        return bytes(payload)
+
+    @staticmethod
+    def present(mask):
+        """ Returns the (bit, channel) of the channels present in a frame's mask. """
+        return [(bit, channel) for bit, channel in enumerate(CHANNELS) if mask >> bit & 1]
+
+
+class TelemetryDecoder:
+    """ Decodes the payloads of a TelemetryEncoder back into telemetry values. """
+
+    def __init__(self):
+        self.keyframe_id = None
+        self.reference = None
+        self.mask = None
+        self.dropped = 0
+
+    def decode(self, payload):
+        """
+        Returns a dictionary of channel name -> value, or None if the frame is a delta
+        of a keyframe that was lost (or it is malformed).
+        """
+        try:
+            flags, mask = payload[0], payload[1]
+            channels = TelemetryEncoder.present(mask)
+            fixed = []
+            offset = 2
+            for _ in channels:
+                value, offset = read_varint(payload, offset)
+                fixed.append(zigzag_decode(value))
+        except IndexError:
+            self.dropped += 1
+            return None
+
+        keyframe_id = flags & ~KEYFRAME
+        if flags & KEYFRAME:
+            self.keyframe_id = keyframe_id
+            self.reference = [None] * len(CHANNELS)
+            for value, (bit, channel) in zip(fixed, channels):
+                self.reference[bit] = value
+            self.mask = mask
+        elif keyframe_id != self.keyframe_id or mask & ~self.mask:
+            self.dropped += 1
+            return None
+        else:
+            fixed = [value + self.reference[bit] for value, (bit, channel) in zip(fixed, channels)]
+
+        values = {}
+        for value, (bit, (name, scale, period)) in zip(fixed, channels):
+            if period is not None:
+                value %= period * scale
+            values[name] = value / scale
+        return values
@@ -0,0 +1,132 @@
+"""
+Manual control packets (protocol.XBOX), shared by the AUV and the base station.
+
+The base station's ControlSender only sends the motor speeds when one of them moved past a
+deadband, or as a keep-alive, and stamps every packet with its clock in milliseconds (16 bits,
+wrapping). The AUV's ControlReceiver uses the stamps to drop packets that arrive out of order
+or late: the clocks are not synchronized, so it tracks the smallest (local - remote) difference
+seen, which is the clock offset plus the fastest delivery, and measures delays against it.
+"""
+import time
+
+STAMP_MODULO = 1 << 16
+DEFAULT_DEADBAND = 2  # Motor speed steps (of -100..100).
+DEFAULT_MIN_INTERVAL = 0.05  # Seconds between packets while the sticks move.
+DEFAULT_KEEPALIVE = 0.5  # Seconds between packets while the sticks rest.
+DEFAULT_MAX_DELAY = 300  # Milliseconds a packet may arrive later than the fastest one.
+DEFAULT_TIMEOUT = 1.5  # Seconds without a packet before the AUV stops its motors.
+OFFSET_DRIFT = 1  # Milliseconds the offset estimate may rise per packet, to follow clock drift.
+
+
+def stamp(now=None):
+    """ Returns the 16-bit millisecond timestamp of a time (default now). """
+    return int((time.monotonic() if now is None else now) * 1000) % STAMP_MODULO
+
+
+def stamp_difference(a, b):
+    """ Returns a - b of two 16-bit timestamps, between -32768 and 32767 milliseconds. """
+    return (a - b + STAMP_MODULO // 2) % STAMP_MODULO - STAMP_MODULO // 2
+
+
+class ControlSender:
+    """ Decides when the base station sends the manual control motor speeds. """
+
+    def __init__(self, deadband=DEFAULT_DEADBAND, min_interval=DEFAULT_MIN_INTERVAL, keepalive=DEFAULT_KEEPALIVE):
+        """
+        deadband:     Change of a motor speed that is sent right away.
+        min_interval: Minimum seconds between two packets.
+        keepalive:    Seconds after which the speeds are sent again even if unchanged.
+        """
+        self.deadband = deadband
+        self.min_interval = min_interval
+        self.keepalive = keepalive
+        self.last_speeds = None
+        self.last_time = None
+        self.sent = 0
+        self.suppressed = 0
+
+    def update(self, speeds, now=None):
+        """
+        Returns the (timestamp, *speeds) fields of the XBOX packet to send for the current
+        motor speeds, or None if nothing needs to be sent.
+        """
+        now = time.monotonic() if now is None else now
+        speeds = tuple(speeds)
+        if self.last_speeds is None:
+            due = True
+        else:
+            elapsed = now - self.last_time
+            changed = speeds != self.last_speeds and (
+                not any(speeds) or  # Always send a stop.
+                any(abs(speed - last) > self.deadband for speed, last in zip(speeds, self.last_speeds)))
+            due = elapsed >= self.keepalive or (changed and elapsed >= self.min_interval)
+
+        if not due:
+            self.suppressed += 1
+            return None
+        self.last_speeds = speeds
+        self.last_time = now
+        self.sent += 1
+        return (stamp(now),) + speeds
+
+    def stats(self):
+        """
+        Returns a dictionary of the packets sent and suppressed.
+        """
+        return {'sent': self.sent, 'suppressed': self.suppressed}
+
+
+class ControlReceiver:
+    """ Filters the manual control packets received by the AUV. """
+
+    def __init__(self, max_delay=DEFAULT_MAX_DELAY, timeout=DEFAULT_TIMEOUT):
+        """
+        max_delay: Milliseconds a packet may be later than the fastest one before it is dropped.
+        timeout:   Seconds without an accepted packet after which expired() is True.
+        """
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.offset = None  # Smallest (local - remote) stamp difference seen.
+        self.last_stamp = None
+        self.last_time = None
+        self.accepted = 0
+        self.stale = 0
+
+    def accept(self, timestamp, now=None):
+        """ Returns True if a packet stamped with timestamp is newer than the last one and on time. """
+        now = time.monotonic() if now is None else now
+        difference = stamp(now) - timestamp
+        if self.offset is None:
+            self.offset = difference
+        delay = stamp_difference(difference, self.offset)
+        if delay < 0:  # Fastest delivery so far.
+            self.offset = (self.offset + delay) % STAMP_MODULO
+            delay = 0
+        else:
+            self.offset = (self.offset + min(delay, OFFSET_DRIFT)) % STAMP_MODULO
+
+        if delay > self.max_delay or (self.last_stamp is not None and stamp_difference(timestamp, self.last_stamp) <= 0):
+            self.stale += 1
+            return False
+        self.last_stamp = timestamp
+        self.last_time = now
+        self.accepted += 1
+        return True
+
+    def expired(self, now=None):
+        """ Returns True if packets were accepted before, but none for timeout seconds. """
+        if self.last_time is None:
+            return False
+        return (time.monotonic() if now is None else now) - self.last_time > self.timeout
+
+    def reset(self):
+        """ Forgets the previous packets, e.g. after the link was lost. """
+        self.offset = None
+        self.last_stamp = None
+        self.last_time = None
+
+    def stats(self):
+        """
+        Returns a dictionary of the packets accepted and dropped as stale.
+        """
+        return {'accepted': self.accepted, 'stale': self.stale}
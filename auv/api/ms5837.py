@@ -3,7 +3,7 @@ try:
 except:
     print('Try sudo apt-get install python-smbus')
 
-from time import sleep
+from time import sleep, monotonic
 
 # Models
 MODEL_02BA = 0
@@ -24,6 +24,11 @@ try:
 except:
     print('Try sudo apt-get install python-smbus')
 
+try:
+    import numpy as np
+except:
+    print('Try pip3 install numpy, it is needed to compensate raw samples in bulk')
+
 
 # Models
 MODEL_02BA = 0
@@ -37,6 +42,10 @@ OSR_2048 = 3
 OSR_4096 = 4
 OSR_8192 = 5
 
+# Oversampling per use-case, see MS5837.poll(). Higher oversampling is less noisy but converts slower.
+OSR_DEPTH_HOLD = OSR_1024  # ~2.6 ms conversions, fresh depth for a 50 Hz control loop.
+OSR_LOGGING = OSR_8192  # ~20 ms conversions, the most precise readings.
+
 # kg/m^3 convenience
 DENSITY_FRESHWATER = 997
 DENSITY_SALTWATER = 1029
@@ -200,8 +209,8 @@ class MS5837(object):
                 OFFi = (3*(self._temperature-2000)*(self._temperature-2000))/2
                 SENSi = (5*(self._temperature-2000)*(self._temperature-2000))/8
                 if (self._temperature/100) < -15:  # Very low temp
-                    OFFi = OFFi+7*(self._temperature+long(1500))*(self._temperature+1500)
-                    SENSi = SENSi+4*(self._temperature+long(1500))*(self._temperature+1500)
+                    OFFi = OFFi+7*(self._temperature+1500)*(self._temperature+1500)
+                    SENSi = SENSi+4*(self._temperature+1500)*(self._temperature+1500)
             elif (self._temperature/100) >= 20:  # High temp
                 Ti = 2*(dT*dT)/(137438953472)
                 OFFi = (1*(self._temperature-2000)*(self._temperature-2000))/16
@@ -272,6 +281,93 @@ UNITS_Farenheit = 2
 UNITS_Kelvin = 3
 
 
+RAW_CAPACITY = 4096  # Initial capacity of RawSamples, in samples.
+
+
+# Vectorized first and second order compensation of raw D1 (pressure) and D2 (temperature)
+# samples, the same math as MS5837._calculate for whole arrays at once.
+# Returns arrays of the pressure (mbar), temperature (degrees C) and depth (m).
+def compensate(D1, D2, C, model=MODEL_30BA, fluidDensity=DENSITY_FRESHWATER):
+    D1 = np.asarray(D1, dtype=float)
+    D2 = np.asarray(D2, dtype=float)
+
+    dT = D2-C[5]*256
+    if model == MODEL_02BA:
+        SENS = C[1]*65536+(C[3]*dT)/128
+        OFF = C[2]*131072+(C[4]*dT)/64
+    else:
+        SENS = C[1]*32768+(C[3]*dT)/256
+        OFF = C[2]*65536+(C[4]*dT)/128
+
+    temperature = 2000+dT*C[6]/8388608
+    low = temperature/100 < 20
+    squared = (temperature-2000)*(temperature-2000)
+
+    # Second order compensation
+    if model == MODEL_02BA:
+        Ti = np.where(low, (11*dT*dT)/(34359738368), 0)
+        OFFi = np.where(low, (31*squared)/8, 0)
+        SENSi = np.where(low, (63*squared)/32, 0)
+    else:
+        veryLow = temperature/100 < -15
+        veryLowSquared = (temperature+1500)*(temperature+1500)
+        Ti = np.where(low, (3*dT*dT)/(8589934592), 2*(dT*dT)/(137438953472))
+        OFFi = np.where(low, (3*squared)/2 + np.where(veryLow, 7*veryLowSquared, 0), (1*squared)/16)
+        SENSi = np.where(low, (5*squared)/8 + np.where(veryLow, 4*veryLowSquared, 0), 0)
+
+    OFF2 = OFF-OFFi
+    SENS2 = SENS-SENSi
+
+    temperature = (temperature-Ti)/100.0
+    if model == MODEL_02BA:
+        pressure = (((D1*SENS2)/2097152-OFF2)/32768)/100.0
+    else:
+        pressure = (((D1*SENS2)/2097152-OFF2)/8192)/10.0
+
+    depth = (pressure*UNITS_Pa-101300)/(fluidDensity*9.80665)
+    return pressure, temperature, depth
+
+
+# Raw samples kept by MS5837.recordRaw(), in growable arrays whose capacity doubles when full.
+# One thread appends, others may take a snapshot() at any time.
+class RawSamples(object):
+
+    def __init__(self, capacity=RAW_CAPACITY):
+        self._data = np.empty((3, capacity))  # Rows of time.monotonic(), D1 and D2.
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, time, D1, D2):
+        if self._count == self._data.shape[1]:
+            data = np.empty((3, self._count * 2))
+            data[:, :self._count] = self._data
+            self._data = data
+        self._data[:, self._count] = (time, D1, D2)
+        self._count += 1
+
+    def clear(self):
+        self._count = 0
+
+    # Returns copies of the (time, D1, D2) arrays of the samples appended so far, all of the
+    # same length even while another thread appends. The count is read before the array:
+    # the first count rows of either the current array or the one replacing it are complete.
+    def snapshot(self):
+        count = self._count
+        data = self._data[:, :count].copy()
+        return data[0], data[1], data[2]
+
+
+# Loads raw samples saved by MS5837.saveRaw() and compensates them.
+# Returns a dictionary of the time, pressure (mbar), temperature (degrees C) and depth (m) arrays.
+def loadRaw(path, fluidDensity=DENSITY_FRESHWATER):
+    with np.load(path) as log:
+        pressure, temperature, depth = compensate(log['D1'], log['D2'], log['calibration'].tolist(),
+                                                  int(log['model']), fluidDensity)
+        return {'time': log['time'], 'pressure': pressure, 'temperature': temperature, 'depth': depth}
+
+
 class MS5837(object):
 
     # Registers
@@ -298,6 +394,16 @@ class MS5837(object):
         self._D1 = 0
         self._D2 = 0
 
+        # Conversion in progress of poll(): None, or the D1/D2 conversion command and when it completes.
+        self._converting = None
+        self._ready_at = 0
+        self._next = self._MS5837_CONVERT_D1_256
+        self._have_D1 = False
+        self._have_D2 = False
+
+        # Raw samples for compensation in bulk, see recordRaw().
+        self._raw = None
+
     def init(self):
         if self._bus is None:
             print("No bus!")
@@ -332,13 +438,19 @@ class MS5837(object):
             print("Invalid oversampling option!")
             return False
 
+        # The chip ignores commands during a conversion, so let one started by poll() finish.
+        # Its result is abandoned, poll() starts over.
+        if self._converting is not None:
+            remaining = self._ready_at - monotonic()
+            if remaining > 0:
+                sleep(remaining)
+            self._converting = None
+
         # Request D1 conversion (temperature)
         self._bus.write_byte(self._MS5837_ADDR, self._MS5837_CONVERT_D1_256 + 2*oversampling)
 
         # Maximum conversion time increases linearly with oversampling
-        # max time (seconds) ~= 2.2e-6(x) where x = OSR = (2^8, 2^9, ..., 2^13)
-        # We use 2.5e-6 for some overhead
-        sleep(2.5e-6 * 2**(8+oversampling))
+        sleep(self.conversionTime(oversampling))
 
         d = self._bus.read_i2c_block_data(self._MS5837_ADDR, self._MS5837_ADC_READ, 3)
         self._D1 = d[0] << 16 | d[1] << 8 | d[2]
@@ -347,17 +459,97 @@ class MS5837(object):
         self._bus.write_byte(self._MS5837_ADDR, self._MS5837_CONVERT_D2_256 + 2*oversampling)
 
         # As above
-        sleep(2.5e-6 * 2**(8+oversampling))
+        sleep(self.conversionTime(oversampling))
 
         d = self._bus.read_i2c_block_data(self._MS5837_ADDR, self._MS5837_ADC_READ, 3)
         self._D2 = d[0] << 16 | d[1] << 8 | d[2]
 
         # Calculate compensated pressure and temperature
         # using raw ADC values and internal calibration
-        self._calculate()
+        self._sampled()
 
         return True
 
+    # Maximum conversion time in seconds for an oversampling option
+    # max time (seconds) ~= 2.2e-6(x) where x = OSR = (2^8, 2^9, ..., 2^13)
+    # We use 2.5e-6 for some overhead
+    def conversionTime(self, oversampling):
+        return 2.5e-6 * 2**(8+oversampling)
+
+    # Non-blocking read, for loops that must not sleep. Each call either does nothing (a
+    # conversion is still running), or reads the finished conversion and starts the next
+    # one right away, alternating D1 (pressure) and D2 (temperature) conversions.
+    # Returns True when the call produced a new pressure and temperature, which happens on
+    # every call after a conversion time has elapsed, once both have been converted once.
+    # The oversampling may change between calls, it applies from the next conversion.
+    # If calculate is False, the compensation is skipped and only the raw samples are recorded
+    # (see recordRaw()), to keep the math off the sampling path.
+    def poll(self, oversampling=OSR_8192, calculate=True):
+        if self._bus is None:
+            print("No bus!")
+            return False
+
+        if oversampling < OSR_256 or oversampling > OSR_8192:
+            print("Invalid oversampling option!")
+            return False
+
+        now = monotonic()
+        if self._converting is not None:
+            if now < self._ready_at:
+                return False
+
+            d = self._bus.read_i2c_block_data(self._MS5837_ADDR, self._MS5837_ADC_READ, 3)
+            if self._converting == self._MS5837_CONVERT_D1_256:
+                self._D1 = d[0] << 16 | d[1] << 8 | d[2]
+                self._have_D1 = True
+                self._next = self._MS5837_CONVERT_D2_256
+            else:
+                self._D2 = d[0] << 16 | d[1] << 8 | d[2]
+                self._have_D2 = True
+                self._next = self._MS5837_CONVERT_D1_256
+
+        # Start the next conversion before calculating, so it runs while the caller works.
+        self._bus.write_byte(self._MS5837_ADDR, self._next + 2*oversampling)
+        ready = self._converting is not None and self._have_D1 and self._have_D2
+        self._converting = self._next
+        # From after the command was sent, the margin of conversionTime() is shorter than an I2C transaction.
+        self._ready_at = monotonic() + self.conversionTime(oversampling)
+
+        if ready:
+            self._sampled(calculate)
+        return ready
+
+    # Records the new raw samples, and compensates them unless told not to
+    def _sampled(self, calculate=True):
+        if self._raw is not None:
+            self._raw.append(monotonic(), self._D1, self._D2)
+        if calculate:
+            self._calculate()
+
+    # Starts (or stops, with enabled False) keeping every raw D1/D2 sample, for compensation
+    # in bulk with compensateRaw() or saveRaw(). Returns the RawSamples.
+    def recordRaw(self, enabled=True):
+        self._raw = RawSamples() if enabled else None
+        return self._raw
+
+    # Returns a snapshot of the recorded raw samples, safe while the sensor keeps recording.
+    def _rawSnapshot(self):
+        if self._raw is None:
+            raise RuntimeError("Raw samples are not being recorded, call recordRaw() first")
+        return self._raw.snapshot()
+
+    # Compensates the recorded raw samples in bulk.
+    # Returns arrays of the time.monotonic(), pressure (mbar), temperature (degrees C) and depth (m) of every sample.
+    def compensateRaw(self):
+        time, D1, D2 = self._rawSnapshot()
+        pressure, temperature, depth = compensate(D1, D2, self._C, self._model, self._fluidDensity)
+        return time, pressure, temperature, depth
+
+    # Saves the recorded raw samples with the calibration needed to compensate them (see loadRaw()).
+    def saveRaw(self, path):
+        time, D1, D2 = self._rawSnapshot()
+        np.savez(path, time=time, D1=D1, D2=D2, calibration=np.array(self._C[:7]), model=self._model)
+
     def setFluidDensity(self, denisty):
         self._fluidDensity = denisty
 
@@ -415,8 +607,8 @@ class MS5837(object):
                 OFFi = (3*(self._temperature-2000)*(self._temperature-2000))/2
                 SENSi = (5*(self._temperature-2000)*(self._temperature-2000))/8
                 if (self._temperature/100) < -15:  # Very low temp
-                    OFFi = OFFi+7*(self._temperature+long(1500))*(self._temperature+1500)
-                    SENSi = SENSi+4*(self._temperature+long(1500))*(self._temperature+1500)
+                    OFFi = OFFi+7*(self._temperature+1500)*(self._temperature+1500)
+                    SENSi = SENSi+4*(self._temperature+1500)*(self._temperature+1500)
             elif (self._temperature/100) >= 20:  # High temp
                 Ti = 2*(dT*dT)/(137438953472)
                 OFFi = (1*(self._temperature-2000)*(self._temperature-2000))/16
@@ -1,52 +1,292 @@
 """
 The radio class enables communication over wireless serial radios.
 """
+import heapq
+import itertools
+import threading
+from collections import deque
 import serial
 import os
+from . import protocol
+
 TIMEOUT_DURATION = 2
+IO_POLL_INTERVAL = 0.01  # Read timeout of the background receive thread.
+TX_QUEUE_SIZE = 64
+RX_QUEUE_SIZE = 256
 DEFAULT_BAUDRATE = 115200
 
 
 class Radio:
-    def __init__(self, serial_path, baudrate=DEFAULT_BAUDRATE):
+    def __init__(self, serial_path, baudrate=DEFAULT_BAUDRATE, blocking=True, threaded=False):
         """
         Initializes the radio object.
 
         serial_path: Absolute path to serial port for specified device.
+        blocking:    If False, reads never wait on the serial port. They only drain
+                     the bytes already received and return immediately.
+        threaded:    If True, background threads own the serial port. send() only
+                     queues the message by priority and receive() returns the
+                     messages already read, so callers never wait on the radio.
         """
+        self.blocking = blocking
+        self.threaded = threaded
+
+        if threaded:
+            timeout = IO_POLL_INTERVAL
+        elif blocking:
+            timeout = TIMEOUT_DURATION
+        else:
+            timeout = 0
 
         # Establish connection to the serial radio.
         self.ser = serial.Serial(serial_path,
                                  baudrate=baudrate, parity=serial.PARITY_NONE,
                                  stopbits=serial.STOPBITS_ONE, bytesize=serial.EIGHTBITS,
-                                 timeout=TIMEOUT_DURATION
+                                 timeout=timeout
                                  )
 
+        # Received bytes that do not yet form a complete line (non-blocking mode).
+        self.rx_buffer = bytearray()
+
+        # Splits received bytes into protocol messages.
+        self.decoder = protocol.Decoder()
+
+        # Bounded send queue, a heap of (priority, order, frame) entries (threaded mode).
+        self.tx_queue = []
+        self.tx_order = itertools.count()
+        self.tx_ready = threading.Condition()
+        self.rx_queue = deque()
+        self.rx_lock = threading.Lock()
+        self.max_queue_depth = 0
+        self.dropped = [0] * (protocol.PRIORITY_BULK + 1)
+        self.rx_dropped = [0] * (protocol.PRIORITY_BULK + 1)
+        self.error = None
+        self.running = threaded
+
+        if threaded:
+            self.tx_thread = threading.Thread(target=self.tx_loop, daemon=True)
+            self.rx_thread = threading.Thread(target=self.rx_loop, daemon=True)
+            self.tx_thread.start()
+            self.rx_thread.start()
+
     def write(self, message):
         """
         Sends provided message over serial connection.
 
         message: A string message that is sent over serial connection.
         """
-        self.ser.write(message)
+        if self.threaded:
+            self.check_running()
+            self.queue(message, protocol.PRIORITY_COMMAND)
+        else:
+            self.ser.write(message)
+
+    def send(self, type_id, *fields, priority=None):
+        """
+        Encodes a protocol message into a binary frame and sends it. Returns False
+        if the message was dropped because the send queue is full.
+
+        type_id:  Message type id from the protocol module.
+        fields:   Field values matching the message schema.
+        priority: Overrides the default priority of the message type (threaded mode).
+        """
+        frame = protocol.encode(type_id, *fields)
+        if not self.threaded:
+            self.ser.write(frame)
+            return True
+
+        self.check_running()
+        if priority is None:
+            priority = protocol.priority(type_id)
+        return self.queue(frame, priority)
+
+    def queue(self, frame, priority):
+        """
+        Adds an encoded frame to the bounded send queue of the transmit thread.
+        Returns False if the frame was dropped because the queue is full.
+        """
+        with self.tx_ready:
+            if len(self.tx_queue) >= TX_QUEUE_SIZE and not self.make_room(priority):
+                self.dropped[priority] += 1
+                return False
+
+            heapq.heappush(self.tx_queue, (priority, next(self.tx_order), frame))
+            self.max_queue_depth = max(self.max_queue_depth, len(self.tx_queue))
+            self.tx_ready.notify()
+        return True
+
+    def make_room(self, priority):
+        """
+        Evicts one queued frame so a new frame of the given priority fits. Only bulk data
+        and telemetry are evicted (least important, then oldest, since it is the most stale),
+        queued safety messages, ACKs and commands never are. Returns False if the new frame
+        should be dropped instead.
+        """
+        droppable = [entry for entry in self.tx_queue if entry[0] >= protocol.PRIORITY_TELEMETRY]
+        if not droppable:
+            return False
+        victim = min(droppable, key=lambda entry: (-entry[0], entry[1]))
+        if victim[0] < priority:
+            return False
+
+        self.tx_queue.remove(victim)
+        heapq.heapify(self.tx_queue)
+        self.dropped[victim[0]] += 1
+        return True
+
+    def tx_loop(self):
+        """
+        Transmit thread. Writes queued frames to the serial port, most important first.
+        """
+        while self.running:
+            with self.tx_ready:
+                while self.running and not self.tx_queue:
+                    self.tx_ready.wait()
+                if not self.running:
+                    return
+                frame = heapq.heappop(self.tx_queue)[2]
+
+            try:
+                self.ser.write(frame)
+            except Exception as e:
+                self.fail(e)
+
+    def rx_loop(self):
+        """
+        Receive thread. Decodes incoming frames into the receive queue.
+        """
+        while self.running:
+            try:
+                data = self.ser.read(max(1, self.ser.in_waiting))
+            except Exception as e:
+                self.fail(e)
+                return
+
+            if data:
+                with self.rx_lock:
+                    for message in self.decoder.feed(data):
+                        self.queue_received(message)
+
+    def queue_received(self, message):
+        """
+        Adds a received (type_id, fields) message to the bounded receive queue. When it is
+        full the oldest received bulk data or telemetry makes room, but safety messages,
+        ACKs and commands are never dropped, even if they exceed the bound.
+        """
+        priority = protocol.priority(message[0])
+        if len(self.rx_queue) >= RX_QUEUE_SIZE:
+            victim = next((queued for queued in self.rx_queue
+                           if protocol.priority(queued[0]) >= protocol.PRIORITY_TELEMETRY), None)
+            if victim is not None:
+                self.rx_queue.remove(victim)
+                self.rx_dropped[protocol.priority(victim[0])] += 1
+            elif priority >= protocol.PRIORITY_TELEMETRY:
+                self.rx_dropped[priority] += 1
+                return
+        self.rx_queue.append(message)
+
+    def fail(self, error):
+        """
+        Stops the I/O threads after a serial error. The error is raised by the next receive().
+        """
+        self.error = error
+        with self.tx_ready:
+            self.running = False
+            self.tx_ready.notify_all()
+
+    def check_running(self):
+        """
+        Raises the serial error that stopped the I/O threads, or an error if the radio
+        was closed, so a dead radio is never mistaken for a quiet one.
+        """
+        if self.error is not None:
+            raise self.error
+        if not self.running:
+            raise serial.SerialException("Radio is closed.")
+
+    def queue_depth(self):
+        """
+        Returns the number of frames waiting in the send queue.
+        """
+        return len(self.tx_queue)
+
+    def stats(self):
+        """
+        Returns a dictionary of send queue and link statistics.
+        """
+        return {
+            'queue_depth': len(self.tx_queue),
+            'max_queue_depth': self.max_queue_depth,
+            'dropped': list(self.dropped),
+            'rx_queue_depth': len(self.rx_queue),
+            'rx_dropped': list(self.rx_dropped),
+            'crc_errors': self.decoder.crc_errors,
+            'false_syncs': self.decoder.false_syncs,
+        }
+
+    def receive(self):
+        """
+        Returns a list of (type_id, fields) messages received over the serial connection.
+        """
+        if self.threaded:
+            self.check_running()
+            with self.rx_lock:
+                messages = list(self.rx_queue)
+                self.rx_queue.clear()
+            return messages
+
+        if self.blocking:
+            data = self.ser.read(max(1, self.ser.in_waiting))
+        else:
+            data = self.read_waiting()
+        return self.decoder.feed(data) if data else []
+
+    def read_waiting(self):
+        """
+        Returns only the bytes already waiting in the serial input buffer, without blocking.
+        """
+        waiting = self.ser.in_waiting
+        return self.ser.read(waiting) if waiting else b''
 
     def readlines(self):
         """
-        Returns a list of lines from buffer.
+        Returns a list of lines from buffer. In non-blocking mode only complete
+        lines are returned, partial lines are kept until the rest arrives.
         """
-        return self.ser.readlines()
+        if self.blocking:
+            return self.ser.readlines()
+
+        self.rx_buffer += self.read_waiting()
+        end = self.rx_buffer.rfind(b'\n') + 1
+        if end == 0:
+            return []
+
+        lines = [line + b'\n' for line in bytes(self.rx_buffer[:end - 1]).split(b'\n')]
+        del self.rx_buffer[:end]
+        return lines
 
     def readline(self):
         """
-        Returns a string from the serial connection.
+        Returns a string from the serial connection. In non-blocking mode an
+        empty string is returned if no complete line has been received.
         """
-        return self.ser.readline()
+        if self.blocking:
+            return self.ser.readline()
+
+        self.rx_buffer += self.read_waiting()
+        end = self.rx_buffer.find(b'\n') + 1
+        if end == 0:
+            return b''
+
+        line = bytes(self.rx_buffer[:end])
+        del self.rx_buffer[:end]
+        return line
 
     def is_open(self):
         """
         Returns a boolean if the serial connection is open.
         """
-        return self.ser.is_open
+        return self.ser.is_open and self.error is None
 
     def flush(self):
         """
@@ -58,4 +298,11 @@ class Radio:
         """
         Closes the serial connection
         """
+        if self.threaded:
+            with self.tx_ready:
+                self.running = False
+                self.tx_ready.notify_all()
+            for thread in (self.tx_thread, self.rx_thread):
+                if thread is not threading.current_thread():
+                    thread.join()
         self.ser.close()
@@ -0,0 +1,134 @@
+"""
+A cooperative fixed-rate scheduler for the AUV's main loop.
+
+Every task runs at its own period, against deadlines on time.monotonic() that advance by
+exactly one period per run, so the rate does not drift with the time the work takes. When
+several tasks are due the one with the highest priority (lowest number) runs first, and the
+due tasks are picked again after every run, so a slow task delays a control task by at most
+its own duration. Periods that were missed entirely are skipped and counted as overruns,
+instead of being caught up in a burst.
+"""
+import time
+
+MAX_SLEEP = 0.1  # Seconds, bounds the reaction to tasks added while sleeping.
+
+
+class Task:
+    """ A function called every period seconds, and its timing statistics. """
+
+    def __init__(self, name, period, function, priority=0):
+        """
+        name:     Name of the task, for statistics.
+        period:   Seconds between two runs.
+        function: Function called without arguments on every run.
+        priority: Tasks with a lower number run first when several are due.
+        """
+        self.name = name
+        self.period = period
+        self.function = function
+        self.priority = priority
+        self.deadline = None  # time.monotonic() the next run is due at.
+
+        self.runs = 0
+        self.overruns = 0
+        self.total_late = 0.0
+        self.max_late = 0.0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+
+    def run(self, now):
+        """
+        Runs the task, which was due at self.deadline, and schedules the next run.
+        Returns how late it started and how long it took, in seconds.
+        """
+        late = now - self.deadline
+        self.function()
+        duration = time.monotonic() - now
+
+        self.runs += 1
+        self.total_late += late
+        self.max_late = max(self.max_late, late)
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+
+        # Skip the periods that were missed entirely.
+        self.deadline += self.period
+        missed = int((now - self.deadline) // self.period) + 1 if now >= self.deadline else 0
+        if missed > 0:
+            self.overruns += missed
+            self.deadline += missed * self.period
+        return late, duration
+
+    def stats(self):
+        """
+        Returns a dictionary of the task's timing, in milliseconds.
+        """
+        runs = max(self.runs, 1)
+        return {
+            'runs': self.runs,
+            'overruns': self.overruns,
+            'mean_late_ms': round(self.total_late / runs * 1000, 3),
+            'max_late_ms': round(self.max_late * 1000, 3),
+            'mean_ms': round(self.total_duration / runs * 1000, 3),
+            'max_ms': round(self.max_duration * 1000, 3),
+        }
+
+
+class Scheduler:
+    """ Runs tasks at fixed rates from a single thread. """
+
+    def __init__(self, timers=None):
+        """
+        timers: Optional Timers (see timing.py) to record the duration and lateness of every run into.
+        """
+        self.tasks = []
+        self.running = False
+        self.timers = timers
+
+    def add(self, name, period, function, priority=0):
+        """ Adds a task, first due right away. Returns the Task. """
+        task = Task(name, period, function, priority)
+        task.deadline = time.monotonic()
+        self.tasks.append(task)
+        self.tasks.sort(key=lambda task: task.priority)
+        return task
+
+    def run_pending(self):
+        """
+        Runs the due tasks, the highest priority first, until none is due.
+        Returns the time.monotonic() the next task is due at.
+        """
+        while True:
+            now = time.monotonic()
+            if not self.tasks:
+                return now + MAX_SLEEP
+            due = None
+            for task in self.tasks:  # Sorted by priority.
+                if task.deadline <= now:
+                    due = task
+                    break
+            if due is None:
+                return min(task.deadline for task in self.tasks)
+            late, duration = due.run(now)
+            if self.timers is not None:
+                self.timers.record(due.name, duration)
+                self.timers.record(due.name + '_late', late)
+
+    def run(self):
+        """ Runs the tasks until stop() is called, sleeping until the next deadline in between. """
+        self.running = True
+        while self.running:
+            next_deadline = self.run_pending()
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(min(delay, MAX_SLEEP))
+
+    def stop(self):
+        """ Makes run() return after the current task. """
+        self.running = False
+
+    def stats(self):
+        """
+        Returns a dictionary of the timing statistics of every task, indexed by task name.
+        """
+        return {task.name: task.stats() for task in self.tasks}
@@ -0,0 +1,135 @@
+"""
+The sensor hub samples every sensor of the AUV on its own thread, at its own rate.
+
+Each sensor publishes its readings into a latest-value slot, an immutable Reading replaced
+by a single reference assignment, plus an optional ring buffer of recent readings. The
+control loop and the missions read the cached values without waiting on the hardware,
+and check the age of a reading to ignore a sensor that stopped responding.
+"""
+import collections
+import threading
+import time
+
+# A sensor reading. time is the time.monotonic() it was taken at, values a dictionary of the measured values.
+Reading = collections.namedtuple('Reading', ['time', 'values'])
+
+MAX_ERROR_BACKOFF = 5.0  # Seconds between attempts to read a failing sensor.
+
+
+class Sensor(threading.Thread):
+    """ Thread reading one sensor at a fixed rate. """
+
+    def __init__(self, name, period, read, history=0, timers=None):
+        """
+        name:    Name of the sensor.
+        period:  Seconds between two readings.
+        read:    Function returning a dictionary of values, or None if the sensor has no new values
+                 yet (e.g. a conversion is still running). It raises an exception when the sensor fails.
+        history: Number of recent readings to keep in a ring buffer, 0 for none.
+        timers:  Optional Timers (see timing.py) to record the duration of every read into.
+        """
+        threading.Thread.__init__(self, name='sensor-' + name, daemon=True)
+        self.sensor = name
+        self.period = period
+        self.read = read
+        self.timers = timers
+        self.latest = None
+        self.history = collections.deque(maxlen=history) if history > 0 else None
+        self.running = True
+
+        self.readings = 0
+        self.errors = 0
+        self.last_error = None
+
+    def run(self):
+        """ Reads the sensor every period seconds, on deadlines that do not drift with the read time. """
+        deadline = time.monotonic()
+        backoff = self.period
+        while self.running:
+            start = time.monotonic()
+            try:
+                values = self.read()
+                end = time.monotonic()
+                if values is not None:
+                    self.publish(Reading(end, values))
+                if self.timers is not None:
+                    self.timers.record(self.sensor, end - start)
+                backoff = self.period
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                backoff = min(backoff * 2, MAX_ERROR_BACKOFF)
+
+            # Skip the deadlines missed while reading, and wait longer while the sensor fails.
+            deadline += max(self.period, backoff)
+            now = time.monotonic()
+            if deadline < now:
+                deadline = now
+            time.sleep(deadline - now)
+
+    def publish(self, reading):
+        """ Makes a reading the latest one. """
+        if self.history is not None:
+            self.history.append(reading)
+        self.latest = reading
+        self.readings += 1
+
+    def stats(self):
+        """
+        Returns a dictionary of the readings taken and failed.
+        """
+        return {'readings': self.readings, 'errors': self.errors, 'last_error': self.last_error}
+
+
+class SensorHub:
+    """ The sensors of the AUV, indexed by name. """
+
+    def __init__(self, timers=None):
+        """
+        timers: Optional Timers (see timing.py) to record the duration of every read into.
+        """
+        self.timers = timers
+        self.sensors = {}
+
+    def add(self, name, period, read, history=0):
+        """ Adds a sensor and starts reading it. Returns the Sensor. """
+        sensor = Sensor(name, period, read, history, self.timers)
+        self.sensors[name] = sensor
+        sensor.start()
+        return sensor
+
+    def reading(self, name, max_age=None):
+        """ Returns the latest Reading of a sensor, or None if there is none (or it is older than max_age seconds). """
+        sensor = self.sensors.get(name)
+        reading = sensor.latest if sensor is not None else None
+        if reading is None or (max_age is not None and time.monotonic() - reading.time > max_age):
+            return None
+        return reading
+
+    def value(self, name, key, max_age=None):
+        """ Returns one value of the latest reading of a sensor, or None (see reading()). """
+        reading = self.reading(name, max_age)
+        return reading.values.get(key) if reading is not None else None
+
+    def age(self, name):
+        """ Returns the seconds since the latest reading of a sensor, or None if there is none. """
+        reading = self.reading(name)
+        return time.monotonic() - reading.time if reading is not None else None
+
+    def recent(self, name):
+        """ Returns the readings in the ring buffer of a sensor, oldest first. """
+        sensor = self.sensors.get(name)
+        if sensor is None or sensor.history is None:
+            return []
+        return list(sensor.history)
+
+    def stop(self):
+        """ Stops reading every sensor. """
+        for sensor in self.sensors.values():
+            sensor.running = False
+
+    def stats(self):
+        """
+        Returns a dictionary of the statistics of every sensor, indexed by name.
+        """
+        return {name: sensor.stats() for name, sensor in self.sensors.items()}
@@ -0,0 +1,136 @@
+"""
+The telemetry module decides when the AUV sends its sensor readings to the base station.
+
+Every telemetry field is a channel with its own send interval and deadband: a new
+value is only sent once the interval elapsed and it moved by more than the deadband,
+with a periodic refresh so the base station GUI never goes stale. Each message only
+carries the channels that are due (see codec.py). When the link
+congests (the radio send queue fills up or the ACK round-trip time rises) all
+intervals are stretched, freeing bandwidth for commands and downloads.
+"""
+import time
+
+REFRESH_INTERVAL = 5.0  # Seconds after which a value is resent even if it did not change.
+
+# Congestion control of the send intervals.
+ADAPT_INTERVAL = 1.0  # Seconds between adjustments of the backoff.
+CONGESTED_QUEUE_DEPTH = 4  # Frames waiting in the radio send queue.
+CONGESTED_RTT = 1.0  # Smoothed ACK round-trip time in seconds.
+BACKOFF_INCREASE = 2.0
+BACKOFF_DECREASE = 0.75
+MAX_BACKOFF = 16.0
+
+
+class Channel:
+    """ A single telemetry field, sent at most every interval and only when it changed. """
+
+    def __init__(self, name, interval, deadband=0.0, wrap=None, refresh=REFRESH_INTERVAL):
+        """
+        name:     Name of the field.
+        interval: Minimum seconds between two sends of the field.
+        deadband: Changes up to this size are not worth sending.
+        wrap:     Period of angular values (e.g. 360 for a heading), so 359 -> 1 is a change of 2.
+        refresh:  Seconds after which the field is sent even if it did not change.
+        """
+        self.name = name
+        self.interval = interval
+        self.deadband = deadband
+        self.wrap = wrap
+        self.refresh = refresh
+        self.value = None
+        self.sent_at = None
+
+    def change(self, value):
+        """ Returns how far value moved since it was last sent. """
+        delta = value - self.value
+        if self.wrap is not None:
+            delta = (delta + self.wrap / 2) % self.wrap - self.wrap / 2
+        return abs(delta)
+
+    def is_due(self, value, now, backoff):
+        """ Returns True if value should be sent now. """
+        if value is None:  # Sensor not available.
+            return False
+        if self.sent_at is None:
+            return True
+        elapsed = now - self.sent_at
+        if elapsed >= self.refresh * backoff:
+            return True
+        return elapsed >= self.interval * backoff and self.change(value) > self.deadband
+
+    def sent(self, value, now):
+        """ Records that value was sent. """
+        self.value = value
+        self.sent_at = now
+
+
+class TelemetryScheduler:
+    """ Decides when a telemetry message is sent, based on its channels and the link quality. """
+
+    def __init__(self, channels, period=0.0):
+        """
+        channels: List of Channel objects, one per field of the telemetry message.
+        period:   Seconds between two calls of poll(). A channel that falls due before the
+                  middle of the next period is sent right away instead of a period late.
+        """
+        for channel in channels:
+            if channel.interval < period:
+                raise ValueError("Interval of the " + channel.name + " channel is shorter than the telemetry period")
+        self.channels = channels
+        self.period = period
+        self.backoff = 1.0
+        self.adapted_at = time.monotonic()
+        self.sent_count = 0
+        self.values_sent_count = 0
+        self.suppressed_count = 0
+
+    def adapt(self, queue_depth, rtt):
+        """
+        Stretches the send intervals while the link is congested, and slowly
+        restores them once it recovered.
+
+        queue_depth: Frames waiting in the radio send queue.
+        rtt:         Smoothed ACK round-trip time in seconds, or None if not measured recently.
+        """
+        now = time.monotonic()
+        if now - self.adapted_at < ADAPT_INTERVAL:
+            return
+        self.adapted_at = now
+
+        congested = queue_depth >= CONGESTED_QUEUE_DEPTH or (rtt is not None and rtt > CONGESTED_RTT)
+        if congested:
+            self.backoff = min(MAX_BACKOFF, self.backoff * BACKOFF_INCREASE)
+        else:
+            self.backoff = max(1.0, self.backoff * BACKOFF_DECREASE)
+
+    def poll(self, values):
+        """
+        Returns the names of the channels to send now, which are recorded as sent, or an
+        empty list if no message should be sent. values is a dictionary of channel name ->
+        value, missing or None for sensors that are not available.
+        """
+        now = time.monotonic()
+        due = []
+        for channel in self.channels:
+            value = values.get(channel.name)
+            if channel.is_due(value, now + self.period / 2, self.backoff):
+                channel.sent(value, now)
+                due.append(channel.name)
+
+        if due:
+            self.sent_count += 1
+            self.values_sent_count += len(due)
+        else:
+            self.suppressed_count += 1
+        return due
+
+    def stats(self):
+        """
+        Returns a dictionary of scheduler statistics.
+        """
+        return {
+            'backoff': self.backoff,
+            'sent': self.sent_count,
+            'values_sent': self.values_sent_count,
+            'suppressed': self.suppressed_count,
+        }
@@ -0,0 +1,169 @@
+"""
+Lightweight timers for sections of the AUV's code, e.g. the main loop's tasks, IMU reads
+and motor updates.
+
+Durations are recorded into fixed-size HDR-style histograms: buckets are exponential with
+linear sub-buckets, so recording is a couple of integer operations and percentiles are
+within about 3% of the true value from a microsecond to over an hour. Each timer keeps a
+ring of histograms, one per interval of its rolling window, so the report covers the
+last window only and old stalls age out.
+"""
+import time
+
+SUB_BUCKET_BITS = 5  # 32 linear sub-buckets per power of two, about 3% precision.
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_BITS = 32  # Largest recordable value, 2^32 microseconds (about 71 minutes).
+BUCKETS = (MAX_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+MAX_VALUE = (1 << MAX_BITS) - 1
+
+WINDOW_INTERVALS = 6
+INTERVAL = 10.0  # Seconds, the rolling window is WINDOW_INTERVALS * INTERVAL long.
+PERCENTILES = (50, 99)
+
+
+def bucket_of(value):
+    """ Returns the index of the bucket of a value in microseconds. """
+    value = min(max(int(value), 0), MAX_VALUE)
+    shift = max(value.bit_length() - SUB_BUCKET_BITS - 1, 0)  # Keep the top 6 bits.
+    return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+
+def bucket_value(index):
+    """ Returns the highest value (in microseconds) that falls into a bucket. """
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return ((index - (shift << SUB_BUCKET_BITS) + 1) << shift) - 1
+
+
+class Histogram:
+    """ Counts of values in microseconds, in BUCKETS log-linear buckets. """
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.max = 0
+
+    def record(self, value):
+        """ Adds a value in microseconds. """
+        self.counts[bucket_of(value)] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def add(self, other):
+        """ Adds the values of another histogram to this one. """
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def clear(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.max = 0
+
+    def percentile(self, p):
+        """ Returns the value (in microseconds) that p percent of the values are at or below. """
+        if self.count == 0:
+            return 0
+        rank = max(1, int(self.count * p / 100.0 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+
+class Timer:
+    """ Times one section of code, over a rolling window. Usable as a context manager. """
+
+    def __init__(self, name, intervals=WINDOW_INTERVALS, interval=INTERVAL):
+        """
+        name:      Name of the section.
+        intervals: Number of histograms in the ring.
+        interval:  Seconds each histogram of the ring covers.
+        """
+        self.name = name
+        self.interval = interval
+        self.ring = [Histogram() for _ in range(intervals)]
+        self.position = 0
+        self.rotate_at = time.monotonic() + interval
+        self.started = None
+        self.total = 0  # Values recorded since the start, including the ones aged out.
+
+    def record(self, seconds):
+        """ Adds a duration in seconds. """
+        now = time.monotonic()
+        if now >= self.rotate_at:
+            self.rotate(now)
+        self.ring[self.position].record(seconds * 1e6)
+        self.total += 1
+
+    def rotate(self, now):
+        """ Moves on to the next histogram of the ring, clearing the intervals that passed. """
+        passed = min(int((now - self.rotate_at) // self.interval) + 1, len(self.ring))
+        for _ in range(passed):
+            self.position = (self.position + 1) % len(self.ring)
+            self.ring[self.position].clear()
+        self.rotate_at += passed * self.interval
+        if self.rotate_at <= now:  # The timer was idle for longer than the window.
+            self.rotate_at = now + self.interval
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def stop(self):
+        """ Records the time since start(). Returns it in seconds. """
+        duration = time.perf_counter() - self.started
+        self.record(duration)
+        return duration
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exception):
+        self.stop()
+        return False
+
+    def window(self):
+        """ Returns a Histogram of the values recorded during the rolling window. """
+        now = time.monotonic()
+        if now >= self.rotate_at:
+            self.rotate(now)
+        merged = Histogram()
+        for histogram in self.ring:
+            merged.add(histogram)
+        return merged
+
+    def report(self):
+        """
+        Returns (count, p50, p99, max) of the rolling window, in microseconds.
+        """
+        window = self.window()
+        return (window.count,) + tuple(int(window.percentile(p)) for p in PERCENTILES) + (min(int(window.max), MAX_VALUE),)
+
+
+class Timers:
+    """ The timers of every section, created when first used. """
+
+    def __init__(self):
+        self.timers = {}
+
+    def __getitem__(self, name):
+        """ Returns the Timer of a section, e.g. "with timers['imu']: ..." """
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer(name)
+        return timer
+
+    def record(self, name, seconds):
+        """ Adds a duration in seconds to the timer of a section. """
+        self[name].record(seconds)
+
+    def report(self):
+        """
+        Returns a dictionary of (count, p50, p99, max) in microseconds, indexed by section name.
+        """
+        return {name: timer.report() for name, timer in sorted(self.timers.items())}
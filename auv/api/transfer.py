@@ -0,0 +1,85 @@
+"""
+The transfer class streams a file to the base station over the radio in numbered chunks.
+"""
+import os
+import zlib
+from collections import deque
+
+from . import protocol
+
+DEFAULT_CHUNK_SIZE = 240
+MAX_CHUNK_SIZE = protocol.MAX_PAYLOAD - protocol.SCHEMA[protocol.D].struct.size
+MAX_QUEUED_CHUNKS = 8  # Chunks allowed in the radio send queue at once.
+
+
+class FileSender:
+    """ Sends a file as fixed-size chunks, each with its own CRC, and resends what the base station reports missing. """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        path:       Path of the file to send.
+        chunk_size: Payload bytes per chunk, at most MAX_CHUNK_SIZE.
+        """
+        if chunk_size < 1 or chunk_size > MAX_CHUNK_SIZE:
+            raise ValueError("Chunk size must be between 1 and " + str(MAX_CHUNK_SIZE))
+
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+        self.chunk_count = (self.size + chunk_size - 1) // chunk_size
+        self.file = open(path, 'rb')
+
+        # Identifies this file (and version of it), so the base station can resume it.
+        key = path + ':' + str(self.size) + ':' + str(os.path.getmtime(path))
+        self.transfer_id = zlib.crc32(key.encode('utf-8')) & 0xFFFF
+
+        # Nothing is streamed until the base station reports which chunks it is missing.
+        self.queue = deque()
+        self.done_sent = True
+        self.finished = False
+        self.chunks_sent = 0
+
+    def info(self):
+        """ Returns the fields of the D_INFO message describing this transfer. """
+        return (self.transfer_id, self.size, self.chunk_size)
+
+    def resend(self, first, bitmap):
+        """
+        Queues the chunks reported missing by a D_RESEND message.
+
+        first:  First missing chunk index.
+        bitmap: Bit i set means chunk first + 1 + i is missing. The bitmap reaches the
+                last chunk the base station received, so every chunk past its end is
+                missing as well.
+        """
+        missing = {first}
+        for i in range(len(bitmap) * 8):
+            if bitmap[i >> 3] >> (i & 7) & 1:
+                missing.add(first + 1 + i)
+        missing.update(range(first + 1 + len(bitmap) * 8, self.chunk_count))
+
+        self.queue = deque(sorted(index for index in missing if index < self.chunk_count))
+        self.finished = not self.queue
+        self.done_sent = self.finished
+
+    def update(self, radio):
+        """ Queues the next chunks on the radio, without flooding its send queue. """
+        for _ in range(MAX_QUEUED_CHUNKS):
+            if radio.queue_depth() >= MAX_QUEUED_CHUNKS:
+                return
+
+            if not self.queue:
+                if not self.done_sent:  # Lets the base station check for missing chunks.
+                    radio.send(protocol.D_DONE, self.transfer_id)
+                    self.done_sent = True
+                return
+
+            index = self.queue.popleft()
+            self.file.seek(index * self.chunk_size)
+            data = self.file.read(self.chunk_size)
+            radio.send(protocol.D, self.transfer_id, index, zlib.crc32(data), data)
+            self.chunks_sent += 1
+
+    def close(self):
+        """ Closes the file being sent. """
+        self.file.close()
@@ -10,17 +10,46 @@ import time
 
 # Custom imports
 from api import Radio
+from api import ReliableLink
+from api import FileSender
+from api import Channel, TelemetryScheduler
+from api import TelemetryEncoder
+from api import ControlReceiver
+from api import Scheduler
+from api import Timers
+from api import SensorHub
 from api import IMU
 from api import PressureSensor
+from api.ms5837 import OSR_DEPTH_HOLD
 from api import MotorController
+from api import protocol
 from missions import *
 
 # Constants for the AUV
-RADIO_PATH = '/dev/serial/by-id/usb-Silicon_Labs_CP2102_USB_to_UART_Bridge_Controller_0001-if00-port0'
+# NAUTILUS_RADIO_PATH overrides the radio device, e.g. to run on the link simulator in sim/.
+RADIO_PATH = os.environ.get('NAUTILUS_RADIO_PATH', '/dev/serial/by-id/usb-Silicon_Labs_CP2102_USB_to_UART_Bridge_Controller_0001-if00-port0')
 IMU_PATH = '/dev/serial0'
-PING = b'PING\n'
-THREAD_SLEEP_DELAY = 0.05
+# Periods of the main loop's tasks, in seconds (see api/scheduler.py).
+CONTROL_PERIOD = 1 / 50  # Commands, manual control and the current mission.
+TRANSFER_PERIOD = 1 / 20  # Download chunks and retransmissions.
+TELEMETRY_PERIOD = 1 / 5  # Sensor readings sent to the base station.
+LINK_PERIOD = 1 / 2  # Pings, lost link detection and radio reconnection.
 CONNECTION_TIMEOUT = 3
+DATA_DIRECTORY = 'data'  # Mission data files, the newest one is sent on d_data().
+DOWNLOAD_CHUNK_SIZE = 240
+
+# Telemetry channels of the auv_data message: (send interval in seconds, deadband).
+# Intervals are whole multiples of TELEMETRY_PERIOD, the rate the channels are polled at.
+HEADING_TELEMETRY = (TELEMETRY_PERIOD, 0.5)
+TEMPERATURE_TELEMETRY = (10 * TELEMETRY_PERIOD, 0.1)
+DEPTH_TELEMETRY = (TELEMETRY_PERIOD, 0.02)
+
+# Sensors, each read on its own thread (see api/sensors.py).
+IMU_PERIOD = 1 / 20  # Seconds between readings.
+PRESSURE_PERIOD = 1 / 50  # Polls of the pressure sensor's conversions, which never sleep.
+PRESSURE_OVERSAMPLING = OSR_DEPTH_HOLD
+SENSOR_HISTORY = 50  # Readings kept per sensor.
+SENSOR_MAX_AGE = 1.0  # Seconds after which a reading is too old to send or act on.
 
 
 def log(val):
@@ -33,18 +62,39 @@ class AUV():
     def __init__(self):
         """ Constructor for the AUV """
         self.radio = None
+        self.link = None
         self.pressure_sensor = None
         self.imu = None
         self.mc = MotorController()
         self.connected_to_bs = False
         self.time_since_last_ping = 0.0
         self.current_mission = None
-
-        # Get all non-default callable methods in this class
-        self.methods = [m for m in dir(AUV) if not m.startswith('__')]
+        self.sender = None
+        self.telemetry = TelemetryScheduler([
+            Channel('heading', *HEADING_TELEMETRY, wrap=360),
+            Channel('temperature', *TEMPERATURE_TELEMETRY),
+            Channel('depth', *DEPTH_TELEMETRY),
+        ], TELEMETRY_PERIOD)
+        self.encoder = TelemetryEncoder()
+        self.control = ControlReceiver()
+        self.timers = Timers()  # Timing of the main loop's tasks, sensor reads and motor updates.
+        self.scheduler = Scheduler(self.timers)
+        self.sensors = SensorHub(self.timers)
+
+        # Dispatch table of base station commands, indexed by protocol message type.
+        self.handlers = {
+            protocol.TEST_MOTOR: lambda motor: self.test_motor(protocol.MOTORS[motor]),
+            protocol.START_MISSION: self.start_mission,
+            protocol.ABORT_MISSION: self.abort_mission,
+            protocol.D_DATA: self.d_data,
+            protocol.TIMING_QUERY: self.timing_query,
+        }
 
         try:
-            self.pressure_sensor = PressureSensor()
+            pressure_sensor = PressureSensor()
+            if not pressure_sensor.init():  # Reads the calibration.
+                raise Exception("Pressure sensor initialization failed.")
+            self.pressure_sensor = pressure_sensor
             log("Pressure sensor has been found")
         except:
             log("Pressure sensor is not connected to the AUV.")
@@ -56,15 +106,43 @@ class AUV():
             log("IMU is not connected to the AUV on IMU_PATH.")
 
         try:
-            self.radio = Radio(RADIO_PATH)
+            self.radio = Radio(RADIO_PATH, threaded=True)
+            self.open_link()
             log("Radio device has been found.")
         except:
             log("Radio device is not connected to AUV on RADIO_PATH.")
 
+        # Start sampling the sensors that were found.
+        if self.imu is not None:
+            self.sensors.add('imu', IMU_PERIOD, self.read_imu, SENSOR_HISTORY)
+        if self.pressure_sensor is not None:
+            self.sensors.add('pressure', PRESSURE_PERIOD, self.read_pressure, SENSOR_HISTORY)
+
         self.main_loop()
 
+    def read_imu(self):
+        """ Reads the IMU, on the sensor hub's thread. """
+        values = {'temperature': self.imu.temperature}
+        heading = self.imu.quaternion[0]
+        if heading is not None:
+            values['heading'] = abs(heading * 360)
+        return values
+
+    def read_pressure(self):
+        """ Polls the pressure sensor's conversions, on the sensor hub's thread. Returns None until a new reading is ready. """
+        if not self.pressure_sensor.poll(PRESSURE_OVERSAMPLING):
+            return None
+        return {'depth': self.pressure_sensor.depth(), 'pressure': self.pressure_sensor.pressure(),
+                'temperature': self.pressure_sensor.temperature()}
+
     def xbox(self, data):
-        self.mc.update_motor_speeds(data)
+        with self.timers['motors']:
+            self.mc.update_motor_speeds(data)
+
+    def xbox_command(self, timestamp, *speeds):
+        """ Applies the motor speeds of a manual control packet, unless it is stale. """
+        if self.control.accept(timestamp):
+            self.xbox(list(speeds))
 
     def test_motor(self, motor):
         """ Method to test all 4 motors on the AUV """
@@ -83,118 +161,158 @@ class AUV():
             raise Exception('No implementation for motor name: ', motor)
 
     def main_loop(self):
-        """ Main connection loop for the AUV. """
+        """ Main connection loop for the AUV, runs the AUV's tasks at their fixed rates. """
 
         log("Starting main connection loop.")
-        while True:
-
-            # Always try to update connection status.
-            if time.time() - self.time_since_last_ping > CONNECTION_TIMEOUT:
-                # Line read was EMPTY, but 'before' connection status was successful? Connection verification failed.
-                if self.connected_to_bs is True:
-                    log("Lost connection to BS.")
-
-                    # reset motor speed to 0 immediately
-                    self.mc.update_motor_speeds([0, 0, 0, 0])
-                    log("DEBUG TODO speeds reset")
-
-                    self.connected_to_bs = False
-
-            if self.radio is None or self.radio.is_open() is False:
-                try:  # Try to connect to our devices.
-                    self.radio = Radio(RADIO_PATH)
-                    log("Radio device has been found!")
-                except:
-                    pass
-            else:
-                try:
-                    # Always send a connection verification packet and attempt to read one.
-                    # self.radio.write(AUV_PING)
-                    self.radio.write(PING)
-
-                    if self.connected_to_bs is True:  # Send our AUV packet as well.
-
-                        # TODO Data sending logic
-                        #
-                        # if (sending_data):
-                        #    if(data.read(500000) != EOF)
-                        #        send("d("+data.nextBytes+")")
-                        #    else:
-                        #        send("d_done()")
-                        #        sending_data = False
-
-                        if self.imu is not None:
-                            try:
-                                heading = self.imu.quaternion[0]
-                                if heading is not None:
-                                    heading = round(
-                                        abs(heading * 360) * 100.0) / 100.0
-
-                                    temperature = self.imu.temperature
-                                    # (Heading, Temperature)
-                                    if temperature is not None:
-                                        self.radio.write(str.encode(
-                                            "auv_data(" + str(heading) + ", " + str(temperature) + ")\n"))
-                            except:
-                                pass
-
-                    # Read ALL lines stored in buffer (probably around 2-3 commands)
-                    lines = self.radio.readlines()
-                    self.radio.flush()
-
-                    for line in lines:
-                        if line == PING:  # We have a ping!
-                            self.time_since_last_ping = time.time()
-                            if self.connected_to_bs is False:
-                                log("Connection to BS verified.")
-                                self.connected_to_bs = True
-
-                                # TODO test case: set motor speeds
-                                data = [1, 2, 3, 4]
-                                self.xbox(data)
-
-                        elif len(line) > 1:
-                            # Line was read, but it was not equal to a BS_PING
-                            log(
-                                "Possible command found. Line read was: " + str(line))
-
-                            # Decode into a normal utd-8 encoded string and delete newline character
-                            message = line.decode('utf-8').replace("\n", "")
-
-                            if len(message) > 2 and "(" in message and ")" in message:
-                                # Get possible function name
-                                possible_func_name = message[0:message.find(
-                                    "(")]
-
-                                if possible_func_name in self.methods:
-                                    log(
-                                        "Recieved command from base station: " + message)
-                                    self.time_since_last_ping = time.time()
-                                    self.connected_to_bs = True
-
-                                    try:  # Attempt to evaluate command.
-                                        # Append "self." to all commands.
-                                        eval('self.' + message)
-                                        self.radio.write(str.encode(
-                                            "log(\"[AUV]\tSuccessfully evaluated command: " + possible_func_name + "()\")\n"))
-                                    except Exception as e:
-                                        # log error message
-                                        log(str(e))
-                                        # Send verification of command back to base station.
-                                        self.radio.write(str.encode("log(\"[AUV]\tEvaluation of command " +
-                                                                    possible_func_name + "() failed.\")\n"))
-
-                except Exception as e:
-                    log("Error: " + str(e))
-                    self.radio.close()
-                    self.radio = None
-                    log("Radio is disconnected from pi!")
-                    continue
-
-            if(self.current_mission is not None):
-                self.current_mission.loop()
-
-            time.sleep(THREAD_SLEEP_DELAY)
+        self.scheduler.add('control', CONTROL_PERIOD, self.control_task, priority=0)
+        self.scheduler.add('transfer', TRANSFER_PERIOD, self.transfer_task, priority=1)
+        self.scheduler.add('telemetry', TELEMETRY_PERIOD, self.telemetry_task, priority=2)
+        self.scheduler.add('link', LINK_PERIOD, self.link_task, priority=3)
+        self.scheduler.run()
+
+    def control_task(self):
+        """ Applies the base station's commands, and runs the current mission. """
+        if self.radio is not None:
+            try:
+                # Read ALL messages stored in buffer (probably around 2-3 commands)
+                for type_id, fields in self.link.receive():
+                    if type_id == protocol.PING:  # We have a ping!
+                        self.time_since_last_ping = time.time()
+                        if self.connected_to_bs is False:
+                            log("Connection to BS verified.")
+                            self.connected_to_bs = True
+
+                            # TODO test case: set motor speeds
+                            data = [1, 2, 3, 4]
+                            self.xbox(data)
+                    elif type_id == protocol.XBOX:  # Frequent, so not logged nor echoed like commands.
+                        self.time_since_last_ping = time.time()
+                        self.xbox_command(*fields)
+                    elif type_id == protocol.D_RESEND:
+                        self.d_resend(*fields)
+                    else:
+                        self.handle_command(type_id, fields)
+            except Exception as e:
+                self.radio_error(e)
+
+        # Stop the motors if manual control stopped arriving, e.g. the controller was unplugged.
+        if self.current_mission is None and self.control.expired():
+            log("No manual control received for " + str(self.control.timeout) + " seconds, stopping motors.")
+            self.xbox([0, 0, 0, 0])
+            self.control.reset()
+
+        if(self.current_mission is not None):
+            self.current_mission.loop()
+
+    def transfer_task(self):
+        """ Streams the chunks of an ongoing download, and retransmits unacknowledged messages. """
+        if self.radio is None:
+            return
+        try:
+            if self.connected_to_bs is True and self.sender is not None:
+                self.sender.update(self.radio)
+
+            # Retransmit unacknowledged messages.
+            for type_id, fields in self.link.update():
+                log("Base station never acknowledged message: " + protocol.name(type_id))
+        except Exception as e:
+            self.radio_error(e)
+
+    def telemetry_task(self):
+        """ Reads the sensors, and sends the base station the readings worth sending. """
+        if self.radio is None or self.connected_to_bs is False:
+            return
+
+        # Send telemetry less often while the link is congested.
+        self.telemetry.adapt(self.radio.queue_depth(), self.link.recent_rtt())
+
+        # Latest sensor readings, a channel is left out while its sensor is not responding.
+        telemetry = {}
+        imu = self.sensors.reading('imu', SENSOR_MAX_AGE)
+        if imu is not None:
+            telemetry.update(imu.values)
+        depth = self.sensors.value('pressure', 'depth', SENSOR_MAX_AGE)
+        if depth is not None:
+            telemetry['depth'] = depth
+
+        try:
+            due = self.telemetry.poll(telemetry)
+            if due:
+                self.radio.send(protocol.AUV_DATA, self.encoder.encode(telemetry, due))
+        except Exception as e:
+            self.radio_error(e)
+
+    def link_task(self):
+        """ Pings the base station, detects a lost connection and reconnects the radio. """
+
+        # Always try to update connection status.
+        if time.time() - self.time_since_last_ping > CONNECTION_TIMEOUT:
+            # Line read was EMPTY, but 'before' connection status was successful? Connection verification failed.
+            if self.connected_to_bs is True:
+                log("Lost connection to BS.")
+                if self.radio is not None:
+                    log("Radio queue stats: " + str(self.radio.stats()))
+                log("Telemetry stats: " + str(self.telemetry.stats()))
+                log("Manual control stats: " + str(self.control.stats()))
+                log("Scheduler stats: " + str(self.scheduler.stats()))
+                log("Sensor stats: " + str(self.sensors.stats()))
+                self.control.reset()
+
+                # reset motor speed to 0 immediately
+                self.mc.update_motor_speeds([0, 0, 0, 0])
+                log("DEBUG TODO speeds reset")
+
+                self.connected_to_bs = False
+
+        if self.radio is None or self.radio.is_open() is False:
+            try:  # Try to connect to our devices.
+                self.radio = Radio(RADIO_PATH, threaded=True)
+                self.open_link()
+                log("Radio device has been found!")
+            except:
+                pass
+        else:
+            try:
+                # Always send a connection verification packet.
+                self.radio.send(protocol.PING)
+            except Exception as e:
+                self.radio_error(e)
+
+    def open_link(self):
+        """ Runs the reliable link over the newly opened radio, keeping its state across reconnects. """
+        if self.link is None:
+            self.link = ReliableLink(self.radio)
+        else:
+            self.link.reopen(self.radio)
+
+    def radio_error(self, e):
+        """ Drops the radio after an error, the link task reconnects it. The link is kept. """
+        log("Error: " + str(e))
+        if self.radio is not None:
+            self.radio.close()
+        self.radio = None
+        log("Radio is disconnected from pi!")
+
+    def handle_command(self, type_id, fields):
+        """ Looks up a base station command in the dispatch table and executes it. """
+        name = protocol.name(type_id)
+        handler = self.handlers.get(type_id)
+        if handler is None:
+            log("Received unknown message from base station: " + name)
+            return
+
+        log("Recieved command from base station: " + name + str(fields))
+        self.time_since_last_ping = time.time()
+        self.connected_to_bs = True
+
+        try:  # Attempt to execute command.
+            handler(*fields)
+            self.radio.send(protocol.LOG, "[AUV]\tSuccessfully evaluated command: " + name + "()")
+        except Exception as e:
+            # log error message
+            log(str(e))
+            # Send verification of command back to base station.
+            self.radio.send(protocol.LOG, "[AUV]\tEvaluation of command " + name + "() failed.")
 
     def start_mission(self, mission):
         """ Method that uses the mission selected and begin that mission """
@@ -203,7 +321,7 @@ class AUV():
                 self.current_mission = Mission1(
                     self, self.mc, self.imu, self.pressure_sensor)
                 log("Successfully started mission " + str(mission) + ".")
-                self.radio.write(str.encode("mission_started("+str(mission)+")\n"))
+                self.link.send(protocol.MISSION_STARTED, mission)
             except:
                 raise Exception("Mission " + str(mission) +
                                 " failed to start. Error: " + str(e))
@@ -212,15 +330,41 @@ class AUV():
         # if self.current_mission is None:
         #     self.current_mission = Mission1()
 
+    def timing_query(self):
+        """ Sends the base station the timing of every section, over the last minute. """
+        for name, report in self.timers.report().items():
+            self.radio.send(protocol.TIMING, *report, name.encode())
+
     def d_data(self):
-        # TODO Set sending data flag
-        # self.sending_data = true
-        pass
+        """ Begins sending the newest mission data file to the base station. """
+        files = [os.path.join(DATA_DIRECTORY, name) for name in os.listdir(DATA_DIRECTORY)]
+        files = [path for path in files if os.path.isfile(path)]
+        if len(files) == 0:
+            raise Exception("No mission data to download in " + DATA_DIRECTORY)
+
+        if self.sender is not None:
+            self.sender.close()
+        self.sender = FileSender(max(files, key=os.path.getmtime), DOWNLOAD_CHUNK_SIZE)
+        log("Sending " + self.sender.path + " (" + str(self.sender.size) + " bytes).")
+
+        # Chunks are streamed once the base station answers with the chunks it is missing.
+        self.link.send(protocol.D_INFO, *self.sender.info())
+
+    def d_resend(self, transfer_id, first, bitmap):
+        """ Queues the chunks the base station is missing, or ends the download if none are. """
+        if self.sender is None or self.sender.transfer_id != transfer_id:
+            return
+
+        self.sender.resend(first, bitmap)
+        if self.sender.finished:
+            log("Base station received all of " + self.sender.path + ".")
+            self.sender.close()
+            self.sender = None
 
     def abort_mission(self):
         self.current_mission = None
         log("Successfully aborted the current mission.")
-        self.radio.write(str.encode("mission_failed()\n"))
+        self.link.send(protocol.MISSION_FAILED)
 
 
 def main():
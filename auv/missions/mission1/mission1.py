@@ -1,5 +1,11 @@
+import time
+
+from api import protocol
+
 MAX_DEPTH_METERS = 50.0
 NEAR_SURFACE_METERS = 0.5
+MAX_DEPTH_AGE = 1.0  # Seconds after which a depth reading is too old to act on.
+DEPTH_LOST_GRACE = 0.5  # Seconds without a recent depth reading before the dive is abandoned.
 
 
 class Mission1():
@@ -8,12 +14,37 @@ class Mission1():
     def __init__(self, auv, motor_controller, pressure_sensor, IMU):
         """ Creates new audio collection mission object. Save parameters as local variables, and assign our state to starting state """
 
+        self.auv = auv
         self.motor_controller = motor_controller
         self.pressure_sensor = pressure_sensor
         self.IMU = IMU
 
         # Assign our state to starting state.
         self.state = "START"
+        self.depth_lost_at = None  # time.monotonic() the depth reading went missing at.
+
+    def depth(self):
+        """ Returns the latest depth read by the AUV's sensor hub, or None if it is too old. """
+        depth = self.auv.sensors.value('pressure', 'depth', MAX_DEPTH_AGE)
+        if depth is not None:
+            self.depth_lost_at = None
+        elif self.depth_lost_at is None:
+            self.depth_lost_at = time.monotonic()
+        return depth
+
+    def depth_lost(self):
+        """ Returns True once the depth has been unknown for longer than DEPTH_LOST_GRACE. """
+        return self.depth_lost_at is not None and time.monotonic() - self.depth_lost_at > DEPTH_LOST_GRACE
+
+    def fail(self, reason):
+        """ Stops the motors, so the AUV floats up, and tells the base station the mission failed.
+        The mission is ended, so the AUV's manual control watchdog runs again. """
+        self.motor_controller.update_motor_speeds([0, 0, 0, 0])
+        self.state = "FAILED"
+        self.auv.current_mission = None
+        print("[MISSION1]\t" + reason)
+        if self.auv.radio is not None:
+            self.auv.link.send(protocol.MISSION_FAILED)
 
     def loop(self):
         """ Continuously running loop function, run by AUV main thread. """
@@ -25,10 +56,15 @@ class Mission1():
 
         if self.state == "DIVING":
             # Read Depth
-            depth = self.pressure_sensor.depth()
+            depth = self.depth()
+
+            # Never keep diving blind, e.g. when the pressure sensor stopped responding.
+            if depth is None:
+                if self.depth_lost():
+                    self.fail("Lost the depth reading while diving, stopped the motors.")
 
             # If we reached max depth
-            if depth >= MAX_DEPTH_METERS:
+            elif depth >= MAX_DEPTH_METERS:
                 # Turn off our motors
                 self.motor_controller.update_motor_speeds([0, 0, 0, 0])
 
@@ -40,8 +76,8 @@ class Mission1():
 
         if self.state == "RISING":
             # Read Depth
-            depth = self.pressure_sensor.depth()
+            depth = self.depth()
 
-            if depth <= NEAR_SURFACE_METERS:
+            if depth is not None and depth <= NEAR_SURFACE_METERS:
                 self.hydrophone.end_recording()
                 self.state = "DONE"
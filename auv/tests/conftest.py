@@ -0,0 +1,54 @@
+"""
+Makes the AUV's api modules importable by the tests as the 'auv_api' package, without
+running api/__init__.py, which needs the AUV's hardware drivers, and provides the
+simulated clock of the timing tests.
+"""
+import os
+import sys
+import types
+
+import pytest
+
+API_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api')
+
+if 'auv_api' not in sys.modules:
+    package = types.ModuleType('auv_api')
+    package.__path__ = [API_PATH]
+    sys.modules['auv_api'] = package
+
+
+class Clock:
+    """ Stands in for the time module, returning a time set by the test. """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(request, monkeypatch):
+    """
+    Returns a Clock that replaces the time of the modules listed in the test module's
+    CLOCKED list: a module that imports time gets the Clock as its time module, one
+    that imports functions from time gets the Clock's methods instead.
+    """
+    clock = Clock()
+    for module in request.module.CLOCKED:
+        if isinstance(getattr(module, 'time', None), types.ModuleType):
+            monkeypatch.setattr(module, 'time', clock)
+            continue
+        for name in ('monotonic', 'perf_counter', 'time', 'sleep'):
+            if hasattr(module, name):
+                monkeypatch.setattr(module, name, getattr(clock, name))
+    return clock
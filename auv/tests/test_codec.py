@@ -0,0 +1,75 @@
+"""
+Tests of the telemetry codec: round trips, keyframes, deltas and lost frames.
+"""
+import pytest
+
+from auv_api import codec
+from auv_api.codec import TelemetryDecoder, TelemetryEncoder
+
+VALUES = {'heading': 359.5, 'temperature': 21.37, 'depth': 12.04, 'latitude': 32.8801234, 'longitude': -117.2340567}
+
+
+@pytest.mark.parametrize('value', [0, 1, -1, 63, -64, 64, 300, -300, 2 ** 40, -2 ** 40])
+def test_zigzag_varint(value):
+    buffer = bytearray()
+    codec.write_varint(buffer, codec.zigzag_encode(value))
+    decoded, offset = codec.read_varint(buffer, 0)
+    assert codec.zigzag_decode(decoded) == value and offset == len(buffer)
+
+
+def test_round_trip():
+    encoder, decoder = TelemetryEncoder(), TelemetryDecoder()
+    values = dict(VALUES)
+    for step in range(3 * codec.KEYFRAME_INTERVAL):
+        values['heading'] = (values['heading'] + 0.7) % 360  # Wraps around 360.
+        values['depth'] += 0.05
+        decoded = decoder.decode(encoder.encode(values))
+        assert decoded == pytest.approx({name: round(value, 7) for name, value in values.items()}, abs=0.006)
+
+
+def test_deltas_are_small():
+    encoder = TelemetryEncoder()
+    keyframe = encoder.encode(VALUES)
+    delta = encoder.encode(dict(VALUES, depth=VALUES['depth'] + 0.01))
+    assert keyframe[0] & codec.KEYFRAME and not delta[0] & codec.KEYFRAME
+    assert len(delta) == 2 + len(codec.CHANNELS)  # One byte per channel.
+
+
+def test_missing_channels_are_left_out():
+    encoder, decoder = TelemetryEncoder(), TelemetryDecoder()
+    assert decoder.decode(encoder.encode({'heading': 90.0, 'depth': None})) == {'heading': 90.0}
+
+
+def test_lost_keyframe_drops_its_deltas():
+    encoder, decoder = TelemetryEncoder(keyframe_interval=3), TelemetryDecoder()
+    frames = [encoder.encode(dict(VALUES, depth=depth)) for depth in (1.0, 2.0, 3.0, 4.0, 5.0)]
+
+    # Frames 0-2 are a keyframe and its deltas, frame 3 the next keyframe.
+    assert decoder.decode(frames[0])['depth'] == 1.0
+    assert [decoder.decode(frame)['depth'] for frame in frames[3:]] == [4.0, 5.0]
+
+    decoder = TelemetryDecoder()
+    assert decoder.decode(frames[1]) is None and decoder.decode(frames[2]) is None
+    assert decoder.dropped == 2
+    assert decoder.decode(frames[3])['depth'] == 4.0
+
+
+def test_lost_delta_does_not_corrupt_the_next():
+    encoder, decoder = TelemetryEncoder(), TelemetryDecoder()
+    frames = [encoder.encode(dict(VALUES, depth=depth)) for depth in (1.0, 2.0, 3.0)]
+    decoder.decode(frames[0])
+    assert decoder.decode(frames[2])['depth'] == 3.0
+
+
+def test_new_channel_forces_a_keyframe():
+    encoder, decoder = TelemetryEncoder(), TelemetryDecoder()
+    decoder.decode(encoder.encode({'heading': 10.0}))
+    frame = encoder.encode({'heading': 11.0, 'depth': 2.0})
+    assert frame[0] & codec.KEYFRAME
+    assert decoder.decode(frame) == {'heading': 11.0, 'depth': 2.0}
+
+
+def test_truncated_frame():
+    decoder = TelemetryDecoder()
+    assert decoder.decode(TelemetryEncoder().encode(VALUES)[:-1]) is None
+    assert decoder.dropped == 1
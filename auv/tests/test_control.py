@@ -0,0 +1,61 @@
+"""
+Tests of the manual control sender's rate limiting and the receiver's stale packet filter.
+"""
+from auv_api import control
+from auv_api.control import ControlReceiver, ControlSender, stamp, stamp_difference
+
+
+def test_stamp_difference_wraps():
+    assert stamp_difference(5, control.STAMP_MODULO - 5) == 10
+    assert stamp_difference(control.STAMP_MODULO - 5, 5) == -10
+
+
+def test_sender_deadband_and_keepalive():
+    sender = ControlSender()
+    assert sender.update((10, 0, 0, 0), now=0.0) == (0, 10, 0, 0, 0)
+    assert sender.update((11, 0, 0, 0), now=0.1) is None  # Within the deadband.
+    assert sender.update((20, 0, 0, 0), now=0.12) == (120, 20, 0, 0, 0)
+    assert sender.update((40, 0, 0, 0), now=0.13) is None  # Too soon after the last packet.
+    assert sender.update((40, 0, 0, 0), now=0.2) == (200, 40, 0, 0, 0)
+    assert sender.update((40, 0, 0, 0), now=0.6) is None
+    assert sender.update((40, 0, 0, 0), now=0.75) == (750, 40, 0, 0, 0)  # Keep-alive.
+    assert sender.stats() == {'sent': 4, 'suppressed': 3}
+
+
+def test_sender_always_sends_a_stop():
+    sender = ControlSender()
+    sender.update((1, 0, 0, 0), now=0.0)
+    assert sender.update((0, 0, 0, 0), now=0.1) is not None
+
+
+def test_receiver_drops_reordered_and_late_packets():
+    receiver = ControlReceiver()
+    base = 1000.0
+    # The base station's clock is 30 s behind, delivery takes 20 to 50 ms.
+    assert receiver.accept(stamp(base - 30.0), now=base + 0.02)
+    assert receiver.accept(stamp(base - 29.9), now=base + 0.15)
+    assert not receiver.accept(stamp(base - 29.95), now=base + 0.16)  # Out of order.
+    assert not receiver.accept(stamp(base - 29.8), now=base + 0.6)  # 400 ms late.
+    assert receiver.accept(stamp(base - 29.7), now=base + 0.35)
+    assert receiver.stats() == {'accepted': 3, 'stale': 2}
+
+
+def test_receiver_across_the_stamp_wrap():
+    receiver = ControlReceiver()
+    now = (control.STAMP_MODULO - 100) / 1000.0
+    for _ in range(10):
+        assert receiver.accept(stamp(now), now=now + 0.03)
+        now += 0.05
+
+
+def test_receiver_expires_and_resets():
+    receiver = ControlReceiver()
+    assert not receiver.expired(now=10.0)
+    receiver.accept(stamp(10.0), now=10.0)
+    assert not receiver.expired(now=10.0 + control.DEFAULT_TIMEOUT)
+    assert receiver.expired(now=10.1 + control.DEFAULT_TIMEOUT)
+
+    # After a reset, a restarted base station's older stamps are accepted again.
+    receiver.reset()
+    assert not receiver.expired(now=20.0)
+    assert receiver.accept(stamp(1.0), now=20.0)
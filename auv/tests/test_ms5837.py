@@ -0,0 +1,134 @@
+"""
+Tests of the MS5837 driver's bulk compensation of raw samples, against its scalar math.
+"""
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from auv_api import ms5837
+from auv_api.ms5837 import MS5837, RawSamples
+
+CLOCKED = [ms5837]
+
+CALIBRATION = [0, 34982, 36352, 20328, 22354, 26646, 26146, 0]
+
+
+def sensor(model):
+    """ Returns a sensor without a bus, its calculations are fed raw values directly. """
+    sensor = MS5837.__new__(MS5837)
+    sensor._model = model
+    sensor._fluidDensity = ms5837.DENSITY_FRESHWATER
+    sensor._C = CALIBRATION
+    sensor._raw = None
+    return sensor
+
+
+@pytest.mark.parametrize('model', [ms5837.MODEL_30BA, ms5837.MODEL_02BA])
+def test_compensate_matches_calculate(model):
+    scalar = sensor(model)
+    scalar.recordRaw()
+    expected = []
+    generator = random.Random(1)
+    for _ in range(2000):  # Covers the very low, low and high temperature branches.
+        scalar._D1 = generator.randint(4000000, 12000000)
+        scalar._D2 = generator.randint(0, 16777215)
+        scalar._sampled()
+        expected.append((scalar.pressure(), scalar.temperature(), scalar.depth()))
+
+    time, pressure, temperature, depth = scalar.compensateRaw()
+    expected = np.array(expected)
+    assert len(time) == 2000
+    assert temperature.min() < -15 and temperature.max() > 20
+    np.testing.assert_allclose(pressure, expected[:, 0], rtol=1e-12)
+    np.testing.assert_allclose(temperature, expected[:, 1], rtol=1e-12)
+    np.testing.assert_allclose(depth, expected[:, 2], rtol=1e-9, atol=1e-9)
+
+
+def test_save_and_load(tmp_path):
+    recording = sensor(ms5837.MODEL_30BA)
+    recording.recordRaw()
+    for D1 in range(5000000, 5000100):
+        recording._D1, recording._D2 = D1, 8000000
+        recording._sampled(calculate=False)
+
+    recording.saveRaw(str(tmp_path / 'raw.npz'))
+    loaded = ms5837.loadRaw(str(tmp_path / 'raw.npz'))
+    time, pressure, temperature, depth = recording.compensateRaw()
+    np.testing.assert_array_equal(loaded['depth'], depth)
+    np.testing.assert_array_equal(loaded['time'], time)
+
+
+def test_not_recording():
+    with pytest.raises(RuntimeError):
+        sensor(ms5837.MODEL_30BA).compensateRaw()
+
+
+def test_snapshot_while_appending():
+    samples = RawSamples(capacity=4)
+    done = threading.Event()
+
+    def append():
+        for i in range(200000):
+            samples.append(i, i, i)
+        done.set()
+
+    writer = threading.Thread(target=append)
+    writer.start()
+    while not done.is_set():
+        time, D1, D2 = samples.snapshot()
+        assert len(time) == len(D1) == len(D2)
+        np.testing.assert_array_equal(time, np.arange(len(time)))
+        np.testing.assert_array_equal(D2, time)
+    writer.join()
+    assert len(samples.snapshot()[0]) == 200000
+
+
+class Bus:
+    """ Stands in for the SMBus of the sensor, recording the time of every command. """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.commands = []
+
+    def write_byte(self, address, command):
+        self.clock.now += 0.0002  # An I2C transaction.
+        self.commands.append((self.clock.now, command))
+
+    def read_i2c_block_data(self, address, register, length):
+        self.clock.now += 0.0002
+        return [0x80, 0, 0]
+
+
+def polled_sensor(clock):
+    """ Returns a sensor on a Bus, in the state of a new MS5837. """
+    polled = sensor(ms5837.MODEL_30BA)
+    polled._bus = Bus(clock)
+    polled._converting = None
+    polled._ready_at = 0
+    polled._next = MS5837._MS5837_CONVERT_D1_256
+    polled._have_D1 = False
+    polled._have_D2 = False
+    return polled
+
+
+def test_poll_waits_the_conversion_time_from_the_command(clock):
+    polled = polled_sensor(clock)
+
+    polled.poll(ms5837.OSR_256)
+    started = polled._bus.commands[-1][0]
+    assert polled._ready_at == started + polled.conversionTime(ms5837.OSR_256)
+
+    clock.now = polled._ready_at - 0.00001
+    assert polled.poll(ms5837.OSR_256) is False
+    assert len(polled._bus.commands) == 1
+
+
+def test_read_waits_for_a_conversion_of_poll(clock):
+    polled = polled_sensor(clock)
+
+    polled.poll(ms5837.OSR_8192)
+    ready_at = polled._ready_at
+    polled.read(ms5837.OSR_256)
+    assert polled._bus.commands[1][0] > ready_at
@@ -0,0 +1,42 @@
+"""
+Tests of the radio frame encoder and the incremental Decoder.
+"""
+from auv_api import protocol
+from auv_api.protocol import Decoder
+
+
+def test_round_trip_in_pieces():
+    frames = (protocol.encode(protocol.PING) + protocol.encode(protocol.LOG, "hello") +
+              protocol.encode(protocol.D, 1, 2, 3, b'chunk'))
+    decoder = Decoder()
+    messages = []
+    for i in range(len(frames)):
+        messages += decoder.feed(frames[i:i + 1])
+    assert messages == [(protocol.PING, ()), (protocol.LOG, ("hello",)), (protocol.D, (1, 2, 3, b'chunk'))]
+
+
+def test_corrupt_frame_is_skipped():
+    frame = bytearray(protocol.encode(protocol.ACK, 5, 0))
+    frame[4] ^= 0xFF
+    decoder = Decoder()
+    assert decoder.feed(bytes(frame) + protocol.encode(protocol.PING)) == [(protocol.PING, ())]
+    assert decoder.crc_errors == 1
+
+
+def test_false_sync_does_not_delay_frames():
+    # A SYNC byte of noise, followed by bytes that would announce a 255-byte frame.
+    decoder = Decoder()
+    noise = bytes((protocol.SYNC, protocol.PING, 255))
+    assert decoder.feed(noise + protocol.encode(protocol.ACK, 1, 2)) == [(protocol.ACK, (1, 2))]
+    assert decoder.false_syncs == 1
+
+    noise = bytes((protocol.SYNC, 0xEE, 200))  # Unknown type.
+    assert decoder.feed(noise + protocol.encode(protocol.PING)) == [(protocol.PING, ())]
+    assert decoder.false_syncs == 2
+
+
+def test_partial_frame_is_kept():
+    frame = protocol.encode(protocol.XBOX, 1000, 10, -10, 0, 100)
+    decoder = Decoder()
+    assert decoder.feed(frame[:4]) == []
+    assert decoder.feed(frame[4:]) == [(protocol.XBOX, (1000, 10, -10, 0, 100))]
@@ -0,0 +1,81 @@
+"""
+Tests of the Radio's bounded send and receive queues, on a pseudo-terminal. The I/O
+threads are not started, so the queues are filled and inspected directly.
+"""
+import os
+
+import pytest
+import serial
+
+from auv_api import protocol, radio
+from auv_api.radio import Radio
+
+
+@pytest.fixture
+def link():
+    master, slave = os.openpty()
+    link = Radio(os.ttyname(slave), blocking=False)
+    yield link
+    link.close()
+    os.close(master)
+    os.close(slave)
+
+
+def fill_tx(link, type_id, *fields):
+    for _ in range(radio.TX_QUEUE_SIZE):
+        assert link.queue(protocol.encode(type_id, *fields), protocol.priority(type_id))
+
+
+def test_commands_evict_telemetry(link):
+    fill_tx(link, protocol.AUV_DATA, b'\x00')
+    assert link.queue(protocol.encode(protocol.START_MISSION, 0, 0, 0, 1), protocol.PRIORITY_COMMAND)
+    assert link.stats()['dropped'][protocol.PRIORITY_TELEMETRY] == 1
+    assert link.queue_depth() == radio.TX_QUEUE_SIZE
+
+
+def test_queued_commands_are_never_evicted(link):
+    fill_tx(link, protocol.TEST_MOTOR, 0, 0, 0, 0)
+    assert not link.queue(protocol.encode(protocol.PING), protocol.PRIORITY_SAFETY)
+    assert link.stats()['dropped'] == [1, 0, 0, 0, 0]
+    assert all(entry[0] == protocol.PRIORITY_COMMAND for entry in link.tx_queue)
+
+
+def test_received_telemetry_makes_room(link):
+    for _ in range(radio.RX_QUEUE_SIZE - 1):
+        link.queue_received((protocol.AUV_DATA, (b'\x00',)))
+    link.queue_received((protocol.ABORT_MISSION, (1, 2, 3)))
+    link.queue_received((protocol.ACK, (4, 0)))
+    link.queue_received((protocol.AUV_DATA, (b'\x01',)))
+
+    stats = link.stats()
+    assert stats['rx_dropped'][protocol.PRIORITY_TELEMETRY] == 2
+    assert stats['rx_queue_depth'] == radio.RX_QUEUE_SIZE
+    messages = link.rx_queue
+    assert (protocol.ABORT_MISSION, (1, 2, 3)) in messages and (protocol.ACK, (4, 0)) in messages
+    assert messages[-1] == (protocol.AUV_DATA, (b'\x01',))
+
+
+def test_received_commands_are_never_dropped(link):
+    for _ in range(radio.RX_QUEUE_SIZE):
+        link.queue_received((protocol.TEST_MOTOR, (0, 0, 0, 0)))
+    link.queue_received((protocol.AUV_DATA, (b'\x00',)))
+    link.queue_received((protocol.ABORT_MISSION, (1, 2, 3)))
+
+    assert link.stats()['rx_dropped'][protocol.PRIORITY_TELEMETRY] == 1
+    assert len(link.rx_queue) == radio.RX_QUEUE_SIZE + 1
+    assert link.rx_queue[-1] == (protocol.ABORT_MISSION, (1, 2, 3))
+
+
+def test_closed_radio_raises():
+    master, slave = os.openpty()
+    link = Radio(os.ttyname(slave), threaded=True)
+    link.close()
+    try:
+        with pytest.raises(serial.SerialException):
+            link.send(protocol.PING)
+        with pytest.raises(serial.SerialException):
+            link.receive()
+        assert not link.is_open()
+    finally:
+        os.close(master)
+        os.close(slave)
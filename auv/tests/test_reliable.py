@@ -0,0 +1,163 @@
+"""
+Tests of the reliable link's ACKs, retransmissions and duplicate suppression, between
+two ReliableLinks whose radios are connected by a lossy in-memory link.
+"""
+from auv_api import protocol, reliable
+from auv_api.reliable import ReliableLink
+
+CLOCKED = [reliable]
+
+
+class Radio:
+    """ Stands in for a Radio, frames are passed through the protocol's encoder and decoder. """
+
+    def __init__(self):
+        self.outbox = []
+        self.inbox = []
+        self.decoder = protocol.Decoder()
+
+    def send(self, type_id, *fields):
+        self.outbox.append(protocol.encode(type_id, *fields))
+
+    def receive(self):
+        messages = self.decoder.feed(b''.join(self.inbox))
+        self.inbox = []
+        return messages
+
+
+def deliver(source, destination, lose=lambda frame: False):
+    """ Moves the frames sent by source to destination, except the ones lose() returns True for. """
+    destination.inbox += [frame for frame in source.outbox if not lose(frame)]
+    source.outbox = []
+
+
+def is_ack(frame):
+    return frame[1] == protocol.ACK
+
+
+def link_pair():
+    bs_radio, auv_radio = Radio(), Radio()
+    return ReliableLink(bs_radio), bs_radio, ReliableLink(auv_radio), auv_radio
+
+
+def test_delivery_and_ack(clock):
+    bs, bs_radio, auv, auv_radio = link_pair()
+    seq = bs.send(protocol.START_MISSION, 1)
+    deliver(bs_radio, auv_radio)
+    assert auv.receive() == [(protocol.START_MISSION, (1,))]
+
+    deliver(auv_radio, bs_radio)
+    assert bs.receive() == []
+    assert seq not in bs.pending
+
+
+def test_lost_ack_is_not_executed_twice(clock):
+    bs, bs_radio, auv, auv_radio = link_pair()
+    bs.send(protocol.ABORT_MISSION)
+    deliver(bs_radio, auv_radio)
+    assert len(auv.receive()) == 1
+    deliver(auv_radio, bs_radio, lose=is_ack)
+
+    # The link is lost for a while, the base station keeps retransmitting.
+    for _ in range(3):
+        clock.now += reliable.MAX_TIMEOUT
+        assert bs.update() == []
+        deliver(bs_radio, auv_radio)
+        assert auv.receive() == []
+        deliver(auv_radio, bs_radio, lose=is_ack)
+
+    clock.now += reliable.MAX_TIMEOUT
+    bs.update()
+    deliver(bs_radio, auv_radio)
+    assert auv.receive() == []
+    assert auv.duplicates == 4
+    deliver(auv_radio, bs_radio)
+    bs.receive()
+    assert not bs.pending
+
+
+def test_selective_ack(clock):
+    bs, bs_radio, auv, auv_radio = link_pair()
+    first = bs.send(protocol.TEST_MOTOR, 0)
+    for motor in range(1, 4):
+        bs.send(protocol.TEST_MOTOR, motor)
+
+    # The first command is lost, the others are held and acknowledged selectively.
+    deliver(bs_radio, auv_radio, lose=lambda frame: protocol.Decoder().feed(frame)[0][1][1] == first)
+    assert [fields for _, fields in auv.receive()] == [(1,), (2,), (3,)]
+    deliver(auv_radio, bs_radio)
+    bs.receive()
+    assert list(bs.pending) == [first]
+
+    clock.now += reliable.INITIAL_TIMEOUT
+    bs.update()
+    assert bs.retransmissions == 1
+    deliver(bs_radio, auv_radio)
+    assert auv.receive() == [(protocol.TEST_MOTOR, (0,))]
+    assert auv.expected == (first + 4) % reliable.SEQ_MODULO
+
+
+def test_sequence_wrap_around(clock):
+    bs, bs_radio, auv, auv_radio = link_pair()
+    bs.next_seq = reliable.SEQ_MODULO - 2
+    for motor in range(4):
+        bs.send(protocol.TEST_MOTOR, motor)
+        deliver(bs_radio, auv_radio)
+        assert auv.receive() == [(protocol.TEST_MOTOR, (motor,))]
+        deliver(auv_radio, bs_radio)
+        bs.receive()
+    assert not bs.pending and auv.expected == 2
+
+
+def test_given_up_message_is_skipped(clock):
+    bs, bs_radio, auv, auv_radio = link_pair()
+    bs.send(protocol.TEST_MOTOR, 0)
+    bs_radio.outbox = []  # Never arrives.
+    for _ in range(bs.max_retries + 1):
+        clock.now += reliable.MAX_TIMEOUT
+        failed = bs.update()
+        bs_radio.outbox = []
+    assert failed == [(protocol.TEST_MOTOR, (0,))]
+
+    # The next message tells the AUV the lost one will never come.
+    bs.send(protocol.TEST_MOTOR, 1)
+    deliver(bs_radio, auv_radio)
+    assert auv.receive() == [(protocol.TEST_MOTOR, (1,))]
+
+
+def test_restarted_peer_is_a_new_session(clock):
+    bs, bs_radio, auv, auv_radio = link_pair()
+    bs.send(protocol.TEST_MOTOR, 0)
+    deliver(bs_radio, auv_radio)
+    auv.receive()
+
+    # A restarted base station may reuse sequence numbers the AUV already saw.
+    restarted = ReliableLink(bs_radio)
+    restarted.session = (bs.session + 1) % reliable.SEQ_MODULO
+    restarted.next_seq = bs.next_seq - 1
+    restarted.send(protocol.TEST_MOTOR, 1)
+    deliver(bs_radio, auv_radio)
+    assert auv.receive() == [(protocol.TEST_MOTOR, (1,))]
+    assert auv.peer_restarts == 1
+
+
+def test_reopened_radio_keeps_the_link(clock):
+    bs, bs_radio, auv, auv_radio = link_pair()
+    bs.send(protocol.START_MISSION, 0)
+    deliver(bs_radio, auv_radio)
+    assert auv.receive() == [(protocol.START_MISSION, (0,))]
+    auv_radio.outbox = []  # The ACK is lost with the serial connection.
+
+    # Both radios fail and are reopened, the base station retransmits over its new radio.
+    bs_radio, auv_radio = Radio(), Radio()
+    bs.reopen(bs_radio)
+    auv.reopen(auv_radio)
+    clock.now += reliable.INITIAL_TIMEOUT
+    assert bs.update() == []
+    deliver(bs_radio, auv_radio)
+    assert auv.receive() == []
+    assert auv.duplicates == 1 and auv.peer_restarts == 0
+
+    deliver(auv_radio, bs_radio)
+    bs.receive()
+    assert not bs.pending
@@ -0,0 +1,69 @@
+"""
+Tests of the fixed-rate scheduler, on a simulated clock.
+"""
+import pytest
+
+from auv_api import scheduler
+from auv_api.scheduler import Scheduler
+from auv_api.timing import Timers
+
+CLOCKED = [scheduler]
+
+
+def run_for(tasks, clock, duration):
+    """ Runs the due tasks until duration seconds passed, jumping the clock to the next deadline. """
+    end = clock.now + duration
+    while clock.now < end:
+        clock.now = max(clock.now, min(tasks.run_pending(), end))
+
+
+def test_rates_do_not_drift(clock):
+    tasks = Scheduler()
+    runs = {'fast': 0, 'slow': 0}
+
+    def fast():
+        runs['fast'] += 1
+        clock.now += 0.003  # The work takes time, the next deadline does not move.
+
+    tasks.add('fast', 0.02, fast)
+    tasks.add('slow', 0.2, lambda: runs.__setitem__('slow', runs['slow'] + 1))
+    run_for(tasks, clock, 10.0)
+    assert runs['fast'] in (500, 501) and runs['slow'] in (50, 51)
+    assert tasks.stats()['fast']['overruns'] == 0
+
+
+def test_priority_order(clock):
+    tasks = Scheduler()
+    order = []
+    tasks.add('telemetry', 1.0, lambda: order.append('telemetry'), priority=2)
+    tasks.add('control', 1.0, lambda: order.append('control'), priority=0)
+    tasks.run_pending()
+    assert order == ['control', 'telemetry']
+
+
+def test_missed_periods_are_skipped(clock):
+    tasks = Scheduler()
+    runs = []
+
+    def stall():
+        runs.append(clock.now)
+        if len(runs) == 1:
+            clock.now += 0.35  # Misses three periods of 0.1 s.
+
+    tasks.add('stall', 0.1, stall)
+    next_deadline = tasks.run_pending()
+
+    # The run due at 100.1 happened late, the ones due at 100.2 and 100.3 were skipped.
+    assert runs == [100.0, pytest.approx(100.35)]
+    assert next_deadline == pytest.approx(100.4)
+    stats = tasks.stats()['stall']
+    assert stats['overruns'] == 2
+    assert stats['max_late_ms'] == pytest.approx(250.0)
+
+
+def test_timers_record_every_run(clock):
+    timers = Timers()
+    tasks = Scheduler(timers)
+    tasks.add('control', 0.02, lambda: None)
+    run_for(tasks, clock, 1.0)
+    assert timers['control'].total == timers['control_late'].total == tasks.tasks[0].runs
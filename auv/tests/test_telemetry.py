@@ -0,0 +1,90 @@
+"""
+Tests of the telemetry scheduler, and of the partial frames it sends through the codec.
+"""
+import pytest
+
+from auv_api import reliable, telemetry
+from auv_api.codec import TelemetryDecoder, TelemetryEncoder
+from auv_api.telemetry import Channel, TelemetryScheduler
+
+CLOCKED = [telemetry, reliable]
+PERIOD = 0.2
+
+
+def scheduler():
+    return TelemetryScheduler([
+        Channel('heading', PERIOD, 0.5, wrap=360),
+        Channel('temperature', 10 * PERIOD, 0.1),
+        Channel('depth', PERIOD, 0.02),
+    ], PERIOD)
+
+
+def test_only_due_channels_are_sent(clock):
+    channels = scheduler()
+    values = {'heading': 10.0, 'temperature': 15.0, 'depth': 1.0}
+    assert channels.poll(values) == ['heading', 'temperature', 'depth']
+
+    # Polled slightly early, as the main loop's jitter allows.
+    clock.now += PERIOD - 0.005
+    values = {'heading': 12.0, 'temperature': 15.5, 'depth': 1.01}
+    assert channels.poll(values) == ['heading']
+
+    clock.now += PERIOD
+    assert channels.poll(values) == []
+    assert channels.stats()['suppressed'] == 1
+
+    clock.now += 10 * PERIOD
+    assert channels.poll(values) == ['temperature']
+
+
+def test_deadband_wraps_around(clock):
+    channels = scheduler()
+    channels.poll({'heading': 359.8})
+    clock.now += PERIOD
+    assert channels.poll({'heading': 0.1}) == []
+    clock.now += PERIOD
+    assert channels.poll({'heading': 1.0}) == ['heading']
+
+
+def test_unchanged_channels_are_refreshed(clock):
+    channels = scheduler()
+    values = {'heading': 10.0, 'temperature': 15.0, 'depth': 1.0}
+    channels.poll(values)
+    clock.now += telemetry.REFRESH_INTERVAL
+    assert channels.poll(values) == ['heading', 'temperature', 'depth']
+
+
+def test_interval_shorter_than_period():
+    with pytest.raises(ValueError):
+        TelemetryScheduler([Channel('heading', PERIOD / 2)], PERIOD)
+
+
+def test_partial_frames_round_trip(clock):
+    channels = scheduler()
+    encoder = TelemetryEncoder()
+    decoder = TelemetryDecoder()
+    values = {'heading': 10.0, 'temperature': 15.0, 'depth': 1.0}
+    assert decoder.decode(encoder.encode(values, channels.poll(values))) == values
+
+    clock.now += PERIOD
+    values = {'heading': 20.0, 'temperature': 15.05, 'depth': 1.5}
+    frame = encoder.encode(values, channels.poll(values))
+    assert decoder.decode(frame) == {'heading': 20.0, 'depth': 1.5}
+    assert frame[1] == 0b101  # The mask of heading and depth, temperature is within its deadband.
+
+
+def test_backoff_recovers_after_a_slow_rtt_sample(clock):
+    channels = scheduler()
+    link = reliable.ReliableLink(radio=None)
+    link.sample_rtt(2 * telemetry.CONGESTED_RTT)  # One slow ACK, then no more commands are timed.
+
+    for _ in range(4):
+        clock.now += telemetry.ADAPT_INTERVAL
+        channels.adapt(0, link.recent_rtt())
+    assert channels.backoff == telemetry.MAX_BACKOFF
+
+    for _ in range(20):
+        clock.now += telemetry.ADAPT_INTERVAL
+        channels.adapt(0, link.recent_rtt())
+    assert link.recent_rtt() is None
+    assert channels.backoff == 1.0
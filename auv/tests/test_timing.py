@@ -0,0 +1,65 @@
+"""
+Tests of the timing histograms and of the timers' rolling window.
+"""
+import random
+
+import pytest
+
+from auv_api import timing
+from auv_api.timing import Histogram, Timer, Timers, bucket_of, bucket_value
+
+CLOCKED = [timing]
+
+
+def test_buckets_are_ordered_and_precise():
+    previous = -1
+    for value in list(range(0, 5000)) + [random.Random(1).randrange(timing.MAX_VALUE) for _ in range(5000)]:
+        index = bucket_of(value)
+        assert 0 <= index < timing.BUCKETS
+        upper = bucket_value(index)
+        assert value <= upper <= value * 1.04 + 1  # About 3% precision.
+        if value < 5000:
+            assert index >= previous
+            previous = index
+    assert bucket_of(timing.MAX_VALUE * 2) == bucket_of(timing.MAX_VALUE)
+
+
+def test_percentiles():
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.record(value)
+    assert histogram.percentile(50) == pytest.approx(500, rel=0.04)
+    assert histogram.percentile(99) == pytest.approx(990, rel=0.04)
+    assert histogram.percentile(100) == 1000 == histogram.max
+    assert Histogram().percentile(50) == 0
+
+
+def test_old_values_age_out(clock):
+    timer = Timer('imu')
+    timer.record(0.5)  # A stall, 500 ms.
+    for _ in range(100):
+        timer.record(0.001)
+    assert timer.report()[3] == 500000
+
+    clock.now += timing.WINDOW_INTERVALS * timing.INTERVAL
+    timer.record(0.002)
+    count, p50, p99, maximum = timer.report()
+    assert count == 1 and maximum == 2000
+    assert timer.total == 102
+
+
+def test_idle_timer_is_cleared(clock):
+    timer = Timer('motors')
+    timer.record(0.001)
+    clock.now += 10 * timing.WINDOW_INTERVALS * timing.INTERVAL
+    assert timer.report() == (0, 0, 0, 0)
+
+
+def test_context_manager_and_registry(clock):
+    timers = Timers()
+    with timers['control']:
+        clock.now += 0.004
+    timers.record('telemetry', 0.001)
+    report = timers.report()
+    assert list(report) == ['control', 'telemetry']
+    assert report['control'][0] == 1 and report['control'][3] == pytest.approx(4000, abs=1)
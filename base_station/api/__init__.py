@@ -3,3 +3,8 @@ from .gps import GPS
 from .xbox import Joystick
 from .nav import NavController
 from .radio import Radio
+from .reliable import ReliableLink
+from .download import Download
+from .codec import TelemetryDecoder
+from .control import ControlSender
+from .projection import Projection
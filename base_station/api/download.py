@@ -0,0 +1,149 @@
+"""
+The download class receives a file streamed by the AUV in numbered chunks.
+Chunks are written straight to disk and the set of received chunks is saved
+next to the file, so a download can resume after a link drop or a restart.
+"""
+import os
+import struct
+import time
+import zlib
+
+from . import protocol
+
+DOWNLOAD_DIRECTORY = 'downloads'
+RESEND_TIMEOUT = 2.0  # Seconds without chunks before missing chunks are requested again.
+MAX_BITMAP_BYTES = protocol.MAX_PAYLOAD - protocol.SCHEMA[protocol.D_RESEND].struct.size
+PROGRESS_HEADER = struct.Struct('<HIH')
+
+
+class Download:
+    """ Reassembles a file from the AUV's chunks, tracking which chunks are still missing. """
+
+    def __init__(self, transfer_id, size, chunk_size, directory=DOWNLOAD_DIRECTORY):
+        """
+        transfer_id: Id of the file, as reported by the AUV's D_INFO message.
+        size:        File size in bytes.
+        chunk_size:  Payload bytes per chunk.
+        directory:   Directory the downloaded file is saved to.
+        """
+        self.transfer_id = transfer_id
+        self.size = size
+        self.chunk_size = chunk_size
+        self.chunk_count = (size + chunk_size - 1) // chunk_size
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = os.path.join(directory, "auv_data_%04x.bin" % transfer_id)
+        self.part_path = self.path + ".part"
+        self.progress_path = self.path + ".progress"
+
+        # One byte per chunk, 1 once the chunk is written to disk.
+        self.received = self.load_progress()
+        self.resumed = self.received is not None
+        if not self.resumed:
+            self.received = bytearray(self.chunk_count)
+        self.missing = self.received.count(0)
+
+        self.file = open(self.part_path, 'r+b' if self.resumed else 'w+b')
+        self.file.truncate(size)
+
+        self.bytes_received = 0
+        self.crc_errors = 0
+        self.started_at = None
+        self.last_chunk_at = None
+        self.last_activity = time.monotonic()
+        self.dirty = False
+
+    def load_progress(self):
+        """ Returns the received-chunk flags of a previous attempt at this download, or None. """
+        if not os.path.exists(self.progress_path) or not os.path.exists(self.part_path):
+            return None
+
+        with open(self.progress_path, 'rb') as progress:
+            data = progress.read()
+        if len(data) != PROGRESS_HEADER.size + self.chunk_count:
+            return None
+        if PROGRESS_HEADER.unpack_from(data) != (self.transfer_id, self.size, self.chunk_size):
+            return None
+        return bytearray(data[PROGRESS_HEADER.size:])
+
+    def save_progress(self):
+        """ Saves the received-chunk flags, so the download can be resumed later. """
+        if not self.dirty:
+            return
+        self.file.flush()
+        with open(self.progress_path, 'wb') as progress:
+            progress.write(PROGRESS_HEADER.pack(self.transfer_id, self.size, self.chunk_size))
+            progress.write(self.received)
+        self.dirty = False
+
+    def on_chunk(self, index, crc, data):
+        """ Writes a received chunk to disk. Returns False if it was corrupt or out of range. """
+        expected_length = min(self.chunk_size, self.size - index * self.chunk_size)
+        if index >= self.chunk_count or len(data) != expected_length or zlib.crc32(data) != crc:
+            self.crc_errors += 1
+            return False
+
+        now = time.monotonic()
+        if self.started_at is None:
+            self.started_at = now
+        self.last_chunk_at = now
+        self.last_activity = now
+
+        if not self.received[index]:
+            self.file.seek(index * self.chunk_size)
+            self.file.write(data)
+            self.received[index] = 1
+            self.missing -= 1
+            self.bytes_received += len(data)
+            self.dirty = True
+        return True
+
+    def is_complete(self):
+        """ Returns True once every chunk has been received. """
+        return self.missing == 0
+
+    def resend_request(self):
+        """ Returns the fields of the D_RESEND message that asks for the missing chunks. """
+        first = self.received.find(0)
+        if first < 0:  # Nothing is missing.
+            return (self.transfer_id, self.chunk_count, b'')
+
+        # Bit i flags chunk first + 1 + i. Chunks past the bitmap are implicitly missing,
+        # so cover up to the last received chunk: the AUV then only resends the gaps.
+        last = self.received.rfind(1)
+        bits = min(max(last - first, 0), MAX_BITMAP_BYTES * 8)
+        bitmap = bytearray((bits + 7) // 8)
+        for i in range(len(bitmap) * 8):
+            index = first + 1 + i
+            if index < self.chunk_count and not self.received[index]:
+                bitmap[i >> 3] |= 1 << (i & 7)
+        return (self.transfer_id, first, bytes(bitmap))
+
+    def update(self):
+        """ Returns True if the AUV went quiet and the missing chunks should be requested again. """
+        if self.is_complete() or time.monotonic() - self.last_activity < RESEND_TIMEOUT:
+            return False
+        self.save_progress()
+        self.last_activity = time.monotonic()
+        return True
+
+    def rate(self):
+        """ Returns the achieved download rate in bytes per second. """
+        if self.started_at is None:
+            return 0.0
+        elapsed = self.last_chunk_at - self.started_at
+        return self.bytes_received / elapsed if elapsed > 0 else 0.0
+
+    def finish(self):
+        """ Closes the completed file and removes the resume information. """
+        self.file.close()
+        os.replace(self.part_path, self.path)
+        if os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+
+    def close(self):
+        """ Closes an incomplete download, keeping it on disk to be resumed. """
+        self.dirty = True
+        self.save_progress()
+        self.file.close()
@@ -1,53 +1,153 @@
-# TODO, someone needs to fix this.
+""" Reads the base station's position from gpsd, see https://gpsd.gitlab.io/gpsd/gpsd_json.html """
 
+import collections
+import json
+import socket
 import threading
 import time
-import sys
-from gps3 import gps3  # https://pypi.org/project/gps3/
+
+GPSD_HOST = '127.0.0.1'
+GPSD_PORT = 2947
+WATCH = b'?WATCH={"enable":true,"json":true}\n'
+READ_SIZE = 4096
+SOCKET_TIMEOUT = 5.0  # A silent gpsd is treated as lost after this many seconds.
+MIN_BACKOFF = 0.5  # Seconds before the first reconnection attempt.
+MAX_BACKOFF = 30.0
+MIN_MODE = 2  # TPV mode of a 2D fix, modes below it have no position.
+
+# A position report. time is the time.time() it was received at, other fields are None when gpsd did not report them.
+Fix = collections.namedtuple('Fix', ['time', 'latitude', 'longitude', 'altitude', 'speed', 'track', 'mode'])
+
+
+def parse_tpv(line, now=None):
+    """ Returns the Fix of a gpsd JSON report, or None if it is not a TPV report with a position. """
+    try:
+        report = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(report, dict) or report.get('class') != 'TPV':
+        return None
+    if report.get('mode', 0) < MIN_MODE or report.get('lat') is None or report.get('lon') is None:
+        return None
+    return Fix(time.time() if now is None else now, report['lat'], report['lon'],
+               report.get('altMSL', report.get('alt')), report.get('speed'), report.get('track'), report['mode'])
 
 
 class GPS(threading.Thread):
-    """ Class for basic GPS functionality """
+    """
+    Thread that keeps the latest fix from gpsd, reconnecting with exponential backoff.
 
-    def __init__(self, out_queue):
+    The latest fix is a single slot holding an immutable Fix, so readers get it in O(1)
+    without a lock or a queue to drain: the reader thread only ever replaces the reference.
+    """
+
+    def __init__(self, history=0, host=GPSD_HOST, port=GPSD_PORT):
+        """
+        history: Number of recent fixes to keep in a ring buffer, 0 for none.
+        host:    Address of gpsd.
+        port:    Port of gpsd.
+        """
         # Call the threading super-class constructor (inheritance)
-        threading.Thread.__init__(self)
+        threading.Thread.__init__(self, name='gps', daemon=True)
 
-        self.gps_socket = None
-        self.data_stream = None
-        self.running = False
-        self.out_q = out_queue
+        self.host = host
+        self.port = port
+        self.latest = None
+        self.history = collections.deque(maxlen=history) if history > 0 else None
+        self.connected = False
+        self.running = True
+        self.socket = None
 
-        # Try to connect to GPSD socket (if gpsd is not installed, this will error)
-        try:
-            # TODO something happens here on OSX i guess?
-            self.gps_socket = gps3.GPSDSocket()
-            self.data_stream = gps3.DataStream()
-        except:
-            raise Exception(
-                "[GPS] Could not create gpsd-socket or data stream object.")
+        self.reports = 0
+        self.fixes = 0
+        self.connections = 0
+        self.backoff = MIN_BACKOFF
 
         # Start our thread
         self.start()
 
+    def fix(self, max_age=None):
+        """ Returns the latest Fix, or None if there is none (or it is older than max_age seconds). """
+        fix = self.latest
+        if fix is None or (max_age is not None and time.time() - fix.time > max_age):
+            return None
+        return fix
+
+    def recent(self):
+        """ Returns the fixes in the history ring buffer, oldest first. """
+        return list(self.history) if self.history is not None else []
+
+    def publish(self, fix):
+        """ Makes a fix the latest one. """
+        if self.history is not None:
+            self.history.append(fix)
+        self.latest = fix
+        self.fixes += 1
+
     def run(self):
+        """ Connects to gpsd and reads its reports until stopped, reconnecting when the connection fails. """
+        while self.running:
+            try:
+                self.read_reports()
+            except OSError as e:
+                if self.connected:
+                    print("[GPS] Lost connection to gpsd: " + str(e))
+            finally:
+                self.disconnect()
+
+            if self.running:
+                time.sleep(self.backoff)
+                self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    def read_reports(self):
+        """ Reads the reports of one connection to gpsd. """
+        self.socket = socket.create_connection((self.host, self.port), timeout=SOCKET_TIMEOUT)
+        self.socket.sendall(WATCH)
+        self.connected = True
+        self.connections += 1
+        print("[GPS] Connected to gpsd at " + self.host + ":" + str(self.port) + ".")
+
+        buffer = b''
+        while self.running:
+            data = self.socket.recv(READ_SIZE)
+            if not data:
+                raise OSError("gpsd closed the connection")
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                self.reports += 1
+                fix = parse_tpv(line)
+                if fix is not None:
+                    self.publish(fix)
+                    self.backoff = MIN_BACKOFF
+
+    def disconnect(self):
+        """ Closes the connection to gpsd, if any. """
+        self.connected = False
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+
+    def stop(self):
+        """ Stops the thread and closes its connection. """
+        self.running = False
+        sock = self.socket
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
 
-        while (True):
-            if (self.gps_socket is not None):
-                self.gps_socket.connect()
-                self.gps_socket.watch()
-
-                for new_data in self.gps_socket:  # Wait for new data on gps socket
-                    if new_data:
-                        self.data_stream.unpack(new_data)
-
-                        # Send gps data (as a dictionary/hashmap) to the synchronous Queue data structure
-                        self.out_q.push({
-                            speed: self.data_stream.TPV['speed'],
-                            latitude: self.data_stream.TPV['lat'],
-                            longitude: self.data_stream.TPV['lon'],
-                            altitude: self.data_stream.TPV['alt']
-                        })
-
-            # Sleep for 4 seconds
-            time.sleep(4)
+    def stats(self):
+        """
+        Returns a dictionary of the reports read from gpsd.
+        """
+        return {
+            'connected': self.connected,
+            'connections': self.connections,
+            'reports': self.reports,
+            'fixes': self.fixes,
+        }
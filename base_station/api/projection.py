@@ -0,0 +1,159 @@
+"""
+Projection between latitude/longitude (WGS84) and UTM coordinates.
+
+The transverse Mercator projection uses Krueger's series, which is accurate to well under a
+millimeter within a UTM zone. Its zone and constants are computed once for the operating
+area, and batches of points (e.g. logged tracks) are converted as NumPy arrays.
+
+Live fixes go through project(), which evaluates a quadratic fitted to the exact projection
+around the last fix, a handful of multiply-adds per fix while the vehicle stays close to it.
+"""
+import math
+
+import numpy as np
+
+# WGS84 ellipsoid.
+A = 6378137.0
+F = 1 / 298.257223563
+
+# UTM constants.
+K0 = 0.9996
+FALSE_EASTING = 500000.0
+FALSE_NORTHING_SOUTH = 10000000.0
+ZONE_WIDTH = 6
+
+# Series coefficients, in powers of the third flattening.
+N = F / (2 - F)
+RECTIFYING_RADIUS = A / (1 + N) * (1 + N ** 2 / 4 + N ** 4 / 64)
+ALPHA = (N / 2 - 2 / 3 * N ** 2 + 5 / 16 * N ** 3,
+         13 / 48 * N ** 2 - 3 / 5 * N ** 3,
+         61 / 240 * N ** 3)
+BETA = (N / 2 - 2 / 3 * N ** 2 + 37 / 96 * N ** 3,
+        1 / 48 * N ** 2 + 1 / 15 * N ** 3,
+        17 / 480 * N ** 3)
+DELTA = (2 * N - 2 / 3 * N ** 2 - 2 * N ** 3,
+         7 / 3 * N ** 2 - 8 / 5 * N ** 3,
+         56 / 15 * N ** 3)
+E = 2 * math.sqrt(N) / (1 + N)  # Eccentricity.
+
+LOCAL_RADIUS = 0.02  # Degrees around a fit that project() uses it for, about 2 km.
+FIT_STEPS = 5  # Samples per axis of a fit.
+
+
+def zone_of(longitude):
+    """ Returns the UTM zone number of a longitude. """
+    return int((longitude + 180) // ZONE_WIDTH) % 60 + 1
+
+
+class Projection:
+    """ UTM projection of one zone, fixed by the first point projected unless given, so a
+    track crossing a zone boundary stays continuous. """
+
+    def __init__(self, zone=None, northern=None):
+        """
+        zone:     UTM zone number, or None to use the zone of the first point.
+        northern: True for the northern hemisphere, or None to use the hemisphere of the first point.
+        """
+        self.zone = None
+        self.northern = northern
+        self.fit_origin = None
+        self.fit = None
+        if zone is not None:
+            self.set_zone(zone, northern if northern is not None else True)
+
+    def set_zone(self, zone, northern):
+        """ Fixes the zone, and computes its constants. """
+        self.zone = zone
+        self.northern = northern
+        self.central_meridian = math.radians((zone - 1) * ZONE_WIDTH - 180 + ZONE_WIDTH / 2)
+        self.false_northing = 0.0 if northern else FALSE_NORTHING_SOUTH
+        self.scale = K0 * RECTIFYING_RADIUS
+        self.fit_origin = None
+
+    def ensure_zone(self, latitude, longitude):
+        """ Fixes the zone from a point, if it is not fixed yet. """
+        if self.zone is None:
+            latitude = float(np.ravel(latitude)[0])
+            longitude = float(np.ravel(longitude)[0])
+            northern = self.northern if self.northern is not None else latitude >= 0
+            self.set_zone(zone_of(longitude), northern)
+
+    def to_utm(self, latitude, longitude):
+        """
+        Returns the exact (easting, northing) of a point, or of arrays of points, in meters.
+        latitude:  Latitude in degrees, a number or an array.
+        longitude: Longitude in degrees, a number or an array.
+        """
+        self.ensure_zone(latitude, longitude)
+        phi = np.radians(latitude)
+        lam = np.radians(longitude) - self.central_meridian
+
+        t = np.sinh(np.arctanh(np.sin(phi)) - E * np.arctanh(E * np.sin(phi)))
+        xi_prime = np.arctan2(t, np.cos(lam))
+        eta_prime = np.arctanh(np.sin(lam) / np.sqrt(1 + t * t))
+
+        xi = xi_prime
+        eta = eta_prime
+        for j, alpha in enumerate(ALPHA, 1):
+            xi = xi + alpha * np.sin(2 * j * xi_prime) * np.cosh(2 * j * eta_prime)
+            eta = eta + alpha * np.cos(2 * j * xi_prime) * np.sinh(2 * j * eta_prime)
+
+        easting = FALSE_EASTING + self.scale * eta
+        northing = self.false_northing + self.scale * xi
+        if np.ndim(easting) == 0:
+            return float(easting), float(northing)
+        return easting, northing
+
+    def to_latlon(self, easting, northing):
+        """
+        Returns the (latitude, longitude) in degrees of a point, or of arrays of points, in this zone.
+        easting:  Easting in meters, a number or an array.
+        northing: Northing in meters, a number or an array.
+        """
+        if self.zone is None:
+            raise ValueError("[PROJECTION] The UTM zone is not known yet.")
+        xi = (np.asarray(northing, dtype=float) - self.false_northing) / self.scale
+        eta = (np.asarray(easting, dtype=float) - FALSE_EASTING) / self.scale
+
+        xi_prime = xi
+        eta_prime = eta
+        for j, beta in enumerate(BETA, 1):
+            xi_prime = xi_prime - beta * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+            eta_prime = eta_prime - beta * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+
+        chi = np.arcsin(np.sin(xi_prime) / np.cosh(eta_prime))
+        phi = chi
+        for j, delta in enumerate(DELTA, 1):
+            phi = phi + delta * np.sin(2 * j * chi)
+        lam = self.central_meridian + np.arctan2(np.sinh(eta_prime), np.cos(xi_prime))
+
+        latitude = np.degrees(phi)
+        longitude = np.degrees(lam)
+        if np.ndim(latitude) == 0:
+            return float(latitude), float(longitude)
+        return latitude, longitude
+
+    def refit(self, latitude, longitude):
+        """ Fits the quadratic used by project() to the exact projection around a point. """
+        steps = np.linspace(-LOCAL_RADIUS, LOCAL_RADIUS, FIT_STEPS)
+        a, b = (grid.ravel() for grid in np.meshgrid(steps, steps))
+        easting, northing = self.to_utm(latitude + a, longitude + b)
+        terms = np.stack((np.ones_like(a), a, b, a * a, a * b, b * b), axis=1)
+        self.fit = np.linalg.lstsq(terms, np.stack((easting, northing), axis=1), rcond=None)[0].tolist()
+        self.fit_origin = (latitude, longitude)
+
+    def project(self, latitude, longitude):
+        """ Returns the (easting, northing) of a single fix, in meters, to within a millimeter. """
+        self.ensure_zone(latitude, longitude)
+        if self.fit_origin is None:
+            self.refit(latitude, longitude)
+        a = latitude - self.fit_origin[0]
+        b = longitude - self.fit_origin[1]
+        if abs(a) > LOCAL_RADIUS or abs(b) > LOCAL_RADIUS:
+            self.refit(latitude, longitude)
+            a = b = 0.0
+
+        aa, ab, bb = a * a, a * b, b * b
+        (e0, n0), (e1, n1), (e2, n2), (e3, n3), (e4, n4), (e5, n5) = self.fit
+        return (e0 + e1 * a + e2 * b + e3 * aa + e4 * ab + e5 * bb,
+                n0 + n1 * a + n2 * b + n3 * aa + n4 * ab + n5 * bb)
@@ -0,0 +1,263 @@
+"""
+The protocol module defines the binary frame format spoken over the radio.
+
+This file is mirrored in auv/api/protocol.py and base_station/api/protocol.py.
+Both copies must stay identical, otherwise the AUV and base station will
+disagree on the message schema.
+
+Frame layout (multi-byte fields are little-endian):
+
+    SYNC (1) | TYPE (1) | LENGTH (1) | PAYLOAD (LENGTH) | CRC (2)
+
+The CRC is a CRC-16/CCITT computed over TYPE, LENGTH and PAYLOAD.
+
+Reliable message types carry three 16-bit header fields before their own
+fields: the sender's session id, their sequence number and the oldest sequence
+number the sender is still waiting an ACK for (see reliable.py).
+"""
+import binascii
+import struct
+
+SYNC = 0x7E
+HEADER = struct.Struct('<BBB')
+CRC = struct.Struct('<H')
+CRC_SEED = 0xFFFF
+HEADER_SIZE = HEADER.size
+FRAME_OVERHEAD = HEADER.size + CRC.size
+MAX_PAYLOAD = 255
+
+# Payload kinds for variable-length messages.
+TEXT = 'text'
+BYTES = 'bytes'
+
+# Message type ids (connection).
+PING = 0x01
+LOG = 0x02
+ACK = 0x03
+
+# Message type ids (AUV -> base station).
+AUV_DATA = 0x10
+MISSION_STARTED = 0x11
+MISSION_FAILED = 0x12
+D = 0x13
+D_DONE = 0x14
+D_INFO = 0x15
+TIMING = 0x16
+
+# Message type ids (base station -> AUV).
+XBOX = 0x20
+TEST_MOTOR = 0x21
+START_MISSION = 0x22
+ABORT_MISSION = 0x23
+D_DATA = 0x24
+D_RESEND = 0x25
+TIMING_QUERY = 0x26
+
+# Motor names, sent as their index in this tuple.
+MOTORS = ('FORWARD', 'TURN', 'FRONT', 'BACK', 'ALL')
+
+# Send priorities (lower is sent first). Telemetry and bulk data may be dropped when the send queue is full.
+PRIORITY_SAFETY = 0
+PRIORITY_ACK = 1
+PRIORITY_COMMAND = 2
+PRIORITY_TELEMETRY = 3
+PRIORITY_BULK = 4
+
+
+class Message:
+    """ Schema entry describing how a single message type is packed. """
+
+    def __init__(self, type_id, name, fmt='', scales=None, priority=PRIORITY_COMMAND, reliable=False, tail=None):
+        """
+        type_id:  Unique message type id (0-255).
+        name:     Human readable name, used for logging.
+        fmt:      struct format of the payload, or TEXT/BYTES for variable payloads.
+        scales:   Optional fixed-point multiplier per struct field.
+        priority: Default send priority of this message type.
+        reliable: If True, the payload starts with a session id and sequence numbers, and is acknowledged.
+        tail:     BYTES to append a variable-length bytes field after the struct fields.
+        """
+        self.type_id = type_id
+        self.name = name
+        self.priority = priority
+        self.reliable = reliable
+        if reliable:  # Prepend the (session id, sequence number, oldest unacknowledged) fields.
+            fmt = 'HHH' + fmt
+            if scales is not None:
+                scales = (1, 1, 1) + tuple(scales)
+        self.variable = fmt in (TEXT, BYTES)
+        self.kind = fmt if self.variable else None
+        self.struct = None if self.variable else struct.Struct('<' + fmt)
+        self.scales = scales
+        self.tail = tail
+
+    def valid_length(self, length):
+        """ Returns True if a payload of length bytes can be a message of this type. """
+        if self.variable:
+            return True
+        if self.tail is not None:
+            return length >= self.struct.size
+        return length == self.struct.size
+
+    def pack(self, fields):
+        """ Packs the python field values into a payload. """
+        if self.kind == TEXT:
+            return fields[0].encode('utf-8')[:MAX_PAYLOAD]
+        if self.kind == BYTES:
+            return bytes(fields[0])[:MAX_PAYLOAD]
+
+        tail = b''
+        if self.tail is not None:
+            tail = bytes(fields[-1])[:MAX_PAYLOAD - self.struct.size]
+            fields = fields[:-1]
+        if self.scales is not None:
+            fields = [int(round(value * scale))
+                      for value, scale in zip(fields, self.scales)]
+        return self.struct.pack(*fields) + tail
+
+    def unpack(self, payload):
+        """ Unpacks a payload into a tuple of python field values. """
+        if self.kind == TEXT:
+            return (payload.decode('utf-8', 'replace'),)
+        if self.kind == BYTES:
+            return (bytes(payload),)
+
+        if self.tail is not None:
+            fields = self.struct.unpack_from(payload)
+        else:
+            fields = self.struct.unpack(payload)
+        if self.scales is not None:
+            fields = tuple(value / scale
+                           for value, scale in zip(fields, self.scales))
+        if self.tail is not None:
+            fields += (bytes(payload[self.struct.size:]),)
+        return fields
+
+
+# Registered schema, indexed by message type id.
+SCHEMA = {}
+
+
+def register(type_id, name, fmt='', scales=None, priority=PRIORITY_COMMAND, reliable=False, tail=None):
+    """ Adds a message type to the shared schema. """
+    if type_id in SCHEMA:
+        raise ValueError('Message type id already registered: ' + hex(type_id))
+    SCHEMA[type_id] = Message(type_id, name, fmt, scales, priority, reliable, tail)
+
+
+# Pings are safety messages, the lost-link timeout depends on them getting through.
+register(PING, 'ping', priority=PRIORITY_SAFETY)
+register(LOG, 'log', TEXT, priority=PRIORITY_ACK)
+
+# (Next expected sequence number, bitmap of sequence numbers received after it)
+register(ACK, 'ack', 'HI', priority=PRIORITY_ACK)
+
+# Keyframe or delta encoded telemetry channels (see codec.py).
+register(AUV_DATA, 'auv_data', BYTES, priority=PRIORITY_TELEMETRY)
+register(MISSION_STARTED, 'mission_started', 'B', priority=PRIORITY_ACK, reliable=True)
+register(MISSION_FAILED, 'mission_failed', priority=PRIORITY_SAFETY, reliable=True)
+
+# Bulk download. (Transfer id, size in bytes, chunk size)
+register(D_INFO, 'd_info', 'HIH', reliable=True)
+# (Transfer id, chunk index, chunk CRC-32, chunk data)
+register(D, 'd', 'HII', priority=PRIORITY_BULK, tail=BYTES)
+# (Transfer id), sent behind the last queued chunk.
+register(D_DONE, 'd_done', 'H', priority=PRIORITY_BULK)
+
+# (Base station clock in ms, forward, turn, front, back motor speeds), see control.py.
+register(XBOX, 'xbox', 'Hbbbb')
+register(TEST_MOTOR, 'test_motor', 'B', reliable=True)
+register(START_MISSION, 'start_mission', 'B', reliable=True)
+register(ABORT_MISSION, 'abort_mission', priority=PRIORITY_SAFETY, reliable=True)
+register(D_DATA, 'd_data', reliable=True)
+# (Transfer id, first missing chunk, bitmap of missing chunks after it). The bitmap reaches
+# the last chunk the base station received (or its size limit), so every chunk past its end
+# is missing too. first == chunk count means complete.
+register(D_RESEND, 'd_resend', 'HI', tail=BYTES)
+
+# Timing of a section of the AUV's code over the last minute, see timing.py.
+# (Samples, p50, p99, max in microseconds, section name)
+register(TIMING, 'timing', 'IIII', priority=PRIORITY_TELEMETRY, tail=BYTES)
+register(TIMING_QUERY, 'timing_query', reliable=True)
+
+
+def priority(type_id):
+    """ Returns the default send priority of a message type. """
+    return SCHEMA[type_id].priority
+
+
+def is_reliable(type_id):
+    """ Returns True if a message type is sent with a sequence number and acknowledged. """
+    return SCHEMA[type_id].reliable
+
+
+def name(type_id):
+    """ Returns the name of a message type, for logging. """
+    message = SCHEMA.get(type_id)
+    return message.name if message is not None else hex(type_id)
+
+
+def encode(type_id, *fields):
+    """ Returns a complete frame (bytes) for the given message type and fields. """
+    payload = SCHEMA[type_id].pack(fields)
+    body = HEADER.pack(SYNC, type_id, len(payload)) + payload
+    return body + CRC.pack(binascii.crc_hqx(body[1:], CRC_SEED))
+
+
+class Decoder:
+    """ Incrementally splits a byte stream into decoded messages. """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.crc_errors = 0
+        self.malformed = 0
+        self.false_syncs = 0
+
+    def feed(self, data):
+        """
+        Appends received bytes and returns a list of (type_id, fields) tuples
+        for every complete, valid frame. Partial frames are kept for the next call.
+        """
+        self.buffer += data
+        buffer = self.buffer
+        messages = []
+        start = 0
+
+        while True:
+            start = buffer.find(SYNC, start)
+            if start < 0:  # No frame start in buffer, discard noise.
+                start = len(buffer)
+                break
+            if len(buffer) - start < FRAME_OVERHEAD:
+                break
+
+            # Reject a false sync by its header right away, instead of waiting for up to
+            # MAX_PAYLOAD bytes of a frame that is not there, which would delay the valid
+            # frames behind it.
+            message = SCHEMA.get(buffer[start + 1])
+            length = buffer[start + 2]
+            if message is None or not message.valid_length(length):
+                self.false_syncs += 1
+                start += 1
+                continue
+
+            end = start + HEADER_SIZE + length + CRC.size
+            if end > len(buffer):  # Wait for the rest of the frame.
+                break
+
+            crc = CRC.unpack_from(buffer, end - CRC.size)[0]
+            if crc != binascii.crc_hqx(buffer[start + 1:end - CRC.size], CRC_SEED):
+                # Corrupt frame or false sync, resynchronize on next byte.
+                self.crc_errors += 1
+                start += 1
+                continue
+
+            try:
+                payload = bytes(buffer[start + HEADER_SIZE:end - CRC.size])
+                messages.append((message.type_id, message.unpack(payload)))
+            except (struct.error, UnicodeDecodeError):
+                self.malformed += 1
+            start = end
+
+        del buffer[:start]
+        return messages
@@ -0,0 +1,231 @@
+"""
+The reliable module adds acknowledged, retransmitted delivery on top of the Radio class.
+
+This file is mirrored in auv/api/reliable.py and base_station/api/reliable.py.
+
+Reliable message types (see protocol.is_reliable) are sent with a 16-bit sequence
+number and the oldest sequence number the sender still waits on, which tells a
+receiver where the stream starts. They also carry a random session id, drawn once per
+ReliableLink: the receiver keeps its duplicate window across link losses, while the
+peer keeps retransmitting, and only starts over when the session id changes because
+the peer restarted. The receiver answers every one of them with an ACK
+carrying the next sequence number it expects (cumulative) and a bitmap of the sequence
+numbers it already holds after that one (selective). The sender retransmits unacknowledged messages with an
+exponentially backed-off timer, and the receiver drops duplicates so commands are
+never executed twice. All other message types pass straight through, unreliably.
+"""
+import random
+import time
+from collections import OrderedDict
+
+from . import protocol
+
+SEQ_MODULO = 0x10000
+ACK_WINDOW = 32  # Number of sequence numbers covered by the selective ACK bitmap.
+
+# Retransmission timer (seconds).
+INITIAL_TIMEOUT = 0.5
+MIN_TIMEOUT = 0.2
+MAX_TIMEOUT = 4.0
+BACKOFF = 2.0
+MAX_RETRIES = 6
+
+# Smoothing gains of the round-trip time estimator (RFC 6298).
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+RTT_MAX_AGE = 5.0  # Seconds after which the last round-trip time no longer describes the link.
+
+
+def seq_before(a, b):
+    """ Returns True if sequence number a comes before b, accounting for wrap-around. """
+    return 0 < (b - a) % SEQ_MODULO < SEQ_MODULO // 2
+
+
+class Pending:
+    """ A sent reliable message that has not been acknowledged yet. """
+
+    __slots__ = ('type_id', 'fields', 'sent_at', 'timeout', 'retries')
+
+    def __init__(self, type_id, fields, sent_at, timeout):
+        self.type_id = type_id
+        self.fields = fields
+        self.sent_at = sent_at
+        self.timeout = timeout
+        self.retries = 0
+
+
+class ReliableLink:
+    """ Sequence numbers, ACKs, retransmission and duplicate suppression over a Radio. """
+
+    def __init__(self, radio, max_retries=MAX_RETRIES):
+        """
+        radio:       Radio object used to send and receive frames.
+        max_retries: Retransmissions before a message is reported as failed.
+        """
+        self.radio = radio
+        self.max_retries = max_retries
+
+        # Sender state. A restarted peer has a new session id, so it is not mistaken
+        # for a stream of duplicates.
+        self.session = random.randrange(SEQ_MODULO)
+        self.next_seq = random.randrange(SEQ_MODULO)
+        self.pending = OrderedDict()
+        self.srtt = None
+        self.rttvar = None
+        self.rtt_sampled_at = None
+        self.retransmissions = 0
+
+        # Receiver state.
+        self.peer_session = None
+        self.duplicates = 0
+        self.peer_restarts = 0
+        self.reset_receiver()
+
+    def reset_receiver(self):
+        """
+        Forgets the peer's sequence numbers, which happens when its session id changes.
+        Do not call this when the link is merely lost: the peer still retransmits its
+        unacknowledged commands, which would then be executed twice.
+        """
+        self.expected = None
+        self.received = set()
+
+    def reopen(self, radio):
+        """
+        Continues the link over a reopened radio. The session id, the duplicate window and
+        the unacknowledged messages are kept, so the peer's retransmissions are still
+        recognized as duplicates and pending messages are retransmitted over the new radio.
+        """
+        self.radio = radio
+
+    def timeout(self):
+        """ Returns the current retransmission timeout, derived from the measured round-trip time. """
+        if self.srtt is None:
+            return INITIAL_TIMEOUT
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, self.srtt + 4 * self.rttvar))
+
+    def send(self, type_id, *fields):
+        """
+        Sends a message. Reliable message types are numbered and kept until they are
+        acknowledged. Returns the sequence number, or None for unreliable messages.
+        """
+        if not protocol.is_reliable(type_id):
+            self.radio.send(type_id, *fields)
+            return None
+
+        seq = self.next_seq
+        self.next_seq = (seq + 1) % SEQ_MODULO
+        self.pending[seq] = Pending(type_id, fields, time.monotonic(), self.timeout())
+        self.radio.send(type_id, self.session, seq, self.oldest_pending(), *fields)
+        return seq
+
+    def oldest_pending(self):
+        """ Returns the oldest unacknowledged sequence number (or the next one if none). """
+        return next(iter(self.pending), self.next_seq)
+
+    def update(self):
+        """
+        Retransmits messages whose timer expired. Returns a list of (type_id, fields) of
+        messages that were given up on after max_retries retransmissions.
+        """
+        now = time.monotonic()
+        failed = []
+        for seq, pending in list(self.pending.items()):
+            if now - pending.sent_at < pending.timeout:
+                continue
+
+            if pending.retries >= self.max_retries:
+                del self.pending[seq]
+                failed.append((pending.type_id, pending.fields))
+                continue
+
+            pending.retries += 1
+            pending.sent_at = now
+            pending.timeout = min(MAX_TIMEOUT, pending.timeout * BACKOFF)
+            self.retransmissions += 1
+            self.radio.send(pending.type_id, self.session, seq, self.oldest_pending(), *pending.fields)
+        return failed
+
+    def on_ack(self, expected, bitmap):
+        """ Removes every pending message covered by a cumulative + selective ACK. """
+        now = time.monotonic()
+        for seq in list(self.pending):
+            offset = (seq - expected) % SEQ_MODULO
+            if seq_before(seq, expected) or (offset < ACK_WINDOW and bitmap >> offset & 1):
+                pending = self.pending.pop(seq)
+                if pending.retries == 0:  # Karn's rule, only time unambiguous samples.
+                    self.sample_rtt(now - pending.sent_at)
+
+    def sample_rtt(self, rtt):
+        """ Updates the smoothed round-trip time estimate. """
+        self.rtt_sampled_at = time.monotonic()
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+
+    def recent_rtt(self):
+        """
+        Returns the smoothed round-trip time, or None if it was not sampled in the last
+        RTT_MAX_AGE seconds. Only commands are timed, so the estimate goes stale while
+        none are sent and must not keep describing a link that since recovered.
+        """
+        if self.rtt_sampled_at is None or time.monotonic() - self.rtt_sampled_at > RTT_MAX_AGE:
+            return None
+        return self.srtt
+
+    def accept(self, session, seq, oldest):
+        """
+        Records a received reliable sequence number and acknowledges it.
+        Returns False if the message is a duplicate that was already delivered.
+
+        session: Session id of the sender.
+        seq:     Sequence number of the received message.
+        oldest:  Oldest sequence number the sender is still waiting an ACK for.
+        """
+        if session != self.peer_session:  # The peer (re)started, its sequence numbers are new.
+            if self.peer_session is not None:
+                self.peer_restarts += 1
+            self.peer_session = session
+            self.reset_receiver()
+
+        if self.expected is None or seq_before(self.expected, oldest):
+            # Everything before oldest was acknowledged or given up on by the sender.
+            self.expected = oldest
+            self.received = set(held for held in self.received if not seq_before(held, oldest))
+
+        duplicate = seq_before(seq, self.expected) or seq in self.received
+        if duplicate:
+            self.duplicates += 1
+        else:
+            self.received.add(seq)
+            while self.expected in self.received:
+                self.received.remove(self.expected)
+                self.expected = (self.expected + 1) % SEQ_MODULO
+
+        # Always acknowledge, the previous ACK may have been lost.
+        bitmap = 0
+        for held in self.received:
+            offset = (held - self.expected) % SEQ_MODULO
+            if offset < ACK_WINDOW:
+                bitmap |= 1 << offset
+        self.radio.send(protocol.ACK, self.expected, bitmap)
+        return not duplicate
+
+    def receive(self):
+        """
+        Returns a list of (type_id, fields) messages from the radio. ACKs are consumed,
+        duplicates are dropped and sequence numbers are stripped from reliable messages.
+        """
+        messages = []
+        for type_id, fields in self.radio.receive():
+            if type_id == protocol.ACK:
+                self.on_ack(*fields)
+            elif protocol.is_reliable(type_id):
+                if self.accept(*fields[:3]):
+                    messages.append((type_id, fields[3:]))
+            else:
+                messages.append((type_id, fields))
+        return messages
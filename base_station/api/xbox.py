@@ -1,30 +1,52 @@
 import subprocess
 import os
+import re
 import select
+import threading
 import time
 
+# Fields of an xboxdrv status line, in order, e.g.
+# "X1:  -123 Y1:  4567  X2:     0 Y2:     0  du:0 dd:0 dl:0 dr:0  back:0 guide:0 start:0  TL:0 TR:0  A:0 B:0 X:0 Y:0  LB:0 RB:0  LT:  0 RT:  0"
+FIELDS = ('X1', 'Y1', 'X2', 'Y2', 'du', 'dd', 'dl', 'dr', 'back', 'guide', 'start',
+          'TL', 'TR', 'A', 'B', 'X', 'Y', 'LB', 'RB', 'LT', 'RT')
+(X1, Y1, X2, Y2, DU, DD, DL, DR, BACK, GUIDE, START,
+ TL, TR, A, B, X, Y, LB, RB, LT, RT) = range(len(FIELDS))
+LINE_LENGTH = 140  # Length of a valid xboxdrv status line, including the newline.
+VALUE = re.compile(rb':\s*(-?\d+)')
+
+
+def parse_reading(line):
+    """ Returns the tuple of FIELDS values of an xboxdrv status line, or None if it is not one. """
+    if len(line) != LINE_LENGTH:
+        return None
+    values = VALUE.findall(line)
+    if len(values) != len(FIELDS):
+        return None
+    return tuple(map(int, values))
+
+
 class Joystick:
 
     """Initializes the joystick/wireless receiver, launching 'xboxdrv' as a subprocess
     and checking that the wired joystick or wireless receiver is attached.
-    The refreshRate determines the maximnum rate at which events are polled from xboxdrv.
-    Calling any of the Joystick methods will cause a refresh to occur, if refreshTime has elapsed.
-    Routinely call a Joystick method, at least once per second, to avoid overfilling the event buffer.
- 
+    A background thread then reads every event from xboxdrv as it arrives, and keeps the
+    latest readings as an immutable tuple. The Joystick methods only read that tuple, so
+    they never block nor make a system call.
+
     Usage:
         joy = xbox.Joystick()
     """
     def __init__(self,refreshRate = 30):
+        """ refreshRate: Unused, events are read as soon as xboxdrv prints them. """
         self.proc = subprocess.Popen(['xboxdrv','--no-uinput','--detach-kernel-driver'], stdout=subprocess.PIPE)
         self.pipe = self.proc.stdout
-        
+
         time.sleep(1)
 		#
         self.connectStatus = False  #will be set to True once controller is detected and stays on
-        self.reading = '0' * 140    #initialize stick readings to all zeros
-        #
-        self.refreshTime = 0    #absolute time when next refresh (read results from xboxdrv stdout pipe) is to occur
-        self.refreshDelay = 1.0 / refreshRate   #joystick refresh is to be performed 30 times per sec by default
+        self.reading = (0,) * len(FIELDS)    #initialize stick readings to all zeros
+        self.unplugged = False  #set once xboxdrv exits, e.g. when the receiver is unplugged
+        self.events = 0
         #
         # Read responses from 'xboxdrv' for upto 2 seconds, looking for controller/receiver to respond
         found = False
@@ -34,45 +56,51 @@ class Joystick:
             if readable:
                 response = self.pipe.readline()
                 # Hard fail if we see this, so force an error
-                if response[0:7] == 'No Xbox':
+                if response[0:7] == b'No Xbox':
                     raise IOError('No Xbox controller/receiver found')
                 # Success if we see the following
-                if response[0:12].lower() == 'press ctrl-c':
+                if response[0:12].lower() == b'press ctrl-c':
                     found = True
                 # If we see 140 char line, we are seeing valid input
-                if len(response) == 140:
+                reading = parse_reading(response)
+                if reading is not None:
                     found = True
                     self.connectStatus = True
-                    self.reading = response
+                    self.reading = reading
         # if the controller wasn't found, then halt
         if not found:
             self.close()
             raise IOError('Unable to detect Xbox controller/receiver - Run python as sudo')
 
-    """Used by all Joystick methods to read the most recent events from xboxdrv.
-    The refreshRate determines the maximum frequency with which events are checked.
+        self.thread = threading.Thread(target=self.read_events, name='xbox', daemon=True)
+        self.thread.start()
+
+    """Reads the events of xboxdrv until it exits, in the background thread.
     If a valid event response is found, then the controller is flagged as 'connected'.
     """
+    def read_events(self):
+        for response in iter(self.pipe.readline, b''):
+            self.events += 1
+            reading = parse_reading(response)
+            # Valid controller response will be 140 chars.
+            if reading is not None:
+                self.reading = reading
+                self.connectStatus = True
+            else:  #Any other response means we have lost wireless or controller battery
+                self.connectStatus = False
+        # A zero length response means controller has been unplugged.
+        self.unplugged = True
+        self.connectStatus = False
+
+    """Kept for compatibility, the background thread keeps the readings up to date."""
     def refresh(self):
-        # Refresh the joystick readings based on regular defined freq
-        if self.refreshTime < time.time():
-            self.refreshTime = time.time() + self.refreshDelay  #set next refresh time
-            # If there is text available to read from xboxdrv, then read it.
-            readable, writeable, exception = select.select([self.pipe],[],[],0)
-            if readable:
-                # Read every line that is availabe.  We only need to decode the last one.
-                while readable:
-                    response = self.pipe.readline()
-                    # A zero length response means controller has been unplugged.
-                    if len(response) == 0:
-                        raise IOError('Xbox controller disconnected from USB')
-                    readable, writeable, exception = select.select([self.pipe],[],[],0)
-                # Valid controller response will be 140 chars.  
-                if len(response) == 140:
-                    self.connectStatus = True
-                    self.reading = response
-                else:  #Any other response means we have lost wireless or controller battery
-                    self.connectStatus = False
+        if self.unplugged:
+            raise IOError('Xbox controller disconnected from USB')
+
+    """Returns the latest readings, a tuple of the FIELDS values (see the index constants).
+    Reading it once gives consistent values of every axis and button."""
+    def snapshot(self):
+        return self.reading
 
     """Return a status of True, when the controller is actively connected.
     Either loss of wireless signal or controller powering off will break connection.  The
@@ -85,31 +113,26 @@ class Joystick:
     fault is corrected.
     """
     def connected(self):
-        self.refresh()
         return self.connectStatus
 
     # Left stick X axis value scaled between -1.0 (left) and 1.0 (right) with deadzone tolerance correction
     def leftX(self,deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[3:9])
+        raw = self.reading[X1]
         return self.axisScale(raw,deadzone)
 
     # Left stick Y axis value scaled between -1.0 (down) and 1.0 (up)
     def leftY(self,deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[13:19])
+        raw = self.reading[Y1]
         return self.axisScale(raw,deadzone)
 
     # Right stick X axis value scaled between -1.0 (left) and 1.0 (right)
     def rightX(self,deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[24:30])
+        raw = self.reading[X2]
         return self.axisScale(raw,deadzone)
 
     # Right stick Y axis value scaled between -1.0 (down) and 1.0 (up)
     def rightY(self,deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[34:40])
+        raw = self.reading[Y2]
         return self.axisScale(raw,deadzone)
 
     # Scale raw (-32768 to +32767) axis with deadzone correcion
@@ -125,101 +148,82 @@ class Joystick:
 
     # Dpad Up status - returns 1 (pressed) or 0 (not pressed)
     def dpadUp(self):
-        self.refresh()
-        return int(self.reading[45:46])
+        return self.reading[DU]
         
     # Dpad Down status - returns 1 (pressed) or 0 (not pressed)
     def dpadDown(self):
-        self.refresh()
-        return int(self.reading[50:51])
+        return self.reading[DD]
         
     # Dpad Left status - returns 1 (pressed) or 0 (not pressed)
     def dpadLeft(self):
-        self.refresh()
-        return int(self.reading[55:56])
+        return self.reading[DL]
         
     # Dpad Right status - returns 1 (pressed) or 0 (not pressed)
     def dpadRight(self):
-        self.refresh()
-        return int(self.reading[60:61])
+        return self.reading[DR]
         
     # Back button status - returns 1 (pressed) or 0 (not pressed)
     def Back(self):
-        self.refresh()
-        return int(self.reading[68:69])
+        return self.reading[BACK]
 
     # Guide button status - returns 1 (pressed) or 0 (not pressed)
     def Guide(self):
-        self.refresh()
-        return int(self.reading[76:77])
+        return self.reading[GUIDE]
 
     # Start button status - returns 1 (pressed) or 0 (not pressed)
     def Start(self):
-        self.refresh()
-        return int(self.reading[84:85])
+        return self.reading[START]
 
     # Left Thumbstick button status - returns 1 (pressed) or 0 (not pressed)
     def leftThumbstick(self):
-        self.refresh()
-        return int(self.reading[90:91])
+        return self.reading[TL]
 
     # Right Thumbstick button status - returns 1 (pressed) or 0 (not pressed)
     def rightThumbstick(self):
-        self.refresh()
-        return int(self.reading[95:96])
+        return self.reading[TR]
 
     # A button status - returns 1 (pressed) or 0 (not pressed)
     def A(self):
-        self.refresh()
-        return int(self.reading[100:101])
+        return self.reading[A]
         
     # B button status - returns 1 (pressed) or 0 (not pressed)
     def B(self):
-        self.refresh()
-        return int(self.reading[104:105])
+        return self.reading[B]
 
     # X button status - returns 1 (pressed) or 0 (not pressed)
     def X(self):
-        self.refresh()
-        return int(self.reading[108:109])
+        return self.reading[X]
 
     # Y button status - returns 1 (pressed) or 0 (not pressed)
     def Y(self):
-        self.refresh()
-        return int(self.reading[112:113])
+        return self.reading[Y]
 
     # Left Bumper button status - returns 1 (pressed) or 0 (not pressed)
     def leftBumper(self):
-        self.refresh()
-        return int(self.reading[118:119])
+        return self.reading[LB]
 
     # Right Bumper button status - returns 1 (pressed) or 0 (not pressed)
     def rightBumper(self):
-        self.refresh()
-        return int(self.reading[123:124])
+        return self.reading[RB]
 
     # Left Trigger value scaled between 0.0 to 1.0
     def leftTrigger(self):
-        self.refresh()
-        return int(self.reading[129:132]) / 255.0
+        return self.reading[LT] / 255.0
         
     # Right trigger value scaled between 0.0 to 1.0
     def rightTrigger(self):
-        self.refresh()
-        return int(self.reading[136:139]) / 255.0
+        return self.reading[RT] / 255.0
 
     # Returns tuple containing X and Y axis values for Left stick scaled between -1.0 to 1.0
     # Usage:
     #     x,y = joy.leftStick()
     def leftStick(self,deadzone=4000):
-        self.refresh()
         return (self.leftX(deadzone),self.leftY(deadzone))
 
     # Returns tuple containing X and Y axis values for Right stick scaled between -1.0 to 1.0
     # Usage:
     #     x,y = joy.rightStick() 
     def rightStick(self,deadzone=4000):
-        self.refresh()
         return (self.rightX(deadzone),self.rightY(deadzone))
 
     # Cleanup by ending the xboxdrv subprocess
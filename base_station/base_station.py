@@ -15,15 +15,22 @@ from queue import Queue
 
 # Custom imports
 from api import Radio
+from api import ReliableLink
+from api import Download
+from api import TelemetryDecoder
+from api import ControlSender
 from api import Joystick
 from api import NavController
 from api import GPS
+from api import Projection
+from api import protocol
 from gui import Main
+from gui import events
 
 # Constants
 THREAD_SLEEP_DELAY = 0.1  # Since we are the slave to AUV, we must run faster.
-RADIO_PATH = '/dev/serial/by-id/usb-Silicon_Labs_CP2102_USB_to_UART_Bridge_Controller_0001-if00-port0'
-PING = b'PING\n'
+# NAUTILUS_RADIO_PATH overrides the radio device, e.g. to run on the link simulator in sim/.
+RADIO_PATH = os.environ.get('NAUTILUS_RADIO_PATH', '/dev/serial/by-id/usb-Silicon_Labs_CP2102_USB_to_UART_Bridge_Controller_0001-if00-port0')
 CONNECTION_TIMEOUT = 4
 
 # AUV Constants (these are also in auv.py)
@@ -43,23 +50,47 @@ class BaseStation(threading.Thread):
 
         # Instance variables
         self.radio = None
+        self.link = None
         self.joy = None
         self.connected_to_auv = False
         self.nav_controller = None
         self.gps = None
         self.in_q = in_q
         self.out_q = out_q
-        self.gps_q = Queue()
+        self.gps_fix = None  # Latest GPS fix sent to the GUI.
+        self.download = None
+        self.telemetry = TelemetryDecoder()
+        self.control = ControlSender()
+        self.projection = Projection()  # UTM zone of the operating area, fixed by the first fix.
+
+        # Handlers of the events sent by the GUI, indexed by event class.
+        self.event_handlers = {
+            events.TestMotor: lambda event: self.test_motor(event.motor),
+            events.StartMission: lambda event: self.start_mission(event.mission),
+            events.AbortMission: lambda event: self.abort_mission(),
+            events.DownloadData: lambda event: self.download_data(),
+            events.QueryTimings: lambda event: self.query_timings(),
+            events.Close: lambda event: self.close(),
+        }
         self.manual_mode = True
         self.time_since_last_ping = 0.0
 
-        # Get all non-default callable methods in this class
-        self.methods = [m for m in dir(BaseStation) if not m.startswith(
-            '__') and not m.startswith('_')]
+        # Dispatch table of AUV messages, indexed by protocol message type.
+        self.handlers = {
+            protocol.LOG: self.log,
+            protocol.AUV_DATA: self.auv_telemetry,
+            protocol.MISSION_STARTED: self.mission_started,
+            protocol.MISSION_FAILED: self.mission_failed,
+            protocol.D_INFO: self.d_info,
+            protocol.D: self.d,
+            protocol.D_DONE: self.d_done,
+            protocol.TIMING: self.timing,
+        }
 
         # Try to assign our radio object
         try:
-            self.radio = Radio(RADIO_PATH)
+            self.radio = Radio(RADIO_PATH, threaded=True)
+            self.open_link()
             self.log("Successfully found radio device on RADIO_PATH.")
         except:
             self.log(
@@ -68,7 +99,7 @@ class BaseStation(threading.Thread):
         # Try to connect our Xbox 360 controller.
         try:
             self.joy = Joystick()
-            if (joy.connected()):
+            if (self.joy.connected()):
                 self.log("Successfuly found Xbox 360 controller.")
                 self.nav_controller = NavController(self.joy)
                 self.log(
@@ -76,12 +107,12 @@ class BaseStation(threading.Thread):
         except:
             self.log("Warning: Cannot find Xbox 360 controller.")
 
-        # Try to assign our GPS object connection to GPSD
+        # Start reading our position from gpsd, the GPS thread reconnects by itself.
         try:
-            self.gps = GPS(self.gps_q)
-            self.log("Successfully connected to GPS socket service.")
+            self.gps = GPS()
+            self.log("Started reading the GPS socket service.")
         except:
-            self.log("Warning: Could not connect to a GPS socket service.")
+            self.log("Warning: Could not start reading a GPS socket service.")
 
     def calibrate_controller(self):
         """ Instantiates a new Xbox Controller Instance and NavigationController """
@@ -103,39 +134,51 @@ class BaseStation(threading.Thread):
         self.main.log("Controller is connected.")
 
     def check_tasks(self):
-        """ This checks all of the tasks (given from the GUI thread) in our in_q, and evaluates them. """
+        """ This handles all of the events (given from the GUI thread) in our in_q. """
 
         while not self.in_q.empty():
-            task = "self." + self.in_q.get()
-            # Try to evaluate the task in the in_q.
+            event = self.in_q.get()
+            # Try to handle the event in the in_q.
             try:
-                eval(task)
+                if not events.dispatch(self.event_handlers, event):
+                    print("Received unknown in_q event: ", event)
             except Exception as e:
-                print("Failed to evaluate in_q task: ", task)
+                print("Failed to handle in_q event: ", event)
                 print("\t Error received was: ", str(e))
 
-    def auv_data(self, heading, temperature, longitude=None, latitude=None):
+    def auv_telemetry(self, payload):
+        """ Decodes an auv_data packet. Deltas of a lost keyframe are skipped until the next keyframe. """
+        values = self.telemetry.decode(payload)
+        if values is not None:
+            self.auv_data(**values)
+
+    def auv_data(self, heading=None, temperature=None, depth=None, latitude=None, longitude=None):
         """ Parses the AUV data-update packet, stores knowledge of its on-board sensors"""
 
         # Update heading on BS and on GUI
-        self.auv_heading = heading
-        self.out_q.put("set_heading("+str(heading)+")")
+        if heading is not None:
+            self.auv_heading = heading
+            self.out_q.put(events.SetHeading(heading))
 
         # Update temp on BS and on GUI
-        self.auv_temperature = temperature
-        self.out_q.put("set_temperature("+str(temperature)+")")
+        if temperature is not None:
+            self.auv_temperature = temperature
+            self.out_q.put(events.SetTemperature(temperature))
+
+        if depth is not None:
+            self.auv_depth = depth
 
         # If the AUV provided its location...
         if longitude is not None and latitude is not None:
             self.auv_longitude = longitude
             self.auv_latitude = latitude
             try:    # Try to convert AUVs latitude + longitude to UTM coordinates, then update on the GUI thread.
-                self.auv_utm_coordinates = utm.from_latlon(longitude, latitude)
-                self.out_q.put("add_auv_coordinates(" + self.auv_utm_coordinates[0] + ", " + self.auv_utm_coordinates[1] + ")")
+                self.auv_utm_coordinates = self.projection.project(latitude, longitude)
+                self.out_q.put(events.AddAuvCoordinates(self.auv_utm_coordinates[1], self.auv_utm_coordinates[0],
+                                                        depth if depth is not None else float('nan'),
+                                                        heading if heading is not None else float('nan')))
             except:
                 self.log("Failed to convert the AUV's gps coordinates to UTM.")
-        else:
-            self.log("The AUV did not report its latitude and longitude.")
 
     def test_motor(self, motor):
         """ Attempts to send the AUV a signal to test a given motor. """
@@ -144,7 +187,7 @@ class BaseStation(threading.Thread):
             self.log("Cannot test " + motor +
                      " motor(s) because there is no connection to the AUV.")
         else:
-            self.radio.write(str.encode('test_motor("' + motor + '")\n'))
+            self.link.send(protocol.TEST_MOTOR, protocol.MOTORS.index(motor))
             self.log('Sending task: test_motor("' + motor + '")')
 
     def abort_mission(self):
@@ -153,14 +196,14 @@ class BaseStation(threading.Thread):
             self.log(
                 "Cannot abort mission because there is no connection to the AUV.")
         else:
-            self.radio.write(str.encode("abort_mission()\n"))
+            self.link.send(protocol.ABORT_MISSION)
             self.log("Sending task: abort_mission()")
             self.manual_mode = True
 
     def mission_failed(self):
         """ Mission return failure from AUV. """
         self.manual_mode = True
-        self.out_q.put("set_vehicle(True)")
+        self.out_q.put(events.SetVehicle(True))
         self.log("Enforced switch to manual mode.")
 
         self.log("The current mission has failed.")
@@ -172,8 +215,7 @@ class BaseStation(threading.Thread):
             self.log("Cannot start mission " + str(mission) +
                      " because there is no connection to the AUV.")
         else:
-            self.radio.write(str.encode(
-                "start_mission(" + str(mission) + ")\n"))
+            self.link.send(protocol.START_MISSION, mission)
             self.log('Sending task: start_mission(' + str(mission) + ')')
 
     def run(self):
@@ -182,12 +224,13 @@ class BaseStation(threading.Thread):
         # Begin our main loop for this thread.
         while True:
             self.check_tasks()
+            self.update_gps()
 
             # Always try to update connection status
             if time.time() - self.time_since_last_ping > CONNECTION_TIMEOUT:
                 # We are NOT connected to AUV, but we previously ('before') were. Status has changed to failed.
                 if self.connected_to_auv is True:
-                    self.out_q.put("set_connection(False)")
+                    self.out_q.put(events.SetConnection(False))
                     self.log("Lost connection to AUV.")
                     self.connected_to_auv = False
 
@@ -204,17 +247,19 @@ class BaseStation(threading.Thread):
                 self.joy = None
                 self.nav_controller = None
 
-            # This executes if we never had a radio object, or it got disconnected.
-            if self.radio is None or not os.path.exists(RADIO_PATH):
+            # This executes if we HAD a radio object, but it got disconnected or failed.
+            if self.radio is not None and (not os.path.exists(RADIO_PATH) or not self.radio.is_open()):
+                self.log("Radio device has been disconnected.")
+                self.radio.close()
+                self.radio = None
 
-                # This executes if we HAD a radio object, but it got disconnected.
-                if self.radio is not None and not os.path.exists(RADIO_PATH):
-                    self.log("Radio device has been disconnected.")
-                    self.radio.close()
+            # This executes if we never had a radio object, or it got disconnected.
+            if self.radio is None:
 
                 # Try to assign us a new Radio object
                 try:
-                    self.radio = Radio(RADIO_PATH)
+                    self.radio = Radio(RADIO_PATH, threaded=True)
+                    self.open_link()
                     self.log(
                         "Radio device has been found on RADIO_PATH.")
                 except:
@@ -224,42 +269,34 @@ class BaseStation(threading.Thread):
             else:
                 # Try to read line from radio.
                 try:
-                    self.radio.write(PING)
+                    self.radio.send(protocol.PING)
 
                     # This is where secured/synchronous code should go.
                     if self.connected_to_auv and self.manual_mode:
                         if self.joy is not None and self.joy.connected() and self.nav_controller is not None:
                             self.nav_controller.handle()
-                            self.radio.write(
-                                "xbox(" + self.nav_controller.get_data())
-                    # Read ALL lines stored in buffer (probably around 2-3 commands)
-                    lines = self.radio.readlines()
-                    self.radio.flush()
-
-                    for line in lines:
-                        if line == PING:
+                            fields = self.control.update(self.nav_controller.get_data())
+                            if fields is not None:
+                                self.radio.send(protocol.XBOX, *fields)
+
+                    # Read ALL messages stored in buffer (probably around 2-3 commands)
+                    for type_id, fields in self.link.receive():
+                        if type_id == protocol.PING:
                             self.time_since_last_ping = time.time()
                             if self.connected_to_auv is False:
                                 self.log("Connection to AUV verified.")
-                                self.out_q.put("set_connection(True)")
+                                self.out_q.put(events.SetConnection(True))
                                 self.connected_to_auv = True
+                        else:
+                            self.handle_message(type_id, fields)
+
+                    # Retransmit unacknowledged commands, report the ones the AUV never received.
+                    for type_id, fields in self.link.update():
+                        self.log("AUV never acknowledged command: " + protocol.name(type_id) + str(fields))
 
-                        elif len(line) > 0:
-                            # Line is greater than 0, but not equal to the AUV_PING
-                            # which means a possible command was found.
-                            message = line.decode('utf-8').replace("\n", "")
-
-                            # Check if message is a possible python function
-                            if len(message) > 2 and "(" in message and ")" in message:
-                                # Get possible function name
-                                possible_func_name = message[0:message.find(
-                                    "(")]
-                                if possible_func_name in self.methods:
-                                    if possible_func_name != "auv_data" and possible_func_name != "log":
-                                        self.log(
-                                            "Received command from AUV: " + message)
-                                    # Put task received into our in_q to be processed later.
-                                    self.in_q.put(message)
+                    # Ask for missing chunks again if a download stalled (e.g. after a link drop).
+                    if self.download is not None and self.download.update():
+                        self.request_missing_chunks()
 
                 except:
                     self.radio.close()
@@ -269,39 +306,128 @@ class BaseStation(threading.Thread):
 
             time.sleep(THREAD_SLEEP_DELAY)
 
+    def open_link(self):
+        """ Runs the reliable link over the newly opened radio, keeping its state across reconnects. """
+        if self.link is None:
+            self.link = ReliableLink(self.radio)
+        else:
+            self.link.reopen(self.radio)
+
+    def update_gps(self):
+        """ Shows the base station's latest GPS fix on the GUI, if it is new. """
+        fix = self.gps.latest if self.gps is not None else None
+        if fix is None or fix is self.gps_fix:
+            return
+
+        self.gps_fix = fix
+        try:
+            easting, northing = self.projection.project(fix.latitude, fix.longitude)
+            self.out_q.put(events.UpdateBsCoordinates(northing, easting))
+        except:
+            self.log("Failed to convert the base station's gps coordinates to UTM.")
+
+    def handle_message(self, type_id, fields):
+        """ Looks up a message received from the AUV in the dispatch table and executes it. """
+        handler = self.handlers.get(type_id)
+        if handler is None:
+            self.log("Received unknown message from AUV: " + protocol.name(type_id))
+            return
+
+        if type_id not in (protocol.AUV_DATA, protocol.LOG, protocol.D, protocol.TIMING):
+            self.log("Received command from AUV: " + protocol.name(type_id) + str(fields))
+
+        try:
+            handler(*fields)
+        except Exception as e:
+            print("Failed to handle AUV message: ", protocol.name(type_id))
+            print("\t Error received was: ", str(e))
+
     def close(self):
         """ Function that is executed upon the closure of the GUI (passed from input-queue). """
         os._exit(1)  # => Force-exit the process immediately.
 
-    def d(self, bytes):
-        # TODO
-        # Append new bytes to local data string/byte array
-        # local_data += bytes
-        pass
+    def d_info(self, transfer_id, size, chunk_size):
+        """ The AUV described the file it is about to send. Starts (or resumes) the download. """
+        if self.download is not None:
+            if self.download.transfer_id == transfer_id:  # Repeated request for the current download.
+                self.request_missing_chunks()
+                return
+            self.download.close()
+
+        self.download = Download(transfer_id, size, chunk_size)
+        if self.download.resumed:
+            self.log("Resuming download of " + str(size) + " bytes, " +
+                     str(self.download.missing) + " chunks missing.")
+        else:
+            self.log("Starting download of " + str(size) + " bytes.")
 
-    def d_done(self):
-        # TODO write data to file
-        # write(local_data)
-        # local_data.clear
-        pass
+        # An empty file, or one received before a restart, has no chunks left to wait for.
+        if self.download.is_complete():
+            self.finish_download()
+        else:
+            self.request_missing_chunks()
+
+    def d(self, transfer_id, index, crc, data):
+        """ Writes a chunk of the download straight to disk. """
+        if self.download is not None and self.download.transfer_id == transfer_id:
+            self.download.on_chunk(index, crc, data)
+
+    def d_done(self, transfer_id):
+        """ The AUV sent every requested chunk. Finishes the download or asks for what is missing. """
+        if self.download is None or self.download.transfer_id != transfer_id:
+            return
+
+        if not self.download.is_complete():
+            self.log("Download is missing " + str(self.download.missing) + " chunks, requesting them again.")
+            self.request_missing_chunks()
+            return
+
+        self.finish_download()
+
+    def finish_download(self):
+        """ Tells the AUV nothing is missing anymore, and saves the completed download. """
+        self.link.send(protocol.D_RESEND, *self.download.resend_request())
+        self.download.finish()
+        self.log("Downloaded " + str(self.download.size) + " bytes to " + self.download.path +
+                 " at " + str(round(self.download.rate(), 1)) + " bytes/sec.")
+        self.download = None
+
+    def request_missing_chunks(self):
+        """ Sends the AUV the list of chunks the current download is missing. """
+        self.link.send(protocol.D_RESEND, *self.download.resend_request())
+        self.log("Download rate: " + str(round(self.download.rate(), 1)) + " bytes/sec, " +
+                 str(self.download.missing) + " of " + str(self.download.chunk_count) + " chunks missing.")
 
     def download_data(self):
         """ Function calls download data function """
         if self.connected_to_auv is True:
-            self.radio.write(str.encode("d_data()\n"))
+            self.link.send(protocol.D_DATA)
             self.log("Sending download data command to AUV.")
         else:
             self.log("Cannot download data because there is no connection to the AUV.")
 
+    def query_timings(self):
+        """ Asks the AUV for the timing of its main loop, sensor reads and motor updates. """
+        if self.connected_to_auv is True:
+            self.link.send(protocol.TIMING_QUERY)
+            self.log("Sending timing query to AUV.")
+        else:
+            self.log("Cannot query timings because there is no connection to the AUV.")
+
+    def timing(self, count, p50, p99, maximum, name):
+        """ Logs the timing of a section of the AUV's code over the last minute. """
+        self.log("AUV timing of " + name.decode('utf-8', 'replace') + ": p50 " + str(p50 / 1000) + " ms, p99 " +
+                 str(p99 / 1000) + " ms, max " + str(maximum / 1000) + " ms (" + str(count) + " samples).")
+
     def log(self, message):
-        """ Logs the message to the GUI console by putting the function into the output-queue. """
-        self.out_q.put("log('" + message + "')")
+        """ Logs the message to the GUI console by putting a Log event into the output-queue. """
+        self.out_q.put(events.Log(message))
 
     def mission_started(self, index):
         """ When AUV sends mission started, switch to mission mode """
         if index == 0:  # Echo location mission.
             self.manual_mode = False
-            self.out_q.put("set_vehicle(False)")
+            self.out_q.put(events.SetVehicle(False))
             self.log("Switched to autonomous mode.")
 
         self.log("Successfully started mission " + str(index))
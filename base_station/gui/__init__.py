@@ -1,3 +1,4 @@
 #from base_station import BaseStation
 from .main import Main
-from .map import Map
\ No newline at end of file
+from .map import Map
+from . import events
@@ -0,0 +1,93 @@
+""" Typed events passed between the base station thread and the GUI thread.
+
+Events are put on the in/out queues as plain objects. Each consumer keeps a
+handler registry (a dictionary of event class -> handler) and dispatches on the
+event's class, so no strings are built, parsed or evaluated per update. """
+
+from dataclasses import dataclass
+
+
+# Events sent to the GUI (base station -> GUI).
+
+@dataclass
+class Log:
+    message: str
+
+
+@dataclass
+class SetHeading:
+    heading: float
+
+
+@dataclass
+class SetTemperature:
+    temperature: float
+
+
+@dataclass
+class SetConnection:
+    connected: bool
+
+
+@dataclass
+class SetVehicle:
+    manual: bool
+
+
+@dataclass
+class AddAuvCoordinates:
+    northing: float
+    easting: float
+    depth: float = float('nan')
+    heading: float = float('nan')
+
+
+@dataclass
+class UpdateBsCoordinates:
+    northing: float
+    easting: float
+
+
+# Events sent to the base station (GUI -> base station).
+
+@dataclass
+class TestMotor:
+    motor: str
+
+
+@dataclass
+class StartMission:
+    mission: int
+
+
+@dataclass
+class AbortMission:
+    pass
+
+
+@dataclass
+class DownloadData:
+    pass
+
+
+@dataclass
+class QueryTimings:
+    pass
+
+
+@dataclass
+class Close:
+    pass
+
+
+# State events, only the latest one of each class needs to be shown (see Main.check_tasks).
+COALESCED = (SetHeading, SetTemperature, SetConnection, SetVehicle, UpdateBsCoordinates)
+
+
+def dispatch(handlers, event):
+    """ Calls the handler registered for the class of event. Returns False if there is none. """
+    handler = handlers.get(type(event))
+    if handler is None:
+        return False
+    handler(event)
+    return True
@@ -19,9 +19,11 @@ from tkinter import Toplevel
 from tkinter import StringVar
 from tkinter import BOTH, TOP, BOTTOM, LEFT, RIGHT, YES, NO, SUNKEN, X, Y, W, E, N, S, DISABLED, NORMAL, END
 from tkinter import messagebox
+from tkinter import filedialog
 from tkinter.ttk import Combobox
 from tkinter import font
 from .map import Map
+from . import events
 from screeninfo import get_monitors, Enumerator
 
 # Begin Constants
@@ -85,7 +87,6 @@ class Main():
             pass
 
         #### Code below is to fix high resolution screen scaling. ###
->>>>>> > ff8ff7605ac4ae93024f34e9b0b1d920201f1a0b
         os_enumerator = None
         # https://stackoverflow.com/questions/446209/possible-values-from-sys-platform
         if "linux" in sys.platform:  # Linux designated as "linux"
@@ -127,8 +128,19 @@ class Main():
 
         # Begin defining instance variables
         self.root.title("YonderDeep AUV Interaction Terminal")
-        self.in_q = in_q  # Messages sent here from base_station.py thread
-        self.out_q = out_q  # Messages sent to base_station.py thread
+        self.in_q = in_q  # Events sent here from base_station.py thread
+        self.out_q = out_q  # Events sent to base_station.py thread
+
+        # Handlers of the events sent by the base station, indexed by event class.
+        self.handlers = {
+            events.Log: lambda event: self.log(event.message),
+            events.SetHeading: lambda event: self.set_heading(event.heading),
+            events.SetTemperature: lambda event: self.set_temperature(event.temperature),
+            events.SetConnection: lambda event: self.set_connection(event.connected),
+            events.SetVehicle: lambda event: self.set_vehicle(event.manual),
+            events.AddAuvCoordinates: lambda event: self.add_auv_coordinates(event.northing, event.easting, event.depth, event.heading),
+            events.UpdateBsCoordinates: lambda event: self.update_bs_coordinates(event.northing, event.easting),
+        }
 
         self.top_frame = Frame(self.root, bd=1)
         self.top_frame.pack(fill=BOTH, side=TOP,
@@ -162,10 +174,26 @@ class Main():
         self.root.mainloop()
 
     def check_tasks(self):
-        """ Evaluates the commands/tasks given to us in the in-queue. These commands are
-        passed as basic string objects. """
-        while (self.in_q.empty() is False):
-            eval("self." + self.in_q.get())
+        """ Handles the events given to us in the in-queue by the base station thread.
+        State updates are coalesced so only the latest heading, temperature, etc. is shown,
+        and new AUV positions are added to the map as one batch with a single redraw. """
+        latest = {}
+        positions = []
+
+        # Only handle the events queued so far, so a fast producer cannot stall the GUI.
+        for _ in range(self.in_q.qsize()):
+            event = self.in_q.get_nowait()
+            if isinstance(event, events.COALESCED):
+                latest[type(event)] = event
+            elif isinstance(event, events.AddAuvCoordinates):
+                positions.append((event.northing, event.easting, event.depth, event.heading))
+            elif not events.dispatch(self.handlers, event):
+                print("[GUI] Received unknown event: ", event)
+
+        for event in latest.values():
+            events.dispatch(self.handlers, event)
+        if positions:
+            self.map.add_auv_path(positions)
 
         self.root.after(REFRESH_TIME, self.check_tasks)
 
@@ -275,13 +303,14 @@ class Main():
         self.console.insert(END, time + string + "\n")
         self.console.config(state=DISABLED)
 
-    def add_auv_coordinates(self, northing, easting):
+    def add_auv_coordinates(self, northing, easting, depth=float('nan'), heading=float('nan')):
         """ Plots the AUV's current coordinates onto the map, given its UTM-relative northing and easting. """
-        self.map.add_auv_data(northing, easting)
+        self.map.add_auv_data(northing, easting, depth, heading)
 
     def update_bs_coordinates(self, northing, easting):
         """ Saves base stations current coordinates, updates label on the data panel """
         self.bs_coordinates = (northing, easting)
+        self.map.update_boat_position(northing, easting)
 
     def set_connection(self, status):
         """ Sets the connection status text in the status frame. """
@@ -328,7 +357,7 @@ class Main():
         self.forward_calibrate_button = Button(self.calibrate_frame, text="Forward", takefocus=False,  # width = 15, height = 3,
                                                padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(
                                                    FONT, BUTTON_SIZE),
-                                               command=lambda: self.out_q.put("test_motor('FORWARD')"))
+                                               command=lambda: self.out_q.put(events.TestMotor('FORWARD')))
 
         self.forward_calibrate_button.grid(
             row=4, column=1, pady=CALIBRATE_PAD_Y)
@@ -336,28 +365,28 @@ class Main():
         self.turn_calibrate_button = Button(self.calibrate_frame, text="Turn", takefocus=False,  # width = 15, height = 3,
                                             padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(
                                                 FONT, BUTTON_SIZE),
-                                            command=lambda: self.out_q.put("test_motor('TURN')"))
+                                            command=lambda: self.out_q.put(events.TestMotor('TURN')))
 
         self.turn_calibrate_button.grid(row=1, column=1, pady=CALIBRATE_PAD_Y)
 
         self.front_calibrate_button = Button(self.calibrate_frame, text="Front", takefocus=False,  # width = 15, height = 3,
                                              padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(
                                                  FONT, BUTTON_SIZE),
-                                             command=lambda: self.out_q.put("test_motor('FRONT')"))
+                                             command=lambda: self.out_q.put(events.TestMotor('FRONT')))
 
         self.front_calibrate_button.grid(row=2, column=1, pady=CALIBRATE_PAD_Y)
 
         self.calibrate_all_button = Button(self.calibrate_frame, text="All", takefocus=False,  # width = 15, height = 3,
                                            padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(
                                                FONT, BUTTON_SIZE),
-                                           command=lambda: self.out_q.put("test_motor('ALL')"))
+                                           command=lambda: self.out_q.put(events.TestMotor('ALL')))
 
         self.calibrate_all_button.grid(row=5, column=1, pady=CALIBRATE_PAD_Y)
 
         self.back_calibrate_button = Button(self.calibrate_frame, text="Back", takefocus=False,  # width = 15, height = 3,
                                             padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(
                                                 FONT, BUTTON_SIZE),
-                                            command=lambda: self.out_q.put("test_motor('BACK')"))
+                                            command=lambda: self.out_q.put(events.TestMotor('BACK')))
 
         self.back_calibrate_button.grid(row=3, column=1, pady=CALIBRATE_PAD_Y)
 
@@ -400,14 +429,13 @@ class Main():
             prompt = "Start mission: " + mission + "?"
             ans = messagebox.askquestion("Mission Select", prompt)
             if ans == 'yes':  # Send index of mission (0, 1, 2, etc...)
-                self.out_q.put(
-                    "start_mission(" + str(self.mission_list.current()) + ")")
+                self.out_q.put(events.StartMission(self.mission_list.current()))
 
     def abort_mission(self):
         ans = messagebox.askquestion(
             "Abort Misssion", "Are you sure you want to abort the mission?")
         if ans == 'yes':
-            self.out_q.put("abort_mission()")
+            self.out_q.put(events.AbortMission())
 
     def calibrate_origin_on_map(self):
         """ Calibrates the origin on the map to the base stations coordinates """
@@ -419,22 +447,34 @@ class Main():
         else:
             self.log("Cannot calibrate origin because the base station has not reported GPS data.")
 
+    def import_waypoints(self):
+        """ Asks for a survey plan (CSV of "label, utm x, utm y" rows) and adds its waypoints to the map. """
+        path = filedialog.askopenfilename(title="Import Waypoints", filetypes=[("Survey plan", "*.csv"), ("All files", "*")])
+        if path:
+            self.map.import_waypoints(path)
+
     def create_function_buttons(self):
         self.origin_button = Button(self.functions_frame, text="Calibrate Origin", takefocus=False, width=BUTTON_WIDTH, height=BUTTON_HEIGHT,
                                     padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(FONT, BUTTON_SIZE), command=self.calibrate_origin_on_map)
         self.add_waypoint_button = Button(self.functions_frame, text="Add Waypoint", takefocus=False, width=BUTTON_WIDTH, height=BUTTON_HEIGHT,
                                           padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(FONT, BUTTON_SIZE), command=self.map.new_waypoint_prompt)
+        self.import_waypoints_button = Button(self.functions_frame, text="Import Waypoints", takefocus=False, width=BUTTON_WIDTH, height=BUTTON_HEIGHT,
+                                              padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(FONT, BUTTON_SIZE), command=self.import_waypoints)
         self.nav_to_waypoint_button = Button(self.functions_frame, text="Nav. to Waypoint", takefocus=False, width=BUTTON_WIDTH, height=BUTTON_HEIGHT,
                                              padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(FONT, BUTTON_SIZE), command=lambda: None)
         self.download_data_button = Button(self.functions_frame, text="Download Data", takefocus=False, width=BUTTON_WIDTH, height=BUTTON_HEIGHT,
-                                           padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(FONT, BUTTON_SIZE), command=lambda: self.out_q.put("download_data()"))
+                                           padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(FONT, BUTTON_SIZE), command=lambda: self.out_q.put(events.DownloadData()))
+        self.timings_button = Button(self.functions_frame, text="AUV Timings", takefocus=False, width=BUTTON_WIDTH, height=BUTTON_HEIGHT,
+                                     padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(FONT, BUTTON_SIZE), command=lambda: self.out_q.put(events.QueryTimings()))
         self.clear_button = Button(self.functions_frame, text="Clear Map", takefocus=False, width=BUTTON_WIDTH, height=BUTTON_HEIGHT,
                                    padx=BUTTON_PAD_X, pady=BUTTON_PAD_Y, font=(FONT, BUTTON_SIZE), command=self.map.clear)
 
         self.origin_button.pack(expand=YES)
         self.add_waypoint_button.pack(expand=YES)
+        self.import_waypoints_button.pack(expand=YES)
         self.nav_to_waypoint_button.pack(expand=YES)
         self.download_data_button.pack(expand=YES)
+        self.timings_button.pack(expand=YES)
         self.clear_button.pack(expand=YES)
 
     def create_map(self, frame):
@@ -449,6 +489,6 @@ class Main():
 
     def on_closing(self):
         #    self.map.on_close()
-        self.out_q.put("close()")  # TODO
+        self.out_q.put(events.Close())
         self.root.destroy()
         sys.exit()
@@ -5,6 +5,8 @@ from matplotlib.pyplot import scatter
 from matplotlib.lines import Line2D
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from .track import TrackStore
+from .waypoints import WaypointStore, read_survey
 import matplotlib
 import matplotlib.axes
 matplotlib.use('TkAgg')
@@ -24,6 +26,7 @@ MILES = "Miles (mi)"
 BACKGROUND_COLOR = 'darkturquoise'
 AUV_PATH_COLOR = 'red'
 WAYPOINT_COLOR = 'red'
+BOAT_COLOR = 'navy'
 MINOR_TICK_COLOR = 'black'
 
 # Conversion Multiplier Constants
@@ -34,6 +37,9 @@ M_TO_MI = 0000.000621371
 MI_TO_KM = 0001.609340000
 M_TO_KM = 0000.001000000
 
+# Length of one map unit, in meters.
+METERS_PER_UNIT = {METERS: 1.0, KILOMETERS: KM_TO_M, MILES: MI_TO_M}
+
 # Other Debug Constants
 ZOOM_SCALAR = 1.15
 CLOSE_ENOUGH = 0.25
@@ -56,25 +62,41 @@ class Map:
         self.window = window
         self.main = main
 
-        # Initialize object data/information
-        self.waypoints = list()
+        # Initialize object data/information. Waypoints and the AUV track are stored in meters
+        # from the origin, and only scaled to the map's units when they are drawn.
+        self.waypoints = WaypointStore()
+        self.waypoint_labels = {}  # Annotation artist of each waypoint.
         self.units = METERS
         self.size = DEFAULT_GRID_SIZE
         self.zero_offset_x = 0
         self.zero_offset_y = 0
         # Used to move the map whenever the boat moves.
         self.old_position = 0
+        self.boat_position = None  # UTM coordinates of the base station.
         self.press_position = [0, 0]
         self.mouse_pressing = False
         self.legend_obj = None
-        self.auv_path_obj = None
-        self.auv_data = [list(), list()]
+        self.auv_track = TrackStore()
+
+        # Cached map image without the newest path points, used to blit only what changed.
+        self.background = None
+        self.drawn_points = 0  # Number of path points included in the background.
 
         # Inialize the Tk-compatible Figure, the map, and the canvas
         self.fig = self.init_fig()
         self.map = self.init_map()
         self.canvas = self.init_canvas()
 
+        # The whole path is one persistent line, the points added since the last full
+        # draw are drawn on top of the cached background by the animated tail line.
+        self.auv_path_obj = self.map.plot([], [], label="AUV Path", color=AUV_PATH_COLOR)[0]
+        self.auv_tail_obj = self.map.plot([], [], color=AUV_PATH_COLOR, animated=True)[0]
+
+        # All waypoint markers are drawn by a single line without segments.
+        self.waypoint_obj = self.map.plot([], [], linestyle='', marker='o', markersize=5, color=WAYPOINT_COLOR)[0]
+        self.boat_obj = self.map.plot([], [], linestyle='', marker='^', markersize=8, color=BOAT_COLOR)[0]
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+
         # Start listening for mouse-clicks
         self.fig.canvas.mpl_connect('button_press_event',   self.on_press)
         self.fig.canvas.mpl_connect('button_release_event', self.on_release)
@@ -117,30 +139,20 @@ class Map:
 
     def clear_auv_path(self):
         """ Clears the AUV path """
-        if self.auv_path_obj is not None and self.auv_path_obj.pop(0) is not None:
-            self.auv_path_obj.pop(0).remove()
-
-        self.auv_data[0].clear()  # clear all x values
-        self.auv_data[1].clear()  # clear all y values
+        self.auv_track.clear()
+        self.auv_tail_obj.set_data([], [])
 
     def undraw_waypoints(self):
         """ Clears waypoints from the map """
-        for waypoint in self.waypoints:
-            # Remove waypoint from map.
-            if waypoint[3] != None and type(waypoint[3]) != tuple:
-                waypoint[3].pop(0).remove()
-                waypoint[3] = None
-
-            if waypoint[4] != None:
-                waypoint[4].remove()
-                waypoint[4] = None
-
-        self.draw_canvas()
+        for label in self.waypoint_labels.values():
+            label.remove()
+        self.waypoint_labels.clear()
+        self.waypoint_obj.set_data([], [])
 
     def clear_waypoints(self):
         """ Clears and removes waypoints """
         self.undraw_waypoints()
-        del self.waypoints[:]
+        self.waypoints.clear()
 
     def zero_map(self, x=0, y=0):
         """ Sets the origin of our coordinate system to (x,y) in UTM northing/eastings values"""
@@ -149,25 +161,18 @@ class Map:
         delta_x = self.zero_offset_x - x  # oldX - newX = adjustment
         delta_y = self.zero_offset_y - y  # oldY - newY = adjustment
 
-        for waypoint in self.waypoints:  # Move waypoints based on our new Origin
-            waypoint[0] += delta_x
-            waypoint[1] += delta_y
+        self.waypoints.transform(dx=delta_x, dy=delta_y)  # Move waypoints based on our new Origin
 
-        for i in range(0, len(self.auv_data[0])):  # Move all auv_data based on our new Origin
-            self.auv_data[0][i] += delta_x
-            self.auv_data[1][i] += delta_y
+        self.auv_track.transform(dx=delta_x, dy=delta_y)  # Move the auv track based on our new Origin
 
         # Actually update our new origin.
         self.zero_offset_x = x
         self.zero_offset_y = y
 
-        # Redraw waypoints based on new origin.
-        if len(self.waypoints) > 0:
-            self.redraw_waypoints()
-
-        # Redraw auv-path based on new origin
-        if len(self.auv_data[0]) > 0 and len(self.auv_data[1]) > 0:
-            self.draw_auv_path()
+        # Redraw waypoints, auv-path and boat based on new origin, at once.
+        self.move_waypoints()
+        self.place_boat()
+        self.draw_canvas()
 
         print("[MAP] Updated origin to UTM coordinates (" + str(x) + ", " + str(y) + ").")
 
@@ -187,16 +192,42 @@ class Map:
         """ Undraws waypoint and redraws a waypoint """
         self.undraw_waypoints()
         for waypoint in self.waypoints:
-            # Draw waypoint again.
-            waypoint[3] = self.map.plot(
-                waypoint[0], waypoint[1], marker='o', markersize=5, color="red"),
-            waypoint[4] = self.map.annotate(xy=(waypoint[0], waypoint[1]), s=waypoint[2] + ", UTM: (" +
-                                            str(round(waypoint[0]+self.zero_offset_x, 5))+","+str(round(waypoint[1]+self.zero_offset_y, 5))+")")
+            self.annotate_waypoint(waypoint)
+        self.update_waypoint_markers()
 
         # Redraw canvas.
         self.draw_canvas()
         print("[MAP] Waypoints Redrawn!")
 
+    def unit_scale(self):
+        """ Returns the length of a meter in the current map units. """
+        return 1.0 / METERS_PER_UNIT[self.units]
+
+    def waypoint_text(self, waypoint):
+        """ Returns the label text of a waypoint. """
+        return (waypoint.label + ", UTM: (" + str(round(waypoint.x+self.zero_offset_x, 5)) + "," +
+                str(round(waypoint.y+self.zero_offset_y, 5)) + ")")
+
+    def annotate_waypoint(self, waypoint):
+        """ Adds the label of a waypoint to the map, without redrawing it. """
+        scale = self.unit_scale()
+        self.waypoint_labels[waypoint] = self.map.annotate(xy=(waypoint.x * scale, waypoint.y * scale),
+                                                           text=self.waypoint_text(waypoint))
+
+    def update_waypoint_markers(self):
+        """ Moves the waypoint markers to the stored waypoints, without redrawing the map. """
+        positions = self.waypoints.positions() * self.unit_scale()
+        self.waypoint_obj.set_data(positions[:, 0], positions[:, 1])
+
+    def move_waypoints(self):
+        """ Moves the existing waypoint markers and labels to the stored waypoints, e.g. after a
+        change of units or origin, without recreating the labels or redrawing the map. """
+        self.update_waypoint_markers()
+        scale = self.unit_scale()
+        for waypoint, label in self.waypoint_labels.items():
+            label.xy = (waypoint.x * scale, waypoint.y * scale)
+            label.set_text(self.waypoint_text(waypoint))
+
     def on_press(self, mouse):
         """ Gets the (x,y) position of map on click """
         self.press_position = [mouse.xdata, mouse.ydata]
@@ -218,7 +249,18 @@ class Map:
             self.try_remove_waypoint(mouse.xdata, mouse.ydata)
 
     def update_boat_position(self, x=0, y=0):
-        return
+        """ Moves the base station's (boat's) marker to its position, given in UTM coordinates.
+        The map is redrawn once Tk is idle, so positions arriving together cost a single draw. """
+        self.boat_position = (x, y)
+        self.place_boat()
+        self.canvas.draw_idle()
+
+    def place_boat(self):
+        """ Moves the boat marker to the boat's position relative to the origin, without redrawing the map. """
+        if self.boat_position is not None:
+            scale = self.unit_scale()
+            self.boat_obj.set_data([(self.boat_position[0] - self.zero_offset_x) * scale],
+                                   [(self.boat_position[1] - self.zero_offset_y) * scale])
 
     def try_remove_waypoint(self, x=0, y=0):
         close = CLOSE_ENOUGH * (self.size / DEFAULT_GRID_SIZE)
@@ -226,13 +268,10 @@ class Map:
         if self.units == METERS:
             close += 100
 
-        for waypoint in self.waypoints:
-            # Close enough on x-axis.
-            if x - close < waypoint[0] and x + close > waypoint[0]:
-                # Close enough on y-axis.
-                if y - close < waypoint[1] and y + close > waypoint[1]:
-                    self.remove_waypoint_prompt(waypoint)
-                    return
+        scale = self.unit_scale()
+        waypoint = self.waypoints.nearest(x / scale, y / scale, close / scale)
+        if waypoint is not None:
+            self.remove_waypoint_prompt(waypoint)
 
     def remove_waypoint_prompt(self, waypoint):
         print("[MAP] Opening remove-waypoint prompt.")
@@ -243,9 +282,9 @@ class Map:
                      self.main.root.winfo_height()) / 2.5)
         prompt_window.geometry("+%d+%d" % (center_x, center_y))
         prompt_window.resizable(False, False)
-        prompt_window.title("Remove Waypoint \"" + str(waypoint[2]) + "\"?")
+        prompt_window.title("Remove Waypoint \"" + str(waypoint.label) + "\"?")
         prompt_window.wm_attributes('-topmost')
-        prompt_submit = Button(prompt_window, text="Yes, I want to remove waypoint \""+str(waypoint[2])+"\"", font=(FONT, FONT_SIZE),
+        prompt_submit = Button(prompt_window, text="Yes, I want to remove waypoint \""+str(waypoint.label)+"\"", font=(FONT, FONT_SIZE),
                                command=lambda:
                                [
             self.confirm_remove_waypoint(waypoint),
@@ -257,10 +296,10 @@ class Map:
 
     def confirm_remove_waypoint(self, waypoint):
         self.waypoints.remove(waypoint)
-        waypoint[3].pop(0).remove()
-        waypoint[4].remove()
+        self.waypoint_labels.pop(waypoint).remove()
+        self.update_waypoint_markers()
         self.draw_canvas()
-        self.main.log("Waypoint \"" + waypoint[2] + "\" removed!")
+        self.main.log("Waypoint \"" + waypoint.label + "\" removed!")
         return
 
     def new_waypoint_prompt(self, x=0, y=0):
@@ -303,27 +342,59 @@ class Map:
  #       prompt_window.mainloop();
         print("[MAP] returning from waypoint mainloop")
 
-    def add_auv_data(self, x=0, y=0):
+    def add_auv_data(self, x=0, y=0, depth=float('nan'), heading=float('nan')):
+        """ Adds an AUV position, given in UTM coordinates, to the path. """
         self.main.log("Adding AUV data at: ("+str(x)+", "+str(y)+").")
-        self.auv_data[0].append(x)
-        self.auv_data[1].append(y)
+        self.auv_track.append(x - self.zero_offset_x, y - self.zero_offset_y, depth, heading)
+        self.draw_auv_path()
+
+    def add_auv_path(self, points):
+        """ Adds a batch of (x, y, depth, heading) AUV positions, given in UTM coordinates, to the path,
+        redrawing the map once. """
+        self.main.log("Adding " + str(len(points)) + " AUV data points, last at: (" +
+                      str(points[-1][0]) + ", " + str(points[-1][1]) + ").")
+        self.auv_track.extend([(x - self.zero_offset_x, y - self.zero_offset_y, depth, heading)
+                               for x, y, depth, heading in points])
         self.draw_auv_path()
 
     def draw_auv_path(self):
-        print("[MAP] Drawing (really re-drawing) AUV path.")
+        """ Draws the path points added since the last draw on top of the cached background,
+        so the cost of a new point does not grow with the length of the path. """
+        if self.background is None:  # Nothing cached yet.
+            self.draw_canvas()
+            return
 
-        # Completely delete the previous line, if it exists.
-        if self.auv_path_obj != None:
-            self.auv_path_obj.pop(0).remove()
+        # Start the tail at the last drawn point, so it connects to the rest of the path.
+        start = max(0, self.drawn_points - 1)
+        scale = self.unit_scale()
+        self.auv_tail_obj.set_data(self.auv_track.x[start:] * scale, self.auv_track.y[start:] * scale)
 
-        # Re-draw the entire line using the newly updated x-values (auv_data[0]) and y-values (auv_data[1])
-        self.auv_path_obj = self.map.plot(
-            self.auv_data[0]+self.zero_offset_x, self.auv_data[1]+self.zero_offset_y, label="AUV Path", color=AUV_PATH_COLOR)
+        self.canvas.restore_region(self.background)
+        self.map.draw_artist(self.auv_tail_obj)
+        self.canvas.blit(self.map.bbox)
 
-        # Re-draw the canvas.
-        self.draw_canvas()
+        # The new points are now part of the background.
+        self.background = self.canvas.copy_from_bbox(self.map.bbox)
+        self.drawn_points = len(self.auv_track)
+
+    def on_draw(self, event):
+        """ Caches the fully drawn map as the background of incremental path updates. """
+        self.background = self.canvas.copy_from_bbox(self.map.bbox)
+        self.drawn_points = len(self.auv_track)
+
+    def pixel_size(self):
+        """ Returns the size of a screen pixel in map units. """
+        width = self.map.bbox.width
+        xlim = self.map.get_xlim()
+        return abs(xlim[1] - xlim[0]) / width if width > 0 else 0
 
     def draw_canvas(self):
+        """ Fully redraws the map, including the whole AUV path simplified for the current view. """
+        scale = self.unit_scale()
+        x, y = self.auv_track.simplified(tuple(limit / scale for limit in self.map.get_xlim()),
+                                         tuple(limit / scale for limit in self.map.get_ylim()), self.pixel_size() / scale)
+        self.auv_path_obj.set_data(x * scale, y * scale)
+        self.auv_tail_obj.set_data([], [])
         return self.canvas.draw()
 
     def init_canvas(self):
@@ -377,22 +448,32 @@ class Map:
         return graph
 
     def add_waypoint(self, x=0, y=0, label="My Waypoint"):
+        """ Adds a waypoint at a map-position, in the current map units. """
+        scale = self.unit_scale()
         self.main.log("Added waypoint \"" + label + "\" at map-position (" + str(int(x)) + ", " + str(int(y)) + ") " +
-                      "with utm-coordinates (" + str(int(float(x)+self.zero_offset_x)) + ", " + str(int(float(y)+self.zero_offset_y)) + ").")
+                      "with utm-coordinates (" + str(int(float(x) / scale + self.zero_offset_x)) + ", " +
+                      str(int(float(y) / scale + self.zero_offset_y)) + ").")
 
         # The code below should never fail (that would be a big problem).
-        self.waypoints.append([
-            x, y,
-            label,
-            self.map.plot(x, y, marker='o', markersize=5,
-                          color=WAYPOINT_COLOR, label=label),
-            self.map.annotate(xy=(x, y), text=label + ", UTM: ("+str(round(float(
-                x)+self.zero_offset_x, 5))+","+str(round(float(y)+self.zero_offset_y, 5))+")")
-        ])
+        self.annotate_waypoint(self.waypoints.add(float(x) / scale, float(y) / scale, label))
+        self.update_waypoint_markers()
 
         self.draw_canvas()
         return [x, y]
 
+    def add_waypoints(self, waypoints):
+        """ Adds a sequence of (x, y, label) waypoints, in meters from the origin, redrawing the map once. """
+        for waypoint in self.waypoints.extend(waypoints):
+            self.annotate_waypoint(waypoint)
+        self.update_waypoint_markers()
+        self.draw_canvas()
+
+    def import_waypoints(self, path):
+        """ Adds the waypoints of a survey plan, a CSV file of "label, utm x, utm y" rows. """
+        waypoints = [(x - self.zero_offset_x, y - self.zero_offset_y, label) for x, y, label in read_survey(path)]
+        self.add_waypoints(waypoints)
+        self.main.log("Imported " + str(len(waypoints)) + " waypoints from " + path + ".")
+
     def zoom_out(self):
         print("[MAP] Zooming out.")
         xlim = self.map.get_xlim()
@@ -417,40 +498,19 @@ class Map:
 
     def set_units(self, unit=METERS):
         print("[MAP] Changing units from " + self.units + " to " + unit)
-        multiplier = 1
-
-        # Convert KM -> M
-        if unit == METERS and self.units == KILOMETERS:
-            multiplier = KM_TO_M
-
-        # Convert MI -> M
-        if unit == METERS and self.units == MILES:
-            multiplier = MI_TO_M
-
-        # Convert KM -> MI
-        if unit == MILES and self.units == KILOMETERS:
-            multiplier = KM_TO_MI
-
-        # Convert M -> MI
-        if unit == MILES and self.units == METERS:
-            multiplier = M_TO_MI
-
-        # Convert MI -> KM
-        if unit == KILOMETERS and self.units == MILES:
-            multiplier = MI_TO_KM
+        multiplier = METERS_PER_UNIT[self.units] / METERS_PER_UNIT[unit]
+        self.units = unit
 
-        # Convert M -> KM
-        if unit == KILOMETERS and self.units == METERS:
-            multiplier = M_TO_KM
+        # Waypoints and the track stay in meters, only their artists and the view are scaled. Redraw once.
+        self.move_waypoints()
+        self.place_boat()
 
-        # Apply conversion
-        for waypoint in self.waypoints:
-            waypoint[0] *= multiplier
-            waypoint[1] *= multiplier
+        xlim = self.map.get_xlim()
+        ylim = self.map.get_ylim()
+        self.map.set_xlim(xlim[0]*multiplier, xlim[1]*multiplier)
+        self.map.set_ylim(ylim[0]*multiplier, ylim[1]*multiplier)
 
         self.size *= multiplier
-        self.units = unit
-        self.set_range(x=self.size, y=self.size)
         self.draw_canvas()
 
     def on_close(self):
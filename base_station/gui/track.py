@@ -0,0 +1,184 @@
+""" NumPy-backed storage of the AUV's track, with view-dependent simplification for drawing. """
+import time
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+# Rows of the track array. The map's x axis is northing and its y axis easting (see Map.zero_map).
+FIELDS = ('time', 'easting', 'northing', 'depth', 'heading')
+TIME, EASTING, NORTHING, DEPTH, HEADING = range(len(FIELDS))
+
+
+def simplify(x, y, tolerance):
+    """ Returns the indices of the points kept by the Douglas-Peucker algorithm, so no
+    dropped point lies further than tolerance from the simplified polyline. """
+    count = len(x)
+    if count < 3:
+        return np.arange(count)
+
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        # Distance of every point between first and last to the segment joining them.
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distance = np.hypot(px, py)
+        else:
+            distance = np.abs(px * dy - py * dx) / length
+
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return np.flatnonzero(keep)
+
+
+class TrackStore:
+    """ Growable arrays of track points (time, easting, northing, depth, heading), one row
+    per field. Capacity doubles when full, so appending is amortized constant time. Drawing
+    uses simplified(), whose cost depends on the number of pixels the track covers on screen
+    rather than its number of points. """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.data = np.empty((len(FIELDS), capacity))
+        self.count = 0
+        self.cache_key = None
+        self.cache = None
+
+    def __len__(self):
+        return self.count
+
+    def field(self, row):
+        """ Returns a view of one field of every point. """
+        return self.data[row, :self.count]
+
+    @property
+    def time(self):
+        return self.field(TIME)
+
+    @property
+    def easting(self):
+        return self.field(EASTING)
+
+    @property
+    def northing(self):
+        return self.field(NORTHING)
+
+    @property
+    def depth(self):
+        return self.field(DEPTH)
+
+    @property
+    def heading(self):
+        return self.field(HEADING)
+
+    # Map coordinates.
+    x = northing
+    y = easting
+
+    def reserve(self, count):
+        """ Grows the arrays (at least doubling them) so they hold count points. """
+        capacity = self.data.shape[1]
+        if count > capacity:
+            data = np.empty((len(FIELDS), max(count, capacity * 2)))
+            data[:, :self.count] = self.data[:, :self.count]
+            self.data = data
+
+    def append(self, x, y, depth=np.nan, heading=np.nan, timestamp=None):
+        """ Adds a point, given in map coordinates, to the end of the track. The time defaults to now. """
+        self.reserve(self.count + 1)
+        self.data[:, self.count] = (time.time() if timestamp is None else timestamp, y, x, depth, heading)
+        self.count += 1
+
+    def extend(self, points, timestamp=None):
+        """ Adds a sequence of (x, y) or (x, y, depth, heading) points, in map coordinates, to
+        the end of the track. The time of every point defaults to now. """
+        points = np.asarray(points, dtype=float)
+        points = points.reshape(-1, points.shape[-1] if points.size else 2)
+        count = len(points)
+        self.reserve(self.count + count)
+
+        new = self.data[:, self.count:self.count + count]
+        new[TIME] = time.time() if timestamp is None else timestamp
+        new[NORTHING] = points[:, 0]
+        new[EASTING] = points[:, 1]
+        new[DEPTH] = points[:, 2] if points.shape[1] > 2 else np.nan
+        new[HEADING] = points[:, 3] if points.shape[1] > 3 else np.nan
+        self.count += count
+
+    def clear(self):
+        """ Removes every point. """
+        self.count = 0
+        self.cache_key = None
+
+    def transform(self, dx=0.0, dy=0.0):
+        """ Moves every point to (x + dx, y + dy) in one array operation, e.g. after a change of origin. """
+        self.data[NORTHING, :self.count] += dx
+        self.data[EASTING, :self.count] += dy
+        self.cache_key = None
+
+    def nbytes(self):
+        """ Returns the memory used by the stored points, in bytes. """
+        return self.data[:, :self.count].nbytes
+
+    def simplified(self, xlim, ylim, tolerance):
+        """ Returns the (x, y) arrays of the track simplified for a view. Segments outside of
+        the view are left out (separated by NaN), and the remaining points are thinned to one
+        per tolerance (the size of a pixel) and simplified with Douglas-Peucker. """
+        key = (self.count, tuple(xlim), tuple(ylim), tolerance)
+        if key == self.cache_key:
+            return self.cache
+
+        x, y = self.x, self.y
+        if self.count < 2:
+            self.cache_key, self.cache = key, (x.copy(), y.copy())
+            return self.cache
+
+        # Keep the points of every segment whose bounding box overlaps the view.
+        x0, x1 = min(xlim), max(xlim)
+        y0, y1 = min(ylim), max(ylim)
+        visible = ~((np.maximum(x[:-1], x[1:]) < x0) | (np.minimum(x[:-1], x[1:]) > x1) |
+                    (np.maximum(y[:-1], y[1:]) < y0) | (np.minimum(y[:-1], y[1:]) > y1))
+        keep = np.zeros(self.count, dtype=bool)
+        keep[:-1] |= visible
+        keep[1:] |= visible
+        indices = np.flatnonzero(keep)
+
+        # Split into runs of consecutive points, which are simplified separately.
+        runs = np.split(indices, np.flatnonzero(np.diff(indices) > 1) + 1)
+        xs, ys = [], []
+        for run in runs:
+            if len(run) == 0:
+                continue
+            rx, ry = x[run], y[run]
+
+            # Drop consecutive points that fall into the same pixel.
+            if tolerance > 0 and len(run) > 2:
+                cells = np.floor(np.stack((rx, ry)) / tolerance)
+                moved = np.any(cells[:, 1:] != cells[:, :-1], axis=0)
+                moved[-1] = True  # Always keep the last point.
+                selected = np.concatenate(([True], moved))
+                rx, ry = rx[selected], ry[selected]
+
+            selected = simplify(rx, ry, tolerance)
+            xs.extend((rx[selected], [np.nan]))
+            ys.extend((ry[selected], [np.nan]))
+
+        if xs:
+            result = (np.concatenate(xs[:-1]), np.concatenate(ys[:-1]))
+        else:
+            result = (np.empty(0), np.empty(0))
+        self.cache_key, self.cache = key, result
+        return result
@@ -0,0 +1,150 @@
+""" Waypoint records and a grid-indexed store for finding the waypoint nearest to a click. """
+import csv
+import math
+
+import numpy as np
+
+DEFAULT_CELL_SIZE = 100  # Grid cell size in map units.
+INITIAL_CAPACITY = 64
+
+
+class Waypoint:
+    """ A named position on the map, independent of how it is drawn. Its coordinates are a
+    row of the store's array, so the store can move every waypoint at once. """
+
+    __slots__ = ('store', 'row', 'label')
+
+    def __init__(self, store, row, label):
+        self.store = store
+        self.row = row
+        self.label = label
+
+    @property
+    def x(self):
+        return float(self.store.coordinates[self.row, 0])
+
+    @property
+    def y(self):
+        return float(self.store.coordinates[self.row, 1])
+
+
+class WaypointStore:
+    """ Keeps the waypoint coordinates in one array, in insertion order, plus a uniform grid
+    of the waypoints so nearest-waypoint queries only look at the cells around the query point. """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        """
+        cell_size: Grid cell size in map units. Queries are fastest when it is about the query radius.
+        """
+        self.cell_size = cell_size
+        self.coordinates = np.empty((INITIAL_CAPACITY, 2))
+        self.waypoints = []  # Waypoint of each row of coordinates.
+        self.grid = None  # Rebuilt by the first query after the waypoints move.
+
+    def __len__(self):
+        return len(self.waypoints)
+
+    def __iter__(self):
+        return iter(self.waypoints)
+
+    def positions(self):
+        """ Returns an (n, 2) view of the (x, y) coordinates of every waypoint. """
+        return self.coordinates[:len(self.waypoints)]
+
+    def cell(self, x, y):
+        """ Returns the grid cell holding (x, y). """
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def index(self, waypoint):
+        """ Adds a waypoint to its grid cell, if the grid is built. """
+        if self.grid is not None:
+            self.grid.setdefault(self.cell(waypoint.x, waypoint.y), []).append(waypoint)
+
+    def reserve(self, count):
+        """ Grows the coordinate array (at least doubling it) so it holds count waypoints. """
+        capacity = len(self.coordinates)
+        if count > capacity:
+            coordinates = np.empty((max(count, capacity * 2), 2))
+            coordinates[:len(self.waypoints)] = self.positions()
+            self.coordinates = coordinates
+
+    def add(self, x, y, label):
+        """ Adds and returns a new waypoint. """
+        return self.extend([(x, y, label)])[0]
+
+    def extend(self, waypoints):
+        """ Adds a sequence of (x, y, label) waypoints. Returns the new Waypoint records. """
+        waypoints = list(waypoints)
+        first = len(self.waypoints)
+        self.reserve(first + len(waypoints))
+        added = []
+        for row, (x, y, label) in enumerate(waypoints, first):
+            self.coordinates[row] = (x, y)
+            added.append(Waypoint(self, row, label))
+        self.waypoints.extend(added)
+        for waypoint in added:
+            self.index(waypoint)
+        return added
+
+    def remove(self, waypoint):
+        """ Removes a waypoint, keeping the others in order. """
+        if self.grid is not None:
+            self.grid[self.cell(waypoint.x, waypoint.y)].remove(waypoint)
+        row = waypoint.row
+        count = len(self.waypoints)
+        self.coordinates[row:count - 1] = self.coordinates[row + 1:count]
+        del self.waypoints[row]
+        for moved in self.waypoints[row:]:
+            moved.row -= 1
+
+    def clear(self):
+        """ Removes every waypoint. """
+        self.waypoints.clear()
+        self.grid = None
+
+    def build_grid(self):
+        """ Sorts every waypoint into the grid cell of its coordinates. """
+        self.grid = {}
+        cells = np.floor(self.positions() / self.cell_size).astype(int).tolist()
+        for cell, waypoint in zip(cells, self.waypoints):
+            self.grid.setdefault(tuple(cell), []).append(waypoint)
+
+    def nearest(self, x, y, radius):
+        """ Returns the waypoint closest to (x, y) within radius, or None. """
+        if self.grid is None:
+            self.build_grid()
+
+        reach = int(math.ceil(radius / self.cell_size))
+        cell_x, cell_y = self.cell(x, y)
+        closest = None
+        closest_distance = radius
+        for i in range(cell_x - reach, cell_x + reach + 1):
+            for j in range(cell_y - reach, cell_y + reach + 1):
+                for waypoint in self.grid.get((i, j), ()):
+                    distance = math.hypot(waypoint.x - x, waypoint.y - y)
+                    if distance <= closest_distance:
+                        closest = waypoint
+                        closest_distance = distance
+        return closest
+
+    def transform(self, dx=0.0, dy=0.0):
+        """ Moves every waypoint to (x + dx, y + dy) in one array operation, e.g. after a change
+        of origin. The grid is rebuilt by the next query. """
+        positions = self.positions()
+        positions += (dx, dy)
+        self.grid = None
+
+
+def read_survey(path):
+    """ Returns the (x, y, label) waypoints of a survey plan, a CSV file of "label, x, y" rows.
+    Rows that do not hold two numbers (e.g. a header) are skipped. """
+    waypoints = []
+    with open(path, newline='') as survey:
+        for row in csv.reader(survey):
+            if len(row) < 3:
+                continue
+            try:
+                waypoints.append((float(row[1]), float(row[2]), row[0].strip()))
+            except ValueError:
+                continue
+    return waypoints
@@ -0,0 +1,161 @@
+"""
+Measures the latency of GPS fixes from gpsd to the map, offline.
+
+A fake gpsd (see fake_gpsd.py) replays a log, or a synthetic track, to the GPS reader. The
+base station's loop publishes the fixes it sees and the GUI's loop draws them with
+Map.update_boat_position, each at its real period. Reports the latency of every stage:
+
+    python3 bench_gps.py --log track.nmea --speed 10
+    python3 bench_gps.py --rate 10 --duration 20
+"""
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+from queue import Queue
+
+# Add parent directory to active path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tkinter import Tk
+from api import GPS
+from base_station import BaseStation, THREAD_SLEEP_DELAY
+from gui import Map
+from gui import events
+from gui.main import REFRESH_TIME
+from fake_gpsd import FakeGpsd, read_log
+
+ORIGIN = (32.7157, -117.1611)  # Center of the synthetic track.
+TRACK_RADIUS = 100.0  # Meters.
+METERS_PER_DEGREE = 111320.0
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, p):
+    """ Returns the p-th percentile (nearest rank) of a list of values. """
+    ordered = sorted(values)
+    rank = max(0, int(round(p / 100.0 * len(ordered) + 0.5)) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def synthetic_track(rate, duration):
+    """ Returns (seconds, TPV report) entries of a boat circling ORIGIN, rate times per second. """
+    reports = []
+    for i in range(int(rate * duration)):
+        angle = i / (rate * 60.0) * 2 * math.pi  # One lap per minute.
+        latitude = ORIGIN[0] + TRACK_RADIUS * math.sin(angle) / METERS_PER_DEGREE
+        longitude = ORIGIN[1] + TRACK_RADIUS * math.cos(angle) / (METERS_PER_DEGREE * math.cos(math.radians(ORIGIN[0])))
+        reports.append((i / rate, {'class': 'TPV', 'mode': 3, 'lat': latitude, 'lon': longitude, 'alt': 0.0}))
+    return reports
+
+
+class Console:
+    """ The parts of the GUI's Main that the Map uses. """
+    multiplier_x = 1
+    multiplier_y = 1
+
+    def log(self, message):
+        print("[GUI] " + message)
+
+
+class Bench:
+    """ A fake gpsd, the base station's GPS path and a map, timing every fix. """
+
+    def __init__(self, reports, speed):
+        self.gpsd = FakeGpsd(reports, speed)
+        self.to_gui = Queue()
+        self.bs = BaseStation(Queue(), self.to_gui)
+        if self.bs.gps is not None:
+            self.bs.gps.stop()
+        self.bs.gps = GPS(port=self.gpsd.port)
+
+        self.root = Tk()
+        self.map = Map(self.root, Console())
+
+        self.published = {}  # (northing, easting) -> (fix, time.time() the base station published it at).
+        self.shown = []  # (fix, published at, time.time() the map was drawn at).
+        self.running = True
+
+    def bs_loop(self):
+        """ Runs the GPS part of BaseStation.run at its period. """
+        while self.running:
+            fix = self.bs.gps_fix
+            self.bs.update_gps()
+            if self.bs.gps_fix is not fix:
+                fix = self.bs.gps_fix
+                easting, northing = self.bs.projection.project(fix.latitude, fix.longitude)
+                self.published[(northing, easting)] = (fix, time.time())
+            time.sleep(THREAD_SLEEP_DELAY)
+
+    def gui_loop(self, duration):
+        """ Runs the GPS part of Main.check_tasks at its period, only the latest position is drawn. """
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            latest = None
+            for _ in range(self.to_gui.qsize()):
+                event = self.to_gui.get_nowait()
+                if isinstance(event, events.UpdateBsCoordinates):
+                    latest = event
+            if latest is not None:
+                self.map.update_boat_position(latest.northing, latest.easting)
+                self.root.update()  # Runs the map's deferred draw.
+                fix, published = self.published[(latest.northing, latest.easting)]
+                self.shown.append((fix, published, time.time()))
+            self.root.update()
+            time.sleep(REFRESH_TIME / 1000.0)
+
+    def run(self, duration):
+        self.gpsd.start()
+        bs = threading.Thread(target=self.bs_loop, daemon=True)
+        bs.start()
+        try:
+            self.gui_loop(duration)
+        finally:
+            self.running = False
+            self.bs.gps.stop()
+            self.gpsd.stop()
+            self.root.destroy()
+
+    def report(self):
+        """ Prints the latency percentiles of every stage, in milliseconds. """
+        sent = {}
+        for sent_at, report in self.gpsd.sent:
+            sent[(report['lat'], report['lon'])] = sent_at
+
+        stages = {'gpsd -> GPS': [], 'GPS -> BaseStation': [], 'BaseStation -> Map': [], 'total': []}
+        for fix, published, drawn in self.shown:
+            sent_at = sent.get((fix.latitude, fix.longitude))
+            if sent_at is None:
+                continue
+            stages['gpsd -> GPS'].append((fix.time - sent_at) * 1000)
+            stages['GPS -> BaseStation'].append((published - fix.time) * 1000)
+            stages['BaseStation -> Map'].append((drawn - published) * 1000)
+            stages['total'].append((drawn - sent_at) * 1000)
+
+        print("Fixes:     " + str(len(self.gpsd.sent)) + " sent, " + str(self.bs.gps.fixes) + " read, " +
+              str(len(self.published)) + " published, " + str(len(self.shown)) + " drawn")
+        for name, latencies in stages.items():
+            if latencies:
+                print(name.ljust(20) + ", ".join("p" + str(p) + " " + str(round(percentile(latencies, p), 1)) + " ms"
+                                                 for p in PERCENTILES) +
+                      ", max " + str(round(max(latencies), 1)) + " ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--log', help='NMEA or gpsd JSON log to replay, a synthetic track if omitted')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier')
+    parser.add_argument('--rate', type=float, default=5.0, help='fixes per second of the synthetic track')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds to run for')
+    args = parser.parse_args()
+
+    reports = read_log(args.log) if args.log else synthetic_track(args.rate, args.duration)
+    bench = Bench(reports, args.speed)
+    bench.run(args.duration)
+    bench.report()
+
+
+if __name__ == '__main__':
+    main()
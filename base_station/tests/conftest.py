@@ -0,0 +1,27 @@
+"""
+Makes the api and gui modules of the base station and the api modules of the AUV importable
+by the tests as the 'bs_api', 'bs_gui' and 'auv_api' packages, without running their
+__init__.py, which need tkinter, the joystick or the AUV's hardware drivers.
+"""
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Manual tester, it needs a running gpsd and never returns.
+collect_ignore = ['test_GPS.py']
+
+
+def load_package(name, path):
+    """ Registers the directory path as the package name, without importing its __init__.py. """
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [path]
+        sys.modules[name] = package
+    return sys.modules[name]
+
+
+load_package('bs_api', os.path.join(ROOT, 'base_station', 'api'))
+load_package('bs_gui', os.path.join(ROOT, 'base_station', 'gui'))
+load_package('auv_api', os.path.join(ROOT, 'auv', 'api'))
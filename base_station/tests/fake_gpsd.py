@@ -0,0 +1,203 @@
+"""
+A local stand-in for gpsd, which replays a log of positions to the base station's GPS reader.
+
+Logs are either NMEA 0183 (GGA and RMC sentences, as recorded from a GPS device) or gpsd
+JSON (TPV reports, as recorded by gpspipe -w). They are replayed at their recorded rate,
+or faster with --speed:
+
+    python3 fake_gpsd.py track.nmea --speed 10 --port 2947
+"""
+import argparse
+import datetime
+import json
+import socket
+import threading
+import time
+
+GPSD_PORT = 2947
+VERSION = {'class': 'VERSION', 'release': 'fake', 'proto_major': 3, 'proto_minor': 14}
+KNOTS_TO_MPS = 0.514444
+SECONDS_PER_DAY = 86400
+
+
+def nmea_checksum_ok(sentence):
+    """ Returns True if an NMEA sentence has no checksum or a correct one. """
+    if '*' not in sentence:
+        return True
+    body, checksum = sentence[1:].split('*', 1)
+    value = 0
+    for char in body:
+        value ^= ord(char)
+    try:
+        return value == int(checksum[:2], 16)
+    except ValueError:
+        return False
+
+
+def nmea_degrees(value, hemisphere):
+    """ Returns the degrees of an NMEA (d)ddmm.mmmm coordinate, negative to the south and west. """
+    point = value.index('.') if '.' in value else len(value)
+    degrees = float(value[:point - 2]) + float(value[point - 2:]) / 60
+    return -degrees if hemisphere in ('S', 'W') else degrees
+
+
+def nmea_seconds(value):
+    """ Returns the seconds since midnight of an NMEA hhmmss.ss time. """
+    return int(value[0:2]) * 3600 + int(value[2:4]) * 60 + float(value[4:])
+
+
+def parse_nmea(sentence):
+    """ Returns the (seconds since midnight, TPV report) of a GGA or RMC sentence, or None. """
+    sentence = sentence.strip()
+    if not sentence.startswith('$') or not nmea_checksum_ok(sentence):
+        return None
+    fields = sentence.split('*')[0].split(',')
+    kind = fields[0][3:]
+    try:
+        if kind == 'GGA' and len(fields) > 9 and int(fields[6] or 0) > 0:
+            report = {'class': 'TPV', 'mode': 3 if fields[9] else 2,
+                      'lat': nmea_degrees(fields[2], fields[3]), 'lon': nmea_degrees(fields[4], fields[5])}
+            if fields[9]:
+                report['alt'] = float(fields[9])
+            return nmea_seconds(fields[1]), report
+        if kind == 'RMC' and len(fields) > 8 and fields[2] == 'A':
+            report = {'class': 'TPV', 'mode': 2,
+                      'lat': nmea_degrees(fields[3], fields[4]), 'lon': nmea_degrees(fields[5], fields[6])}
+            if fields[7]:
+                report['speed'] = float(fields[7]) * KNOTS_TO_MPS
+            if fields[8]:
+                report['track'] = float(fields[8])
+            return nmea_seconds(fields[1]), report
+    except (ValueError, IndexError):
+        pass
+    return None
+
+
+def parse_json(line):
+    """ Returns the (seconds, TPV report) of a gpsd JSON line with a time, or None. """
+    try:
+        report = json.loads(line)
+        seconds = datetime.datetime.fromisoformat(report['time'].replace('Z', '+00:00')).timestamp()
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    return (seconds, report) if report.get('class') == 'TPV' else None
+
+
+def read_log(path):
+    """ Returns the (seconds, TPV report) entries of an NMEA or gpsd JSON log, seconds from the first entry. """
+    entries = []
+    with open(path) as log:
+        for line in log:
+            line = line.strip()
+            entry = parse_json(line) if line.startswith('{') else parse_nmea(line)
+            if entry is not None:
+                entries.append(entry)
+    if not entries:
+        return []
+
+    # NMEA times wrap around at midnight.
+    reports = []
+    first = entries[0][0]
+    days = 0
+    previous = first
+    for seconds, report in entries:
+        if seconds < previous - SECONDS_PER_DAY / 2:
+            days += 1
+        previous = seconds
+        reports.append((seconds + days * SECONDS_PER_DAY - first, report))
+    return reports
+
+
+class FakeGpsd(threading.Thread):
+    """ Serves a list of TPV reports to gpsd clients, one client at a time, at the recorded rate. """
+
+    def __init__(self, reports, speed=1.0, host='127.0.0.1', port=0, loop=False):
+        """
+        reports: List of (seconds, TPV report) to replay, see read_log().
+        speed:   Replay speed, 2 replays twice as fast as recorded.
+        host:    Address to listen on.
+        port:    Port to listen on, 0 for any free port (see self.port).
+        loop:    Replay the reports again after the last one, instead of closing the connection.
+        """
+        threading.Thread.__init__(self, name='fake-gpsd', daemon=True)
+        self.reports = reports
+        self.speed = speed
+        self.loop = loop
+        self.running = True
+        self.sent = []  # (time.time() it was sent at, report) of every report sent.
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        self.server.settimeout(0.5)
+        self.port = self.server.getsockname()[1]
+
+    def run(self):
+        """ Accepts clients until stopped, and replays the reports to each. """
+        while self.running:
+            try:
+                client, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                self.serve(client)
+            except OSError:
+                pass  # The client went away.
+            finally:
+                client.close()
+
+    def serve(self, client):
+        """ Replays the reports to a client once it asked to watch them. """
+        client.sendall((json.dumps(VERSION) + '\n').encode())
+        request = b''
+        while b'WATCH' not in request:
+            data = client.recv(1024)
+            if not data:
+                return
+            request += data
+
+        while self.running:
+            start = time.monotonic()
+            for seconds, report in self.reports:
+                delay = start + seconds / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if not self.running:
+                    return
+                client.sendall((json.dumps(report) + '\n').encode())
+                self.sent.append((time.time(), report))
+            if not self.loop:
+                return
+
+    def stop(self):
+        """ Stops serving, closing the listening socket. """
+        self.running = False
+        self.server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('log', help='NMEA or gpsd JSON log to replay')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier')
+    parser.add_argument('--port', type=int, default=GPSD_PORT, help='port to listen on')
+    parser.add_argument('--loop', action='store_true', help='replay the log forever')
+    args = parser.parse_args()
+
+    reports = read_log(args.log)
+    print("Replaying " + str(len(reports)) + " reports from " + args.log + " on port " + str(args.port) + ".")
+    gpsd = FakeGpsd(reports, args.speed, port=args.port, loop=args.loop)
+    gpsd.start()
+    try:
+        while gpsd.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gpsd.stop()
+
+
+if __name__ == '__main__':
+    main()
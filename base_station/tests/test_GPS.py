@@ -9,18 +9,18 @@ from api import GPS
 import time
 
 
-my_gps = GPS()
-my_gps.start()
+my_gps = GPS(history=10)
 
 # Begin testing
 while(True):
-    print("Altitude: ", my_gps.altitude)
-    print("Latitude: ", my_gps.latitude)
-    print("Longitude: ", my_gps.longitude)
-    print("Speed: ", my_gps.speed)
+    fix = my_gps.fix()
+    if fix is None:
+        print("No fix yet: ", my_gps.stats())
+    else:
+        print("Altitude: ", fix.altitude)
+        print("Latitude: ", fix.latitude)
+        print("Longitude: ", fix.longitude)
+        print("Speed: ", fix.speed)
+        print("Fixes in history: ", len(my_gps.recent()))
     print("Sleeping....\n")
     time.sleep(2)
-
-
-
-
@@ -0,0 +1,167 @@
+"""
+Round trips of a file between the AUV's FileSender and the base station's Download,
+with chunks lost on the way.
+"""
+import os
+
+import pytest
+
+from auv_api import protocol
+from auv_api.transfer import FileSender
+from bs_api.download import Download, MAX_BITMAP_BYTES
+
+CHUNK_SIZE = 16
+
+
+class Radio:
+    """ Collects what FileSender sends, without a send queue limit. """
+
+    def __init__(self):
+        self.sent = []
+
+    def queue_depth(self):
+        return 0
+
+    def send(self, type_id, *fields):
+        self.sent.append((type_id, fields))
+
+
+def chunks(radio):
+    """ Returns the chunks sent on radio since the last call, as (index, crc, data). """
+    sent = [fields[1:] for type_id, fields in radio.sent if type_id == protocol.D]
+    radio.sent = []
+    return sent
+
+
+def send_all(sender, radio):
+    while True:
+        sent = len(radio.sent)
+        sender.update(radio)
+        if len(radio.sent) == sent:
+            return
+
+
+def make_transfer(directory, chunk_count):
+    """ Returns a FileSender of a file of chunk_count chunks, a Download of it and the file's path. """
+    path = directory / 'mission.bin'
+    path.write_bytes(os.urandom(chunk_count * CHUNK_SIZE - 5))
+    sender = FileSender(str(path), CHUNK_SIZE)
+    return sender, Download(*sender.info(), directory=str(directory / 'downloads')), path
+
+
+@pytest.fixture
+def transfer(tmp_path):
+    """ Returns a FileSender of a 1000-chunk file, a Download of it and the file's path. """
+    sender, download, path = make_transfer(tmp_path, 1000)
+    yield sender, download, path
+    download.file.close()
+    sender.close()
+
+
+def deliver(sender, download, radio, lost=()):
+    """ Sends what the AUV has queued, losing the chunks in lost. Returns the indexes sent. """
+    send_all(sender, radio)
+    sent = []
+    for index, crc, data in chunks(radio):
+        sent.append(index)
+        if index not in lost:
+            assert download.on_chunk(index, crc, data)
+    return sent
+
+
+def resend(sender, download):
+    """ Passes the D_RESEND message of the base station to the AUV, through the protocol. """
+    fields = download.resend_request()
+    type_id, fields = protocol.Decoder().feed(protocol.encode(protocol.D_RESEND, *fields))[0]
+    sender.resend(*fields[1:])
+
+
+def test_resend_only_sends_missing_chunks(transfer):
+    sender, download, path = transfer
+    radio = Radio()
+    resend(sender, download)  # Nothing received yet, asks for every chunk.
+    lost = {0, 10, 11, 500, 998}
+    assert len(deliver(sender, download, radio, lost)) == download.chunk_count
+
+    resend(sender, download)
+    assert deliver(sender, download, radio) == sorted(lost)
+    assert download.is_complete()
+
+    resend(sender, download)
+    assert sender.finished
+    download.finish()
+    assert open(download.path, 'rb').read() == path.read_bytes()
+
+
+def test_resend_of_a_single_gap(transfer):
+    sender, download, _ = transfer
+    radio = Radio()
+    resend(sender, download)
+    deliver(sender, download, radio, lost={10})
+
+    assert download.resend_request()[1] == 10
+    resend(sender, download)
+    assert deliver(sender, download, radio) == [10]
+
+
+def test_resend_of_an_interrupted_stream(transfer):
+    sender, download, _ = transfer
+    radio = Radio()
+    resend(sender, download)
+    deliver(sender, download, radio, lost={3} | set(range(600, download.chunk_count)))
+
+    resend(sender, download)
+    assert deliver(sender, download, radio) == [3] + list(range(600, download.chunk_count))
+
+
+def test_resend_bitmap_size_limit(tmp_path):
+    sender, download, _ = make_transfer(tmp_path, MAX_BITMAP_BYTES * 8 + 1000)
+    radio = Radio()
+    resend(sender, download)
+    # Gaps further apart than the bitmap reaches are resent along with the chunks after it.
+    lost = {0, MAX_BITMAP_BYTES * 8 + 100}
+    deliver(sender, download, radio, lost)
+
+    _, first, bitmap = download.resend_request()
+    assert first == 0 and len(bitmap) == MAX_BITMAP_BYTES
+    resend(sender, download)
+    resent = deliver(sender, download, radio)
+    assert resent == [0] + list(range(MAX_BITMAP_BYTES * 8 + 1, download.chunk_count))
+    assert download.is_complete()
+    download.file.close()
+    sender.close()
+
+
+def test_resume_from_progress(transfer):
+    sender, download, _ = transfer
+    radio = Radio()
+    resend(sender, download)
+    deliver(sender, download, radio, lost=set(range(0, 1000, 2)))
+    download.close()
+
+    resumed = Download(*sender.info(), directory=os.path.dirname(download.path))
+    assert resumed.resumed and resumed.missing == 500
+    resend(sender, resumed)
+    assert deliver(sender, resumed, radio) == list(range(0, 1000, 2))
+    assert resumed.is_complete()
+    resumed.file.close()
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty.bin'
+    path.write_bytes(b'')
+    sender = FileSender(str(path), CHUNK_SIZE)
+    download = Download(*sender.info(), directory=str(tmp_path / 'downloads'))
+    assert download.chunk_count == 0 and download.is_complete()
+
+    # The base station finishes right away, telling the AUV nothing is missing.
+    resend(sender, download)
+    assert sender.finished
+    radio = Radio()
+    send_all(sender, radio)
+    assert radio.sent == []
+
+    download.finish()
+    sender.close()
+    with open(download.path, 'rb') as received:
+        assert received.read() == b''
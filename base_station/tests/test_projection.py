@@ -0,0 +1,61 @@
+"""
+Tests of the UTM projection against reference coordinates, and of its fast local fit.
+"""
+import numpy as np
+import pytest
+
+from bs_api.projection import Projection, zone_of
+
+# (latitude, longitude, zone, easting, northing), from an independent UTM implementation.
+REFERENCE = [
+    (32.7157, -117.1611, 11, 484902.62141, 3619781.60797),
+    (-33.8568, 151.2153, 56, 334900.56965, 6252288.75286),
+    (51.4779, -0.0015, 30, 708213.49499, 5707235.66089),
+    (0.0, 3.0, 31, 500000.0, 0.0),
+]
+
+
+@pytest.mark.parametrize('latitude, longitude, zone, easting, northing', REFERENCE)
+def test_to_utm(latitude, longitude, zone, easting, northing):
+    projection = Projection()
+    assert projection.to_utm(latitude, longitude) == pytest.approx((easting, northing), abs=0.001)
+    assert projection.zone == zone_of(longitude) == zone
+    assert projection.northern == (latitude >= 0)
+
+
+@pytest.mark.parametrize('latitude, longitude, zone, easting, northing', REFERENCE)
+def test_to_latlon(latitude, longitude, zone, easting, northing):
+    projection = Projection(zone, latitude >= 0)
+    assert projection.to_latlon(easting, northing) == pytest.approx((latitude, longitude), abs=1e-8)
+
+
+def test_arrays_round_trip():
+    projection = Projection(11, True)
+    latitude = np.linspace(32.0, 33.0, 101)
+    longitude = np.linspace(-118.0, -116.5, 101)
+    easting, northing = projection.to_utm(latitude, longitude)
+    back = projection.to_latlon(easting, northing)
+    np.testing.assert_allclose(back, (latitude, longitude), atol=1e-8)
+
+
+def test_project_matches_to_utm():
+    projection = Projection()
+    exact = Projection()
+    generator = np.random.default_rng(1)
+    latitude, longitude = 32.7157, -117.1611
+    for _ in range(1000):  # A random walk, refitting as it leaves each fit.
+        latitude += generator.normal(scale=0.002)
+        longitude += generator.normal(scale=0.002)
+        assert projection.project(latitude, longitude) == pytest.approx(exact.to_utm(latitude, longitude), abs=0.001)
+
+
+def test_zone_is_kept_across_a_boundary():
+    projection = Projection()
+    projection.project(32.0, -114.01)  # Zone 11.
+    easting, _ = projection.project(32.0, -113.99)  # Zone 12, projected in zone 11.
+    assert projection.zone == 11 and easting > 700000
+
+
+def test_to_latlon_needs_a_zone():
+    with pytest.raises(ValueError):
+        Projection().to_latlon(500000.0, 0.0)
@@ -0,0 +1,92 @@
+"""
+Tests of the AUV track's view-dependent simplification.
+"""
+import numpy as np
+
+from bs_gui.track import TrackStore, simplify
+
+
+def distance_to_polyline(px, py, x, y):
+    """ Returns the distance of every point (px, py) to the polyline through (x, y). """
+    distances = np.full(len(px), np.inf)
+    for x0, y0, x1, y1 in zip(x[:-1], y[:-1], x[1:], y[1:]):
+        dx, dy = x1 - x0, y1 - y0
+        length = dx * dx + dy * dy
+        t = np.clip(((px - x0) * dx + (py - y0) * dy) / length, 0, 1) if length else 0
+        distances = np.minimum(distances, np.hypot(px - x0 - t * dx, py - y0 - t * dy))
+    return distances
+
+
+def test_simplify_stays_within_tolerance():
+    generator = np.random.default_rng(1)
+    x = np.cumsum(generator.normal(size=5000))
+    y = np.cumsum(generator.normal(size=5000))
+    kept = simplify(x, y, 2.0)
+
+    assert kept[0] == 0 and kept[-1] == 4999
+    assert len(kept) < 2500
+    assert distance_to_polyline(x, y, x[kept], y[kept]).max() <= 2.0 + 1e-9
+
+
+def test_simplify_straight_line():
+    x = np.arange(100.0)
+    assert list(simplify(x, 2 * x, 0.01)) == [0, 99]
+
+
+def test_simplified_leaves_out_segments_outside_the_view():
+    track = TrackStore()
+    track.extend([(x, 0.0) for x in range(-1000, 1001)])  # Along the x axis.
+    track.extend([(1000.0, y) for y in range(1, 1001)])  # Then up, out of view.
+
+    x, y = track.simplified((-10, 10), (-10, 10), 0.1)
+    assert np.nanmin(x) >= -11 and np.nanmax(x) <= 11
+    assert np.all(y == 0)
+
+
+def test_simplified_thins_to_pixels():
+    track = TrackStore()
+    angles = np.linspace(0, 20 * np.pi, 100000)
+    track.extend(np.column_stack((np.cos(angles) * 100, np.sin(angles) * 100)))
+    x, y = track.simplified((-200, 200), (-200, 200), 1.0)
+    assert len(x) < 1000
+
+
+def test_simplified_is_cached_until_the_track_grows():
+    track = TrackStore()
+    track.extend([(0, 0), (1, 1), (2, 0)])
+    first = track.simplified((-5, 5), (-5, 5), 0.1)
+    assert track.simplified((-5, 5), (-5, 5), 0.1) is first
+    track.append(3, 1)
+    assert len(track.simplified((-5, 5), (-5, 5), 0.1)[0]) == 4
+
+
+def test_growth_keeps_every_point():
+    track = TrackStore(capacity=4)
+    for i in range(10):
+        track.append(i, -i, depth=i / 10, heading=i * 10, timestamp=1000 + i)
+    track.extend([(10, -10, 1.0, 100), (11, -11, 1.1, 110)], timestamp=2000)
+
+    assert len(track) == 12 and track.data.shape[1] >= 12
+    np.testing.assert_array_equal(track.x, np.arange(12))
+    np.testing.assert_array_equal(track.y, -np.arange(12))
+    np.testing.assert_allclose(track.depth, np.arange(12) / 10)
+    np.testing.assert_array_equal(track.time[-3:], [1009, 2000, 2000])
+
+
+def test_extend_without_depth_and_heading():
+    track = TrackStore()
+    track.extend([(1, 2), (3, 4)])
+    track.extend([])
+    assert len(track) == 2
+    assert np.isnan(track.depth).all() and np.isnan(track.heading).all()
+
+
+def test_transform_and_clear():
+    track = TrackStore()
+    track.extend([(1, 2), (3, 4)])
+    track.transform(dx=10, dy=20)
+    np.testing.assert_array_equal(track.x, [11, 13])
+    np.testing.assert_array_equal(track.y, [22, 24])
+
+    track.clear()
+    assert len(track) == 0 and track.nbytes() == 0
@@ -0,0 +1,64 @@
+"""
+Tests of the grid-indexed waypoint store and of survey plan import.
+"""
+import math
+import random
+
+from bs_gui.waypoints import WaypointStore, read_survey
+
+
+def brute_force_nearest(store, x, y, radius):
+    closest = None
+    for waypoint in store:
+        distance = math.hypot(waypoint.x - x, waypoint.y - y)
+        if distance <= radius and (closest is None or distance <= closest[0]):
+            closest = (distance, waypoint)
+    return closest[1] if closest is not None else None
+
+
+def test_nearest_matches_brute_force():
+    generator = random.Random(1)
+    store = WaypointStore(cell_size=50)
+    store.extend((generator.uniform(-1000, 1000), generator.uniform(-1000, 1000), str(i)) for i in range(2000))
+    for _ in range(500):
+        x, y = generator.uniform(-1100, 1100), generator.uniform(-1100, 1100)
+        radius = generator.choice((10, 50, 120))
+        assert store.nearest(x, y, radius) is brute_force_nearest(store, x, y, radius)
+
+
+def test_add_and_remove_keep_the_grid():
+    store = WaypointStore()
+    store.nearest(0, 0, 1)  # Builds the grid.
+    first = store.add(10, 10, 'first')
+    second = store.add(20, 20, 'second')
+    third = store.add(30, 30, 'third')
+    assert store.nearest(11, 11, 5) is first
+
+    store.remove(first)
+    assert store.nearest(11, 11, 5) is None
+    assert [waypoint.label for waypoint in store] == ['second', 'third']
+    assert (second.x, third.y) == (20, 30)
+
+
+def test_transform_moves_every_waypoint():
+    store = WaypointStore()
+    waypoint = store.add(100, -50, 'a')
+    store.nearest(0, 0, 1)
+    store.transform(dx=5, dy=-5)
+    assert (waypoint.x, waypoint.y) == (105, -55)
+    assert store.nearest(105, -55, 1) is waypoint
+
+
+def test_growth():
+    store = WaypointStore()
+    waypoints = store.extend((i, -i, str(i)) for i in range(1000))
+    assert len(store) == 1000
+    assert (waypoints[999].x, waypoints[999].y) == (999, -999)
+    store.clear()
+    assert len(store) == 0 and store.nearest(0, 0, 10) is None
+
+
+def test_read_survey(tmp_path):
+    path = tmp_path / 'survey.csv'
+    path.write_text("label, x, y\n start , 100.5, 200\nbad, x, 1\nshort\nend, -1, -2\n")
+    assert read_survey(str(path)) == [(100.5, 200.0, 'start'), (-1.0, -2.0, 'end')]
@@ -0,0 +1,138 @@
+"""
+Benchmarks the radio protocol over the link simulator.
+
+Reports the round-trip latency of reliable commands (sent until acknowledged, including
+retransmissions) as percentiles, and the goodput of the AUV's telemetry stream:
+
+    python3 sim/bench_link.py --loss 0.05 --latency 0.1 --commands 200
+"""
+import argparse
+import importlib
+import time
+
+from link_sim import LinkSimulator, add_link_arguments, link_config, load_api
+
+load_api()
+protocol = importlib.import_module('api.protocol')
+codec = importlib.import_module('api.codec')
+Radio = importlib.import_module('api.radio').Radio
+ReliableLink = importlib.import_module('api.reliable').ReliableLink
+
+POLL_INTERVAL = 0.001
+COMMAND_TIMEOUT = 30.0
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, p):
+    """ Returns the p-th percentile (nearest rank) of a list of values. """
+    ordered = sorted(values)
+    rank = max(0, int(round(p / 100.0 * len(ordered) + 0.5)) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Bench:
+    """ A base station and an AUV end of the simulated link. """
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.bs_radio = Radio(sim.bs_path, threaded=True)
+        self.auv_radio = Radio(sim.auv_path, threaded=True)
+        self.bs = ReliableLink(self.bs_radio)
+        self.auv = ReliableLink(self.auv_radio)
+        self.failures = 0
+
+    def poll(self):
+        """ Runs one iteration of both ends' main loops. Returns the messages the base station received. """
+        self.auv.receive()
+        self.auv.update()
+        messages = self.bs.receive()
+        self.failures += len(self.bs.update())
+        return messages
+
+    def commands(self, count, interval):
+        """
+        Sends count reliable commands, one at a time, and returns their round-trip
+        latencies in seconds. Commands that were given up on are returned as None.
+        """
+        latencies = []
+        for _ in range(count):
+            start = time.monotonic()
+            failures = self.failures
+            seq = self.bs.send(protocol.TEST_MOTOR, 0)
+            while seq in self.bs.pending and time.monotonic() - start < COMMAND_TIMEOUT:
+                self.poll()
+                time.sleep(POLL_INTERVAL)
+            if seq in self.bs.pending or self.failures > failures:
+                latencies.append(None)
+            else:
+                latencies.append(time.monotonic() - start)
+            time.sleep(interval)
+        return latencies
+
+    def telemetry(self, duration, rate):
+        """
+        Streams telemetry from the AUV at rate frames per second for duration seconds.
+        Returns (frames sent, frames decoded, payload bytes decoded).
+        """
+        encoder = codec.TelemetryEncoder()
+        decoder = codec.TelemetryDecoder()
+        sent = decoded = payload_bytes = 0
+
+        start = time.monotonic()
+        next_frame = start
+        while time.monotonic() - start < duration + 1.0:  # Let the last frames arrive.
+            now = time.monotonic()
+            if now < start + duration and now >= next_frame:
+                elapsed = now - start
+                values = {'heading': elapsed * 10 % 360, 'temperature': 20 + elapsed / 100,
+                          'depth': elapsed / 10}
+                self.auv_radio.send(protocol.AUV_DATA, encoder.encode(values))
+                sent += 1
+                next_frame += 1.0 / rate
+
+            for type_id, fields in self.poll():
+                if type_id == protocol.AUV_DATA and decoder.decode(fields[0]) is not None:
+                    decoded += 1
+                    payload_bytes += len(fields[0])
+            time.sleep(POLL_INTERVAL)
+        return sent, decoded, payload_bytes
+
+    def close(self):
+        self.bs_radio.close()
+        self.auv_radio.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_link_arguments(parser)
+    parser.add_argument('--commands', type=int, default=100, help='number of reliable commands')
+    parser.add_argument('--interval', type=float, default=0.05, help='seconds between commands')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of telemetry')
+    parser.add_argument('--rate', type=float, default=10.0, help='telemetry frames per second')
+    args = parser.parse_args()
+
+    sim = LinkSimulator(link_config(args))
+    sim.start()
+    bench = Bench(sim)
+    try:
+        latencies = bench.commands(args.commands, args.interval)
+        delivered = [latency * 1000 for latency in latencies if latency is not None]
+        print("Commands:  " + str(len(delivered)) + "/" + str(len(latencies)) + " acknowledged, " +
+              str(bench.bs.retransmissions) + " retransmissions")
+        if delivered:
+            print("Latency:   " + ", ".join("p" + str(p) + " " + str(round(percentile(delivered, p), 1)) + " ms"
+                                          for p in PERCENTILES) +
+                  ", max " + str(round(max(delivered), 1)) + " ms")
+
+        sent, decoded, payload_bytes = bench.telemetry(args.duration, args.rate)
+        print("Telemetry: " + str(decoded) + "/" + str(sent) + " frames decoded, " +
+              str(round(decoded / args.duration, 1)) + " frames/s, " +
+              str(round(payload_bytes / args.duration, 1)) + " payload bytes/s")
+        print("Link:      " + str(sim.stats()))
+    finally:
+        bench.close()
+        sim.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""
+The link simulator stands in for the pair of 915 MHz radios between the AUV and the base station.
+
+It creates one pseudo-terminal per side and forwards the frames written to one side to
+the other, with a configurable baud rate, latency, loss, corruption and reordering.
+Radio, AUV.main_loop and BaseStation.run can then be exercised on any Linux machine:
+
+    python3 sim/link_sim.py --loss 0.05 --latency 0.1
+    NAUTILUS_RADIO_PATH=/tmp/nautilus_auv python3 auv.py          (in auv/)
+    NAUTILUS_RADIO_PATH=/tmp/nautilus_bs python3 base_station.py  (in base_station/)
+"""
+import argparse
+import heapq
+import importlib
+import itertools
+import os
+import pty
+import random
+import select
+import sys
+import threading
+import time
+import tty
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_PATH = os.path.join(ROOT, 'auv', 'api')
+
+AUV_LINK = '/tmp/nautilus_auv'
+BS_LINK = '/tmp/nautilus_bs'
+READ_SIZE = 4096
+BITS_PER_BYTE = 10  # 8N1 serial framing, a start and a stop bit per byte.
+
+
+def load_api():
+    """
+    Imports the radio modules of auv/api (protocol, radio, reliable, codec, ...) as the
+    'api' package, without running api/__init__.py, which needs the AUV's hardware drivers.
+    Returns the package, its modules are imported with importlib.import_module('api.<name>').
+    """
+    if 'api' not in sys.modules:
+        package = types.ModuleType('api')
+        package.__path__ = [API_PATH]
+        sys.modules['api'] = package
+    return sys.modules['api']
+
+
+class LinkConfig:
+    """ Impairments applied to every frame crossing the simulated link. """
+
+    def __init__(self, baudrate=57600, latency=0.02, jitter=0.0, loss=0.0, corruption=0.0,
+                 reorder=0.0, buffer_size=1024, seed=None):
+        """
+        baudrate:    Air rate of the link in bits per second, 0 for unlimited.
+        latency:     One-way delay in seconds, on top of the transmission time.
+        jitter:      Random extra delay in seconds, uniform between 0 and jitter.
+        loss:        Probability that a frame is lost.
+        corruption:  Probability that a bit of a frame is flipped.
+        reorder:     Probability that a frame is held back behind the next ones.
+        buffer_size: Bytes a radio accepts before writes to it block, like a modem's buffer.
+        seed:        Seed of the random generator, for reproducible runs.
+        """
+        self.baudrate = baudrate
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.corruption = corruption
+        self.reorder = reorder
+        self.buffer_size = buffer_size
+        self.random = random.Random(seed)
+
+
+class Direction(threading.Thread):
+    """ Forwards the frames of one side of the link to the other side. """
+
+    def __init__(self, name, source, destination, config, protocol):
+        """
+        name:        Name of the direction, for statistics.
+        source:      Master file descriptor of the sending side's pseudo-terminal.
+        destination: Master file descriptor of the receiving side's pseudo-terminal.
+        config:      LinkConfig of the link.
+        protocol:    Protocol module, used to split the byte stream into frames.
+        """
+        super().__init__(name=name, daemon=True)
+        self.source = source
+        self.destination = destination
+        self.config = config
+        self.protocol = protocol
+        self.running = True
+
+        self.buffer = bytearray()
+        self.in_flight = []  # Heap of (delivery time, order, frame).
+        self.in_flight_bytes = 0
+        self.order = itertools.count()
+        self.air_free_at = 0.0
+
+        self.frames = 0
+        self.bytes = 0
+        self.lost = 0
+        self.corrupted = 0
+        self.reordered = 0
+
+    def split(self):
+        """ Returns the complete frames (or runs of noise between frames) at the start of the buffer. """
+        protocol = self.protocol
+        buffer = self.buffer
+        units = []
+        while buffer:
+            if buffer[0] != protocol.SYNC:
+                end = buffer.find(protocol.SYNC)
+                end = len(buffer) if end < 0 else end
+            elif len(buffer) < protocol.HEADER_SIZE:
+                break
+            else:
+                end = protocol.FRAME_OVERHEAD + buffer[2]
+                if end > len(buffer):
+                    break
+            units.append(bytes(buffer[:end]))
+            del buffer[:end]
+        return units
+
+    def transmit(self, frame, now):
+        """ Applies the link impairments to a frame and schedules its delivery. """
+        config = self.config
+        self.frames += 1
+        self.bytes += len(frame)
+
+        # Frames go over the air one after the other.
+        airtime = len(frame) * BITS_PER_BYTE / config.baudrate if config.baudrate else 0.0
+        self.air_free_at = max(now, self.air_free_at) + airtime
+        if config.random.random() < config.loss:
+            self.lost += 1
+            return
+
+        if config.random.random() < config.corruption:
+            frame = bytearray(frame)
+            frame[config.random.randrange(len(frame))] ^= 1 << config.random.randrange(8)
+            frame = bytes(frame)
+            self.corrupted += 1
+
+        delay = config.latency + config.random.uniform(0, config.jitter)
+        if config.random.random() < config.reorder:
+            delay += config.latency + airtime * 4  # Let a few later frames overtake it.
+            self.reordered += 1
+
+        heapq.heappush(self.in_flight, (self.air_free_at + delay, next(self.order), frame))
+        self.in_flight_bytes += len(frame)
+
+    def run(self):
+        """ Reads frames from the source, and writes them to the destination once they are due. """
+        while self.running:
+            now = time.monotonic()
+            while self.in_flight and self.in_flight[0][0] <= now:
+                frame = heapq.heappop(self.in_flight)[2]
+                self.in_flight_bytes -= len(frame)
+                os.write(self.destination, frame)
+
+            # Stop reading while the simulated modem buffer is full, so writers block.
+            readers = [self.source] if self.in_flight_bytes < self.config.buffer_size else []
+            timeout = 0.05
+            if self.in_flight:
+                timeout = min(timeout, max(0.0, self.in_flight[0][0] - now))
+            readable = select.select(readers, [], [], timeout)[0]
+            if not readable:
+                continue
+
+            try:
+                data = os.read(self.source, READ_SIZE)
+            except OSError:  # Nothing opened the other end yet.
+                time.sleep(timeout)
+                continue
+            self.buffer += data
+            now = time.monotonic()
+            for frame in self.split():
+                self.transmit(frame, now)
+
+    def stats(self):
+        """
+        Returns a dictionary of the frames that crossed this direction.
+        """
+        return {
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'lost': self.lost,
+            'corrupted': self.corrupted,
+            'reordered': self.reordered,
+        }
+
+
+class LinkSimulator:
+    """ A simulated radio link between two pseudo-terminals. """
+
+    def __init__(self, config=None, auv_link=None, bs_link=None):
+        """
+        config:   LinkConfig of the link.
+        auv_link: Optional path of a symlink to the AUV's side of the link.
+        bs_link:  Optional path of a symlink to the base station's side of the link.
+        """
+        self.config = config if config is not None else LinkConfig()
+        load_api()
+        protocol = importlib.import_module('api.protocol')
+
+        self.auv_master, self.auv_slave = self.open_pty()
+        self.bs_master, self.bs_slave = self.open_pty()
+        self.auv_path = os.ttyname(self.auv_slave)
+        self.bs_path = os.ttyname(self.bs_slave)
+
+        self.links = []
+        for link, path in ((auv_link, self.auv_path), (bs_link, self.bs_path)):
+            if link is not None:
+                if os.path.lexists(link):
+                    os.remove(link)
+                os.symlink(path, link)
+                self.links.append(link)
+
+        self.uplink = Direction('bs->auv', self.bs_master, self.auv_master, self.config, protocol)
+        self.downlink = Direction('auv->bs', self.auv_master, self.bs_master, self.config, protocol)
+
+    @staticmethod
+    def open_pty():
+        """ Returns the (master, slave) file descriptors of a new raw pseudo-terminal. """
+        master, slave = pty.openpty()
+        tty.setraw(slave)
+        return master, slave
+
+    def start(self):
+        """ Starts forwarding frames in both directions. """
+        self.uplink.start()
+        self.downlink.start()
+
+    def stats(self):
+        """
+        Returns a dictionary of statistics per direction.
+        """
+        return {'bs->auv': self.uplink.stats(), 'auv->bs': self.downlink.stats()}
+
+    def close(self):
+        """ Stops forwarding and removes the pseudo-terminals and symlinks. """
+        for direction in (self.uplink, self.downlink):
+            direction.running = False
+            if direction.is_alive():
+                direction.join()
+        for fd in (self.auv_master, self.auv_slave, self.bs_master, self.bs_slave):
+            os.close(fd)
+        for link in self.links:
+            if os.path.islink(link):
+                os.remove(link)
+
+
+def add_link_arguments(parser):
+    """ Adds the LinkConfig options to an argument parser. """
+    parser.add_argument('--baudrate', type=int, default=57600, help='air rate in bits/s, 0 for unlimited')
+    parser.add_argument('--latency', type=float, default=0.02, help='one-way delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra delay in seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='frame loss probability')
+    parser.add_argument('--corruption', type=float, default=0.0, help='bit flip probability per frame')
+    parser.add_argument('--reorder', type=float, default=0.0, help='frame reordering probability')
+    parser.add_argument('--buffer-size', type=int, default=1024, help='modem buffer in bytes')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+
+
+def link_config(args):
+    """ Returns the LinkConfig of parsed add_link_arguments() options. """
+    return LinkConfig(args.baudrate, args.latency, args.jitter, args.loss, args.corruption,
+                      args.reorder, args.buffer_size, args.seed)
+
+
+def main():
+    """ Runs the simulator until interrupted, printing the link statistics every few seconds. """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_link_arguments(parser)
+    parser.add_argument('--auv-link', default=AUV_LINK, help='symlink to the AUV side')
+    parser.add_argument('--bs-link', default=BS_LINK, help='symlink to the base station side')
+    args = parser.parse_args()
+
+    sim = LinkSimulator(link_config(args), args.auv_link, args.bs_link)
+    sim.start()
+    print("AUV side:          " + args.auv_link + " -> " + sim.auv_path)
+    print("Base station side: " + args.bs_link + " -> " + sim.bs_path)
+    try:
+        while True:
+            time.sleep(5)
+            print(sim.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+
+
+if __name__ == '__main__':
+    main()